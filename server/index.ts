@@ -6,6 +6,7 @@ import { registerRoutes } from "./routes";
 import { serveStatic } from "./static";
 import { createServer } from "http";
 import { startModelServer, stopModelServer } from "./modelServer";
+import { stopTranscribeWorkers } from "./transcribeWorkers";
 
 const app = express();
 const httpServer = createServer(app);
@@ -113,6 +114,7 @@ app.use((req, res, next) => {
   process.on('SIGTERM', () => {
     console.log('[Server] SIGTERM received, shutting down gracefully');
     stopModelServer();
+    stopTranscribeWorkers();
     httpServer.close(() => {
       console.log('[Server] HTTP server closed');
       process.exit(0);
@@ -122,6 +124,7 @@ app.use((req, res, next) => {
   process.on('SIGINT', () => {
     console.log('[Server] SIGINT received, shutting down gracefully');
     stopModelServer();
+    stopTranscribeWorkers();
     httpServer.close(() => {
       console.log('[Server] HTTP server closed');
       process.exit(0);
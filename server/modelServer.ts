@@ -1,17 +1,295 @@
 /**
  * Model Server Manager
- * Starts and manages Python model server process
+ * Starts and manages local Python model server processes and load-balances
+ * requests over them and any remote model servers (MODEL_SERVER_URLS)
  */
 import { spawn, ChildProcess } from "child_process";
+import http, { type IncomingMessage } from "http";
+import https from "https";
+import { Readable } from "stream";
 import path from "path";
 import { fileURLToPath } from "url";
-import { existsSync } from "fs";
+import { existsSync, createReadStream } from "fs";
+import { randomUUID } from "crypto";
+import type { TranscribeOptions } from "./transcribeWorkers";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
-let modelServerProcess: ChildProcess | null = null;
-const MODEL_SERVER_PORT = 8765;
+const MODEL_SERVER_PORT = parseInt(process.env.MODEL_SERVER_PORT || "8765", 10);
+// Model server processes started on this host (ports MODEL_SERVER_PORT, +1, ...)
+const LOCAL_INSTANCES = Math.max(0, parseInt(process.env.MODEL_SERVER_LOCAL_INSTANCES || "1", 10) || 0);
+// Extra model servers, local or remote, e.g. "http://gpu-1:8765,http://gpu-2:8765"
+const REMOTE_URLS = (process.env.MODEL_SERVER_URLS || "")
+  .split(",")
+  .map((url) => url.trim().replace(/\/+$/, ""))
+  .filter(Boolean);
+const HEALTH_INTERVAL_MS = parseInt(process.env.MODEL_SERVER_HEALTH_INTERVAL_MS || "10000", 10);
+const HEALTH_TIMEOUT_MS = parseInt(process.env.MODEL_SERVER_HEALTH_TIMEOUT_MS || "3000", 10);
+// A node with the model warm is preferred unless it has this many more requests than the least-loaded node
+const AFFINITY_SLACK = parseInt(process.env.MODEL_SERVER_AFFINITY_SLACK || "2", 10);
+
+interface ModelServerEndpoint {
+  url: string;
+  // Same host as this process, so it can read files this process writes (file_path payloads)
+  local: boolean;
+  process: ChildProcess | null;
+  healthy: boolean;
+  // Requests from this process still waiting on the endpoint
+  inFlight: number;
+  // Reported by the endpoint's /health (all clients)
+  queued: number;
+  running: number;
+  models: string[];
+  failures: number;
+  lastCheckedAt: number | null;
+  lastError: string | null;
+}
+
+/**
+ * Cancellation for a model server request: aborting `signal` (e.g. when the
+ * client disconnects) stops the work on the model server at its next segment
+ * or token, and the model server gives up on its own after `deadlineSeconds`
+ */
+export interface ModelServerCallOptions {
+  signal?: AbortSignal;
+  deadlineSeconds?: number;
+}
+
+const endpoints: ModelServerEndpoint[] = [];
+// Async jobs live on the node that accepted them (unfinished ones only)
+const jobEndpoints = new Map<string, ModelServerEndpoint>();
+const TERMINAL_JOB_STATUSES = new Set(["completed", "failed", "cancelled"]);
+// Live summary sessions keep their state on the node that started them; pins
+// are dropped after the session's final update or, like the sessions
+// themselves, after an hour without one
+const sessionEndpoints = new Map<string, { endpoint: ModelServerEndpoint; updatedAt: number }>();
+const SESSION_TTL_MS = 60 * 60 * 1000;
+let healthTimer: NodeJS.Timeout | null = null;
+
+function isLocalUrl(url: string): boolean {
+  const host = new URL(url).hostname;
+  return host === "localhost" || host === "127.0.0.1" || host === "::1" || host === "[::1]";
+}
+
+function addEndpoint(url: string): ModelServerEndpoint {
+  const existing = endpoints.find((e) => e.url === url);
+  if (existing) {
+    return existing;
+  }
+  const endpoint: ModelServerEndpoint = {
+    url,
+    local: isLocalUrl(url),
+    process: null,
+    healthy: false,
+    inFlight: 0,
+    queued: 0,
+    running: 0,
+    models: [],
+    failures: 0,
+    lastCheckedAt: null,
+    lastError: null,
+  };
+  endpoints.push(endpoint);
+  return endpoint;
+}
+
+/**
+ * Register MODEL_SERVER_URLS and start health checks (also when no local server is started)
+ */
+function ensureEndpoints(): void {
+  if (healthTimer) {
+    return;
+  }
+  for (const url of REMOTE_URLS) {
+    addEndpoint(url);
+  }
+  void checkEndpoints();
+  healthTimer = setInterval(() => void checkEndpoints(), HEALTH_INTERVAL_MS);
+  healthTimer.unref();
+}
+
+async function checkEndpoint(endpoint: ModelServerEndpoint): Promise<void> {
+  try {
+    const response = await fetch(`${endpoint.url}/health`, { signal: AbortSignal.timeout(HEALTH_TIMEOUT_MS) });
+    const health = await response.json();
+    if (!response.ok || !health.success) {
+      throw new Error(health.error || `Health check returned ${response.status}`);
+    }
+    if (!endpoint.healthy) {
+      console.log(`[ModelServer] ${endpoint.url} is healthy (models: ${(health.models || []).join(", ") || "none"})`);
+    }
+    endpoint.healthy = true;
+    endpoint.failures = 0;
+    endpoint.lastError = null;
+    endpoint.models = health.models || [];
+    endpoint.queued = health.queued || 0;
+    endpoint.running = health.running || 0;
+  } catch (error: any) {
+    if (endpoint.healthy) {
+      console.error(`[ModelServer] ${endpoint.url} failed health check: ${error.message}`);
+    }
+    endpoint.healthy = false;
+    endpoint.failures++;
+    endpoint.lastError = error.message;
+  } finally {
+    endpoint.lastCheckedAt = Date.now();
+  }
+}
+
+function checkEndpoints(): Promise<void[]> {
+  return Promise.all(endpoints.map(checkEndpoint));
+}
+
+/**
+ * Model a request needs warm, matching the names reported by /health
+ */
+function modelAffinity(payload: Record<string, unknown>): string | null {
+  const action = String(payload.action || "");
+  // A lecture pipeline starts with transcription, the longest stage
+  if (action.startsWith("transcribe") || action === "process_lecture") {
+    return `whisper:${payload.model_size || "large-v3"}`;
+  }
+  if (action.startsWith("generate")) {
+    return "qwen";
+  }
+  return null;
+}
+
+function endpointLoad(endpoint: ModelServerEndpoint): number {
+  return endpoint.inFlight + endpoint.queued + endpoint.running;
+}
+
+/**
+ * Choose a model server for a request: healthy nodes first, then the
+ * least-loaded node that already has the model warm, unless a cold node is
+ * more than AFFINITY_SLACK requests less busy. A pinned live summary
+ * session goes to its node while that has not failed for this request.
+ */
+function pickEndpoint(payload: Record<string, unknown>, exclude: Set<ModelServerEndpoint>): ModelServerEndpoint | null {
+  ensureEndpoints();
+  const pinned = typeof payload.session_id === "string" ? sessionEndpoints.get(payload.session_id) : undefined;
+  if (pinned && !exclude.has(pinned.endpoint)) {
+    return pinned.endpoint;
+  }
+  let candidates = endpoints.filter((e) => !exclude.has(e));
+  if (payload.file_path) {
+    // The audio file only exists on this host
+    candidates = candidates.filter((e) => e.local);
+  }
+  const healthy = candidates.filter((e) => e.healthy);
+  // Health may be stale (e.g. right after startup), so unhealthy nodes are a last resort
+  if (healthy.length > 0) {
+    candidates = healthy;
+  }
+  if (candidates.length === 0) {
+    return null;
+  }
+
+  const byLoad = (a: ModelServerEndpoint, b: ModelServerEndpoint) => endpointLoad(a) - endpointLoad(b);
+  const coldest = [...candidates].sort(byLoad)[0];
+  const model = modelAffinity(payload);
+  const warm = model ? candidates.filter((e) => e.models.includes(model)).sort(byLoad)[0] : undefined;
+  if (warm && endpointLoad(warm) - endpointLoad(coldest) <= AFFINITY_SLACK) {
+    return warm;
+  }
+  return coldest;
+}
+
+// Errors raised before a request reached the node, so retrying it elsewhere cannot run it twice
+const CONNECT_ERRORS = new Set(["ECONNREFUSED", "ENOTFOUND", "EHOSTUNREACH", "ENETUNREACH", "EAI_AGAIN"]);
+
+/**
+ * POST a body and parse the JSON response. Uses http.request rather than
+ * fetch, whose 300 s headers timeout would abort long synchronous calls;
+ * the model server enforces the request's deadline itself.
+ */
+function postJson(
+  url: string,
+  body: Buffer | string | Readable,
+  contentType: string,
+  signal?: AbortSignal,
+): Promise<{ status: number; result: any }> {
+  return new Promise((resolve, reject) => {
+    const request = (url.startsWith("https:") ? https : http).request(url, {
+      method: "POST",
+      headers: { "Content-Type": contentType },
+      signal,
+    }, (response) => {
+      const chunks: Buffer[] = [];
+      response.on("data", (chunk: Buffer) => chunks.push(chunk));
+      response.on("error", reject);
+      response.on("end", () => {
+        try {
+          resolve({ status: response.statusCode || 0, result: JSON.parse(Buffer.concat(chunks).toString("utf8")) });
+        } catch (error) {
+          reject(error);
+        }
+      });
+    });
+    request.on("error", reject);
+    if (body instanceof Readable) {
+      body.on("error", (error) => request.destroy(error));
+      body.pipe(request);
+    } else {
+      request.end(body);
+    }
+  });
+}
+
+/**
+ * POST to the best model server, retrying on another node when one is
+ * unreachable or answers with a server error. `payload` is used for routing
+ * and is the JSON body unless `makeBody` builds another one (per attempt,
+ * since a stream can only be sent once).
+ *
+ * Requests that are not `idempotent` (job submissions) are only retried
+ * when they never reached the node; once sent, a second node could run the
+ * same job again.
+ */
+async function postWithFailover(
+  path: string,
+  payload: Record<string, unknown>,
+  makeBody?: () => { body: Buffer | string | Readable; contentType: string },
+  signal?: AbortSignal,
+  idempotent = true,
+): Promise<{ status: number; result: any; endpoint: ModelServerEndpoint }> {
+  const tried = new Set<ModelServerEndpoint>();
+  let lastError: Error | null = null;
+  signal?.throwIfAborted();
+
+  for (let endpoint = pickEndpoint(payload, tried); endpoint; endpoint = pickEndpoint(payload, tried)) {
+    tried.add(endpoint);
+    endpoint.inFlight++;
+    try {
+      const { body, contentType } = makeBody ? makeBody() : { body: JSON.stringify(payload), contentType: "application/json" };
+      const { status, result } = await postJson(`${endpoint.url}${path}`, body, contentType, signal);
+      if (status >= 500 && idempotent) {
+        throw new Error(result.error || `Model server returned ${status}`);
+      }
+      return { status, result, endpoint };
+    } catch (error: any) {
+      if (signal?.aborted) {
+        // Not the node's fault: stop the work it may have started and do not fail over
+        if (typeof payload.request_id === "string") {
+          void cancelRequest(endpoint, payload.request_id, abortReason(signal));
+        }
+        throw error;
+      }
+      lastError = error;
+      endpoint.healthy = false;
+      endpoint.lastError = error.message;
+      void checkEndpoint(endpoint);
+      if (!idempotent && !CONNECT_ERRORS.has(error.code)) {
+        throw error;
+      }
+      console.error(`[ModelServer] ${endpoint.url} failed (${error.message}), trying another node`);
+    } finally {
+      endpoint.inFlight--;
+    }
+  }
+  throw lastError || new Error("No model server available");
+}
 
 function getScriptsDir(): string {
   if (__dirname.includes("dist")) {
@@ -38,10 +316,11 @@ function getPythonCommand(): string {
   return process.platform === "win32" ? "python" : "python3";
 }
 
-export function startModelServer(): Promise<void> {
+function startLocalInstance(port: number): Promise<void> {
   return new Promise((resolve, reject) => {
-    if (modelServerProcess) {
-      console.log("[ModelServer] Server already running");
+    const endpoint = addEndpoint(`http://localhost:${port}`);
+    if (endpoint.process) {
+      console.log(`[ModelServer] Server already running on port ${port}`);
       resolve();
       return;
     }
@@ -49,74 +328,401 @@ export function startModelServer(): Promise<void> {
     const pythonCmd = getPythonCommand();
     const serverScript = path.join(getScriptsDir(), "model_server.py");
     
-    console.log(`[ModelServer] Starting model server: ${pythonCmd} ${serverScript} ${MODEL_SERVER_PORT}`);
+    console.log(`[ModelServer] Starting model server: ${pythonCmd} ${serverScript} ${port}`);
     
-    modelServerProcess = spawn(pythonCmd, [serverScript, MODEL_SERVER_PORT.toString()], {
+    const serverProcess = spawn(pythonCmd, [serverScript, port.toString()], {
       stdio: ['ignore', 'pipe', 'pipe'],
       detached: false,
     });
+    endpoint.process = serverProcess;
 
     let startupTimeout: NodeJS.Timeout;
     let hasStarted = false;
 
-    modelServerProcess.stdout?.on('data', (data: Buffer) => {
+    const onStarted = () => {
+      hasStarted = true;
+      clearTimeout(startupTimeout);
+      endpoint.healthy = true;
+      console.log(`[ModelServer] Server started successfully on port ${port}`);
+      resolve();
+    };
+
+    serverProcess.stdout?.on('data', (data: Buffer) => {
       const output = data.toString();
-      console.log(`[ModelServer] ${output.trim()}`);
+      console.log(`[ModelServer:${port}] ${output.trim()}`);
       
       if (output.includes('Starting model server') && !hasStarted) {
-        hasStarted = true;
-        clearTimeout(startupTimeout);
-        console.log(`[ModelServer] Server started successfully on port ${MODEL_SERVER_PORT}`);
-        resolve();
+        onStarted();
       }
     });
 
-    modelServerProcess.stderr?.on('data', (data: Buffer) => {
+    serverProcess.stderr?.on('data', (data: Buffer) => {
       const output = data.toString();
-      console.error(`[ModelServer] ${output.trim()}`);
+      console.error(`[ModelServer:${port}] ${output.trim()}`);
       
       if (output.includes('Starting model server') && !hasStarted) {
-        hasStarted = true;
-        clearTimeout(startupTimeout);
-        console.log(`[ModelServer] Server started successfully on port ${MODEL_SERVER_PORT}`);
-        resolve();
+        onStarted();
       }
     });
 
-    modelServerProcess.on('error', (error) => {
-      console.error(`[ModelServer] Failed to start: ${error.message}`);
-      modelServerProcess = null;
+    serverProcess.on('error', (error) => {
+      console.error(`[ModelServer] Failed to start on port ${port}: ${error.message}`);
+      endpoint.process = null;
+      endpoint.healthy = false;
       reject(error);
     });
 
-    modelServerProcess.on('exit', (code) => {
-      console.log(`[ModelServer] Server exited with code ${code}`);
-      modelServerProcess = null;
+    serverProcess.on('exit', (code) => {
+      console.log(`[ModelServer] Server on port ${port} exited with code ${code}`);
+      endpoint.process = null;
+      endpoint.healthy = false;
     });
 
     // Timeout after 90 seconds (models need time to preload)
     startupTimeout = setTimeout(() => {
       if (!hasStarted) {
-        console.log(`[ModelServer] Server startup timeout (models may still be loading), but continuing anyway`);
+        console.log(`[ModelServer] Server startup timeout on port ${port} (models may still be loading), but continuing anyway`);
         resolve(); // Resolve anyway - server might be starting or models loading
       }
     }, 90000); // 90 seconds for model preloading
   });
 }
 
+/**
+ * Start MODEL_SERVER_LOCAL_INSTANCES local model servers (default 1) and
+ * health-check them together with MODEL_SERVER_URLS.
+ */
+export async function startModelServer(): Promise<void> {
+  const ports = Array.from({ length: LOCAL_INSTANCES }, (_, i) => MODEL_SERVER_PORT + i);
+  const results = await Promise.allSettled(ports.map(startLocalInstance));
+  ensureEndpoints();
+
+  const failed = results.filter((r): r is PromiseRejectedResult => r.status === "rejected");
+  if (failed.length > 0 && failed.length === ports.length && REMOTE_URLS.length === 0) {
+    throw failed[0].reason;
+  }
+}
+
 export function stopModelServer(): void {
-  if (modelServerProcess) {
-    console.log("[ModelServer] Stopping model server");
-    modelServerProcess.kill();
-    modelServerProcess = null;
+  for (const endpoint of endpoints) {
+    if (endpoint.process) {
+      console.log(`[ModelServer] Stopping model server ${endpoint.url}`);
+      endpoint.process.kill();
+      endpoint.process = null;
+    }
+  }
+  if (healthTimer) {
+    clearInterval(healthTimer);
+    healthTimer = null;
   }
 }
 
+/**
+ * URL of the model server a request without affinity would go to
+ */
 export function getModelServerUrl(): string {
-  return `http://localhost:${MODEL_SERVER_PORT}`;
+  return pickEndpoint({}, new Set())?.url || `http://localhost:${MODEL_SERVER_PORT}`;
 }
 
 export function isModelServerRunning(): boolean {
-  return modelServerProcess !== null;
+  return endpoints.some((e) => e.healthy || e.process !== null);
+}
+
+/**
+ * Per-node health, load and warm models, for monitoring
+ */
+export function getModelServerEndpoints() {
+  ensureEndpoints();
+  return endpoints.map(({ process: child, ...endpoint }) => ({ ...endpoint, managed: child !== null }));
+}
+
+
+function abortReason(signal: AbortSignal): string {
+  return signal.reason?.message || String(signal.reason || "Cancelled by client");
 }
 
+/**
+ * Tag a payload with a request ID (so it can be cancelled while it runs) and its deadline
+ */
+function withCancellation(payload: Record<string, unknown>, options: ModelServerCallOptions): Record<string, unknown> {
+  return {
+    ...payload,
+    request_id: randomUUID(),
+    ...(options.deadlineSeconds ? { deadline_seconds: options.deadlineSeconds } : {}),
+  };
+}
+
+async function cancelRequest(endpoint: ModelServerEndpoint, requestId: string, reason: string): Promise<void> {
+  try {
+    await fetch(`${endpoint.url}/cancel`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ request_id: requestId, reason }),
+    });
+    console.log(`[ModelServer] Cancelled request ${requestId} on ${endpoint.url}: ${reason}`);
+  } catch (error: any) {
+    console.error(`[ModelServer] Could not cancel request ${requestId} on ${endpoint.url}: ${error.message}`);
+  }
+}
+
+/**
+ * Send a session's later requests to `endpoint`, which holds its state
+ */
+function pinSession(sessionId: string, endpoint: ModelServerEndpoint, final: boolean): void {
+  const now = Date.now();
+  sessionEndpoints.forEach((pin, id) => {
+    if (now - pin.updatedAt > SESSION_TTL_MS) {
+      sessionEndpoints.delete(id);
+    }
+  });
+  if (final) {
+    sessionEndpoints.delete(sessionId);
+  } else {
+    sessionEndpoints.set(sessionId, { endpoint, updatedAt: now });
+  }
+}
+
+/**
+ * Run an action synchronously on the model server and return its JSON result.
+ * Requests with a session_id (live summaries) stay on the node that served
+ * the session's first request, unless it fails.
+ */
+export async function callModelServer(payload: Record<string, unknown>, options: ModelServerCallOptions = {}): Promise<any> {
+  const { status, result, endpoint } = await postWithFailover("/", withCancellation(payload, options), undefined, options.signal);
+  if (typeof payload.session_id === "string") {
+    pinSession(payload.session_id, endpoint, payload.final === true);
+  }
+  if (status >= 400) {
+    throw new Error(result.error || `Model server returned ${status}`);
+  }
+  return result;
+}
+
+/**
+ * Transcribe audio on the model server by sending it in the request body, so
+ * the model server needs no access to this host's disk. `audio` is either the
+ * uploaded bytes or a local file path, which is streamed (chunked) rather
+ * than read into memory. Resolves with the same result shape as
+ * transcribeWithWorker().
+ */
+export async function transcribeOnModelServer(
+  audio: Buffer | string,
+  options: Omit<TranscribeOptions, "filePath">,
+  callOptions: ModelServerCallOptions = {},
+): Promise<any> {
+  const requestId = randomUUID();
+  const params = new URLSearchParams({
+    request_id: requestId,
+    model_size: options.modelSize,
+    device: options.device,
+    word_timestamps: String(Boolean(options.wordTimestamps)),
+    // Segments are only returned to clients with word timestamps; otherwise skip them
+    segment_format: options.wordTimestamps ? "objects" : "none",
+  });
+  if (options.language) {
+    params.set("language", options.language);
+  }
+  if (options.profile) {
+    params.set("profile", options.profile);
+  }
+  if (options.batchSize) {
+    params.set("batch_size", String(options.batchSize));
+  }
+  if (callOptions.deadlineSeconds) {
+    params.set("deadline_seconds", String(callOptions.deadlineSeconds));
+  }
+
+  const makeBody = () => ({
+    body: typeof audio === "string" ? createReadStream(audio) : audio,
+    contentType: "application/octet-stream",
+  });
+  const { status, result } = await postWithFailover(
+    `/transcribe/audio?${params}`,
+    { action: "transcribe", model_size: options.modelSize, request_id: requestId },
+    makeBody,
+    callOptions.signal,
+  );
+  if (status >= 400) {
+    throw new Error(result.error || `Model server returned ${status}`);
+  }
+  return result;
+}
+
+/**
+ * Live transcription: pipe 16 kHz 16-bit mono PCM to a model server while it
+ * is captured. Resolves with the model server's response as soon as it
+ * starts, a stream of newline-delimited JSON events (partial, final, end)
+ * that keep arriving while audio is still being sent. There is no failover,
+ * since the audio already sent cannot be replayed; aborting `signal` ends the stream.
+ */
+export function openTranscriptionStream(
+  audio: Readable,
+  options: Pick<TranscribeOptions, "modelSize" | "device" | "language" | "profile">,
+  signal?: AbortSignal,
+): Promise<IncomingMessage> {
+  const endpoint = pickEndpoint({ action: "transcribe", model_size: options.modelSize }, new Set());
+  if (!endpoint) {
+    return Promise.reject(new Error("No model server available"));
+  }
+  const params = new URLSearchParams({ model_size: options.modelSize, device: options.device });
+  if (options.language) {
+    params.set("language", options.language);
+  }
+  if (options.profile) {
+    params.set("profile", options.profile);
+  }
+
+  return new Promise((resolve, reject) => {
+    endpoint.inFlight++;
+    let done = false;
+    const finish = () => {
+      if (!done) {
+        done = true;
+        endpoint.inFlight--;
+      }
+    };
+    const url = `${endpoint.url}/transcribe/stream?${params}`;
+    const request = (url.startsWith("https:") ? https : http).request(url, {
+      method: "POST",
+      headers: { "Content-Type": "application/octet-stream", "Transfer-Encoding": "chunked" },
+      signal,
+    }, (response) => {
+      response.on("close", finish);
+      resolve(response);
+    });
+    request.on("error", (error) => {
+      finish();
+      reject(error);
+    });
+    audio.pipe(request);
+  });
+}
+
+/**
+ * Submit an asynchronous job to the model server.
+ * Returns the job ID immediately; poll getModelServerJob() for progress.
+ */
+export async function submitModelServerJob(
+  action: string,
+  payload: Record<string, unknown>,
+  options: ModelServerCallOptions = {},
+): Promise<string> {
+  const { status, result, endpoint } = await postWithFailover(
+    "/jobs",
+    withCancellation({ ...payload, action }, options),
+    undefined,
+    options.signal,
+    false,
+  );
+  if (status >= 400 || !result.success) {
+    throw new Error(result.error || `Model server returned ${status}`);
+  }
+  jobEndpoints.set(result.jobId, endpoint);
+  return result.jobId;
+}
+
+async function fetchJob(endpoint: ModelServerEndpoint, jobId: string, since: number): Promise<any | null> {
+  const response = await fetch(
+    `${endpoint.url}/jobs/${encodeURIComponent(jobId)}?since=${since}`,
+  );
+  if (response.status === 404) {
+    return null;
+  }
+  const result = await response.json();
+  if (!response.ok) {
+    throw new Error(result.error || `Model server returned ${response.status}`);
+  }
+  return result;
+}
+
+/**
+ * Read job status, progress, result and partial segments (from index `since`).
+ * Returns null if the job does not exist.
+ */
+export async function getModelServerJob(jobId: string, since = 0): Promise<any | null> {
+  const known = jobEndpoints.get(jobId);
+  if (known) {
+    const job = await fetchJob(known, jobId, since);
+    if (!job || TERMINAL_JOB_STATUSES.has(job.status)) {
+      // Finished jobs are looked up on every node again if they are ever asked for
+      jobEndpoints.delete(jobId);
+    }
+    return job;
+  }
+
+  // Submitted before this process started: ask every node
+  ensureEndpoints();
+  for (const endpoint of endpoints) {
+    try {
+      const job = await fetchJob(endpoint, jobId, since);
+      if (job) {
+        if (!TERMINAL_JOB_STATUSES.has(job.status)) {
+          jobEndpoints.set(jobId, endpoint);
+        }
+        return job;
+      }
+    } catch (error: any) {
+      console.error(`[ModelServer] Job lookup on ${endpoint.url} failed: ${error.message}`);
+    }
+  }
+  return null;
+}
+
+/**
+ * Follow a job as it runs: a stream of newline-delimited JSON events
+ * (segments, finished pipeline stages and a closing "end" event) from the
+ * node that has the job. Closing the stream does not cancel the job.
+ */
+export function openModelServerJobEvents(jobId: string, signal?: AbortSignal): Promise<IncomingMessage> {
+  const endpoint = jobEndpoints.get(jobId);
+  if (!endpoint) {
+    return Promise.reject(new Error(`Unknown model server job: ${jobId}`));
+  }
+  const url = `${endpoint.url}/jobs/${encodeURIComponent(jobId)}/events`;
+  // http.request rather than fetch: no events arrive while the job is queued or a
+  // generator stage runs, which can outlast fetch's 300 s body timeout
+  return new Promise((resolve, reject) => {
+    const request = (url.startsWith("https:") ? https : http).get(url, { signal }, (response) => {
+      if (response.statusCode === 200) {
+        resolve(response);
+        return;
+      }
+      const chunks: Buffer[] = [];
+      response.on("data", (chunk: Buffer) => chunks.push(chunk));
+      response.on("error", reject);
+      response.on("end", () => {
+        let error: string | undefined;
+        try {
+          error = JSON.parse(Buffer.concat(chunks).toString("utf8")).error;
+        } catch {
+          // Not JSON; report the status
+        }
+        reject(new Error(error || `Model server returned ${response.statusCode}`));
+      });
+    });
+    request.on("error", reject);
+  });
+}
+
+/**
+ * Cancel a queued or running asynchronous job.
+ * Returns false if no node has it unfinished.
+ */
+export async function cancelModelServerJob(jobId: string): Promise<boolean> {
+  const known = jobEndpoints.get(jobId);
+  if (!known) {
+    ensureEndpoints();
+  }
+  for (const endpoint of known ? [known] : endpoints) {
+    try {
+      const response = await fetch(`${endpoint.url}/jobs/${encodeURIComponent(jobId)}`, { method: "DELETE" });
+      if (response.ok) {
+        console.log(`[ModelServer] Cancelled job ${jobId} on ${endpoint.url}`);
+        return true;
+      }
+    } catch (error: any) {
+      console.error(`[ModelServer] Job cancel on ${endpoint.url} failed: ${error.message}`);
+    }
+  }
+  return false;
+}
@@ -1,17 +1,31 @@
-import type { Express, Request, Response } from "express";
+import type { Express, Request, Response, RequestHandler } from "express";
 import { createServer, type Server } from "http";
 import { storage } from "./storage";
 import { exec } from "child_process";
 import { promisify } from "util";
 import path from "path";
 import { fileURLToPath } from "url";
-import { existsSync, unlinkSync, mkdirSync } from "fs";
+import { existsSync, unlinkSync, mkdirSync, writeFileSync } from "fs";
 import { GoogleGenerativeAI } from "@google/generative-ai";
 import pptxgen from "pptxgenjs";
 import multer from "multer";
 import os from "os";
 import { uploadAudioToFirebase, checkAudioExists, downloadAudioFromFirebase } from "./firebaseStorage";
-import { getModelServerUrl, isModelServerRunning } from "./modelServer";
+import {
+  getModelServerUrl,
+  isModelServerRunning,
+  submitModelServerJob,
+  getModelServerJob,
+  callModelServer,
+  getModelServerEndpoints,
+  transcribeOnModelServer,
+  cancelModelServerJob,
+  openTranscriptionStream,
+  openModelServerJobEvents,
+  type ModelServerCallOptions,
+} from "./modelServer";
+import { transcribeWithWorker, expandSegmentColumns, type TranscribeOptions } from "./transcribeWorkers";
+import { schedulePrefetch, isPrefetchEnabled, getPrefetchStats } from "./youtubePrefetch";
 
 const execAsync = promisify(exec);
 const __filename = fileURLToPath(import.meta.url);
@@ -71,36 +85,137 @@ const storageConfig = multer.diskStorage({
   },
 });
 
+const audioFileFilter: multer.Options["fileFilter"] = (req, file, cb) => {
+  // Accept audio and video files
+  const allowedMimes = [
+    "audio/mpeg",
+    "audio/mp3",
+    "audio/wav",
+    "audio/webm",
+    "audio/ogg",
+    "audio/m4a",
+    "video/mp4",
+    "video/webm",
+    "video/ogg",
+    "video/quicktime",
+    "audio/x-m4a",
+    "audio/mp4",
+  ];
+  
+  if (allowedMimes.includes(file.mimetype)) {
+    cb(null, true);
+  } else {
+    cb(new Error(`Invalid file type. Allowed types: ${allowedMimes.join(", ")}`));
+  }
+};
+
+const uploadLimits = {
+  fileSize: 500 * 1024 * 1024, // 500MB max file size
+};
+
 const upload = multer({
   storage: storageConfig,
-  limits: {
-    fileSize: 500 * 1024 * 1024, // 500MB max file size
-  },
-  fileFilter: (req, file, cb) => {
-    // Accept audio and video files
-    const allowedMimes = [
-      "audio/mpeg",
-      "audio/mp3",
-      "audio/wav",
-      "audio/webm",
-      "audio/ogg",
-      "audio/m4a",
-      "video/mp4",
-      "video/webm",
-      "video/ogg",
-      "video/quicktime",
-      "audio/x-m4a",
-      "audio/mp4",
-    ];
-    
-    if (allowedMimes.includes(file.mimetype)) {
-      cb(null, true);
-    } else {
-      cb(new Error(`Invalid file type. Allowed types: ${allowedMimes.join(", ")}`));
-    }
-  },
+  limits: uploadLimits,
+  fileFilter: audioFileFilter,
+});
+
+// Uploads forwarded to the model server stay in memory (no temp file)
+const memoryUpload = multer({
+  storage: multer.memoryStorage(),
+  limits: uploadLimits,
+  fileFilter: audioFileFilter,
 });
 
+/**
+ * Accept an "audio" upload: in memory when a model server can take it,
+ * on disk for the local transcription workers otherwise
+ */
+const uploadAudio: RequestHandler = (req, res, next) =>
+  (isModelServerRunning() ? memoryUpload : upload).single("audio")(req, res, next);
+
+/**
+ * Caption-first policy: fetch the video's YouTube captions for the range and
+ * language with get_transcript.py, which scores them (caption_quality.py).
+ * Resolves with its result ("quality.acceptable" says whether the captions
+ * can be served instead of a Whisper transcription), or null if none could
+ * be fetched.
+ */
+async function fetchCaptions(
+  videoId: string,
+  startTime: number | null,
+  endTime: number | null,
+  language: string | null,
+  signal: AbortSignal,
+): Promise<any | null> {
+  const pythonScript = path.join(getScriptsDir(), "get_transcript.py");
+  const command = `${getPythonCommand()} "${pythonScript}" "${videoId}" "${startTime ?? ""}" "${endTime ?? ""}" "${language || "auto"}"`;
+  try {
+    const { stdout } = await execAsync(command, { signal });
+    const result = JSON.parse(stdout.trim());
+    return result.success ? result : null;
+  } catch (error: any) {
+    if (signal.aborted) {
+      throw error;
+    }
+    console.warn(`[API] Caption lookup failed for ${videoId}: ${error.message}`);
+    return null;
+  }
+}
+
+// Matches the 10 minute request timeout of the synchronous YouTube transcription endpoint
+const YOUTUBE_TRANSCRIBE_DEADLINE_SECONDS = 600;
+
+/**
+ * Abort signal for work done on behalf of a request: fires when the client
+ * disconnects before the response is sent, or after `deadlineSeconds`
+ */
+function requestSignal(res: Response, deadlineSeconds?: number): AbortSignal {
+  const controller = new AbortController();
+  res.on("close", () => {
+    if (!res.writableFinished) {
+      controller.abort(new Error("Client disconnected"));
+    }
+  });
+  if (!deadlineSeconds) {
+    return controller.signal;
+  }
+  return AbortSignal.any([controller.signal, AbortSignal.timeout(deadlineSeconds * 1000)]);
+}
+
+/**
+ * Transcribe on the model server when one is up, sending the audio in the
+ * request body so it may run on another host; otherwise, or if no model
+ * server node can take the request, on a local transcription worker.
+ * `audio` is the uploaded bytes or a local file path. Aborting
+ * `callOptions.signal` stops the transcription wherever it runs.
+ */
+async function transcribeAudio(
+  audio: Buffer | string,
+  options: Omit<TranscribeOptions, "filePath">,
+  callOptions: ModelServerCallOptions = {},
+): Promise<any> {
+  if (isModelServerRunning()) {
+    try {
+      return await transcribeOnModelServer(audio, options, callOptions);
+    } catch (error: any) {
+      if (callOptions.signal?.aborted) {
+        throw error;
+      }
+      console.warn(`[API] Model server transcription failed, using local worker: ${error.message}`);
+    }
+  }
+  if (typeof audio === "string") {
+    return transcribeWithWorker({ filePath: audio, ...options }, callOptions.signal);
+  }
+  const tempFile = path.join(uploadDir, `audio-${Date.now()}-${Math.round(Math.random() * 1e9)}`);
+  writeFileSync(tempFile, audio);
+  try {
+    return await transcribeWithWorker({ filePath: tempFile, ...options }, callOptions.signal);
+  } finally {
+    unlinkSync(tempFile);
+  }
+}
+
 export async function registerRoutes(
   httpServer: Server,
   app: Express,
@@ -111,6 +226,8 @@ export async function registerRoutes(
   /**
    * YouTube video info extraction endpoint (title, thumbnail, duration, etc.)
    * Uses Python script with yt-dlp (scripts/get_video_info.py)
+   * With prefetch (or YOUTUBE_PREFETCH set), the video's captions and audio are
+   * then fetched into the local cache in the background for the follow-up request
    */
   app.post("/api/youtube/info", async (req: Request, res: Response) => {
     try {
@@ -148,6 +265,11 @@ export async function registerRoutes(
           channel: result.channelName,
         });
 
+        const prefetch = req.body.prefetch ?? isPrefetchEnabled();
+        if (prefetch === true || prefetch === "true") {
+          schedulePrefetch(videoId);
+        }
+
         res.json({
           videoId: result.videoId,
           title: result.title,
@@ -265,10 +387,48 @@ export async function registerRoutes(
 
   /**
    * YouTube audio download and transcription endpoint using Faster Whisper
-   * Downloads audio from YouTube and converts it to text using Whisper
+   * Serves the video's captions when they score well enough (caption-first,
+   * unless source is "whisper" or word timestamps are requested); otherwise
+   * downloads audio from YouTube and converts it to text using Whisper.
+   * The response's "source" says which path served it.
    * Saves audio files to Firebase Storage for future use
    */
   app.post("/api/youtube/transcribe", async (req: Request, res: Response) => {
+    // Asynchronous mode: queue a job on the model server and return its ID right away.
+    // The client polls GET /api/jobs/:jobId instead of holding this connection open.
+    if (req.body.async === true || req.body.async === "true") {
+      const { videoId, startTime, endTime, modelSize = "large-v3", language, device = "cuda", profile, wordTimestamps, batchSize } = req.body;
+
+      if (!videoId || typeof videoId !== "string") {
+        return res.status(400).json({ error: "Video ID is required" });
+      }
+      if (!isModelServerRunning()) {
+        return res.status(503).json({ error: "Model server is not running; retry without async" });
+      }
+
+      try {
+        const jobId = await submitModelServerJob("transcribe_range", {
+          video_id: videoId,
+          start_time: startTime !== undefined && startTime !== null ? parseFloat(startTime) : null,
+          end_time: endTime !== undefined && endTime !== null ? parseFloat(endTime) : null,
+          model_size: modelSize,
+          language: language || null,
+          device,
+          profile: profile || null,
+          word_timestamps: wordTimestamps === true || wordTimestamps === "true",
+          batch_size: batchSize ? parseInt(batchSize, 10) || null : null,
+          // Scheduling: per-user concurrency cap and priority class ("interactive" | "normal" | "batch")
+          user_id: req.body.userId || (req as any).user?.uid || "anonymous",
+          priority: req.body.priority || "normal",
+        });
+        console.log(`[API] Queued transcription job ${jobId} for video: ${videoId}`);
+        return res.status(202).json({ jobId, status: "queued" });
+      } catch (error: any) {
+        console.error("[API] Error submitting transcription job:", error);
+        return res.status(502).json({ error: "Failed to submit transcription job", details: error.message });
+      }
+    }
+
     let downloadedFilePath: string | null = null;
     // Get userId from request body or auth (if available)
     const userId = req.body.userId || (req as any).user?.uid || "anonymous";
@@ -276,6 +436,9 @@ export async function registerRoutes(
     // Set longer timeout to prevent proxy timeout
     req.setTimeout(600000); // 10 minutes timeout
     res.setTimeout(600000); // 10 minutes timeout
+    // Stops the download and transcription if the client goes away or time runs out
+    const signal = requestSignal(res, YOUTUBE_TRANSCRIBE_DEADLINE_SECONDS);
+    const callOptions: ModelServerCallOptions = { signal, deadlineSeconds: YOUTUBE_TRANSCRIBE_DEADLINE_SECONDS };
     
     // Start keep-alive mechanism to prevent proxy timeout
     // Send headers immediately with chunked encoding
@@ -324,7 +487,7 @@ export async function registerRoutes(
     res.on('close', cleanup);
     
     try {
-      const { videoId, startTime, endTime, modelSize = "large-v3", language, device = "cuda" } = req.body;
+      const { videoId, startTime, endTime, modelSize = "large-v3", language, device = "cuda", profile, wordTimestamps, batchSize, source = "auto" } = req.body;
 
       if (!videoId || typeof videoId !== "string") {
         return res.status(400).json({ error: "Video ID is required" });
@@ -333,10 +496,90 @@ export async function registerRoutes(
       const startTimeSeconds = startTime !== undefined && startTime !== null ? parseFloat(startTime) : null;
       const endTimeSeconds = endTime !== undefined && endTime !== null ? parseFloat(endTime) : null;
 
+      // Captions come back in about a second; Whisper is only queued when they are missing or poor.
+      // They carry no word timings, so requests for word timestamps always use Whisper.
+      let captionQuality: any = undefined;
+      if (source !== "whisper" && wordTimestamps !== true && wordTimestamps !== "true") {
+        const captions = await fetchCaptions(videoId, startTimeSeconds, endTimeSeconds, language || null, signal);
+        captionQuality = captions?.quality;
+        if (captions?.transcript && captionQuality?.acceptable) {
+          cleanup();
+          if (res.writableEnded || !res.writable) {
+            console.warn("[API] Response already ended, skipping duplicate response");
+            return;
+          }
+          console.log(`[API] Served captions for ${videoId} (quality ${captionQuality.score}, ${captions.transcript.length} characters)`);
+          res.write(JSON.stringify({
+            transcript: captions.transcript,
+            wordCount: captions.wordCount,
+            characterCount: captions.transcript.length,
+            language: captions.language,
+            source: "captions",
+            captionQuality,
+          }));
+          res.end();
+          return;
+        }
+        console.log(
+          `[API] Captions for ${videoId} ${captionQuality ? `scored ${captionQuality.score} (below ${captionQuality.threshold})` : "unavailable"}, using Whisper`,
+        );
+      }
+
       console.log(`[API] Downloading and transcribing YouTube video: ${videoId}`);
       console.log(`[API] Time range: ${startTimeSeconds || 0}s - ${endTimeSeconds || "end"}`);
       console.log(`[API] Model: ${modelSize}, Language: ${language || "auto"}, Device: ${device}`);
 
+      // Time-range requests go to the model server, which keeps transcripts per video and
+      // model and only transcribes the parts of the range it has not transcribed before
+      if ((startTimeSeconds !== null || endTimeSeconds !== null) && isModelServerRunning()) {
+        const rangeResult = await callModelServer({
+          action: "transcribe_range",
+          video_id: videoId,
+          start_time: startTimeSeconds,
+          end_time: endTimeSeconds,
+          model_size: modelSize,
+          language: language || null,
+          device,
+          profile: profile || null,
+          batch_size: batchSize ? parseInt(batchSize, 10) || null : null,
+          // Word timings are not stored, so with them the range is transcribed afresh
+          word_timestamps: wordTimestamps === true || wordTimestamps === "true",
+          segment_format: wordTimestamps === true || wordTimestamps === "true" ? "columns" : "none",
+          user_id: userId,
+        }, callOptions);
+
+        cleanup();
+        if (res.writableEnded || !res.writable) {
+          console.warn("[API] Response already ended, skipping duplicate response");
+          return;
+        }
+
+        if (!rangeResult.success || !rangeResult.transcript) {
+          res.write(JSON.stringify({
+            error: rangeResult.error || "Transcription failed",
+            details: rangeResult.details || "Could not transcribe the requested range.",
+          }));
+          res.end();
+          return;
+        }
+
+        console.log(
+          `[API] Range transcribed (${rangeResult.transcribedSeconds.toFixed(1)}s new, ${rangeResult.reusedSeconds.toFixed(1)}s reused)`,
+        );
+        res.write(JSON.stringify({
+          transcript: rangeResult.transcript,
+          wordCount: rangeResult.wordCount,
+          characterCount: rangeResult.characterCount,
+          language: rangeResult.language,
+          profile: rangeResult.profile,
+          segments: rangeResult.segmentColumns ? expandSegmentColumns(rangeResult.segmentColumns) : undefined,
+          source: "whisper",
+          captionQuality,
+        }));
+        res.end();
+        return;
+      }
+
       // Check if audio already exists in Firebase Storage (only if no time range specified)
       let audioUrl: string | null = null;
       if (startTimeSeconds === null && endTimeSeconds === null) {
@@ -355,7 +598,7 @@ export async function registerRoutes(
       }
 
       try {
-        // Get Python command (needed for both download and transcription)
+        // Get Python command (needed for the download script)
         const pythonCmd = getPythonCommand();
         
         // Step 1: Download audio from YouTube (if not found in Firebase)
@@ -375,7 +618,7 @@ export async function registerRoutes(
           }
 
           console.log(`[API] Downloading audio from YouTube...`);
-          const { stdout: downloadStdout, stderr: downloadStderr } = await execAsync(downloadCommand);
+          const { stdout: downloadStdout, stderr: downloadStderr } = await execAsync(downloadCommand, { signal });
 
           if (downloadStderr) {
             console.error(`[API] Python stderr (download):`, downloadStderr);
@@ -413,24 +656,15 @@ export async function registerRoutes(
           });
         }
         
-        const transcribeScript = path.join(getScriptsDir(), "transcribe_audio.py");
-        
-        let transcribeCommand = `${pythonCmd} "${transcribeScript}" "${downloadedFilePath}" "${modelSize}"`;
-        if (language) {
-          transcribeCommand += ` "${language}"`;
-        } else {
-          transcribeCommand += ` "None"`;
-        }
-        transcribeCommand += ` "${device}"`;
-
         console.log(`[API] Transcribing audio with Whisper...`);
-        const { stdout: transcribeStdout, stderr: transcribeStderr } = await execAsync(transcribeCommand);
-
-        if (transcribeStderr) {
-          console.error(`[API] Python stderr (transcription):`, transcribeStderr);
-        }
-
-        const transcribeResult = JSON.parse(transcribeStdout.trim());
+        const transcribeResult = await transcribeAudio(downloadedFilePath, {
+          modelSize,
+          language,
+          device,
+          profile,
+          wordTimestamps: wordTimestamps === true || wordTimestamps === "true",
+          batchSize: batchSize ? parseInt(batchSize, 10) || undefined : undefined,
+        }, callOptions);
 
         if (!transcribeResult.success) {
           return res.status(500).json({
@@ -467,7 +701,12 @@ export async function registerRoutes(
           wordCount: transcribeResult.wordCount,
           characterCount: transcribeResult.characterCount || transcript.length,
           language: transcribeResult.language,
+          profile: transcribeResult.profile,
+          // Segments (with word timings) are only sent when the client asked for alignment
+          segments: wordTimestamps === true || wordTimestamps === "true" ? transcribeResult.segments : undefined,
           audioUrl: audioUrl || undefined, // Include Firebase Storage URL if available
+          source: "whisper",
+          captionQuality,
         });
         
         res.write(responseData);
@@ -527,11 +766,82 @@ export async function registerRoutes(
     }
   });
 
+  /**
+   * Speculative prefetch statistics: hit rate, wasted bytes and pending entries
+   * GET /api/youtube/prefetch/stats
+   */
+  app.get("/api/youtube/prefetch/stats", async (_req: Request, res: Response) => {
+    try {
+      res.json(await getPrefetchStats());
+    } catch (error: any) {
+      console.error("[API] Error reading prefetch stats:", error);
+      res.status(500).json({ error: "Failed to read prefetch stats", details: error.message });
+    }
+  });
+
+  /**
+   * Model server nodes: health, load and warm models as seen by the load balancer
+   * GET /api/model-servers
+   */
+  app.get("/api/model-servers", (_req: Request, res: Response) => {
+    res.json({ endpoints: getModelServerEndpoints() });
+  });
+
+  /**
+   * Job status endpoint for asynchronous transcriptions
+   * GET /api/jobs/:jobId?since=N
+   * Returns status, progress (0-1), partial segments from index N and, once finished, the result
+   */
+  app.get("/api/jobs/:jobId", async (req: Request, res: Response) => {
+    try {
+      const since = parseInt(String(req.query.since || "0"), 10) || 0;
+      const job = await getModelServerJob(req.params.jobId, since);
+
+      if (!job) {
+        return res.status(404).json({ error: "Job not found" });
+      }
+
+      const result = job.result || {};
+      res.json({
+        jobId: job.id,
+        status: job.status,
+        progress: job.progress,
+        segments: job.segments,
+        segmentCount: job.segmentCount,
+        error: job.error || undefined,
+        transcript: job.status === "completed" ? result.transcript : undefined,
+        wordCount: job.status === "completed" ? result.wordCount : undefined,
+        characterCount: job.status === "completed" ? result.characterCount : undefined,
+        language: job.status === "completed" ? result.language : undefined,
+      });
+    } catch (error: any) {
+      console.error("[API] Error reading job status:", error);
+      res.status(502).json({ error: "Failed to read job status", details: error.message });
+    }
+  });
+
+  /**
+   * Cancel an asynchronous transcription job
+   * DELETE /api/jobs/:jobId
+   * A queued job is dropped; a running one stops at its next segment
+   */
+  app.delete("/api/jobs/:jobId", async (req: Request, res: Response) => {
+    try {
+      if (!(await cancelModelServerJob(req.params.jobId))) {
+        return res.status(404).json({ error: "Job not found or already finished" });
+      }
+      res.json({ jobId: req.params.jobId, status: "cancelled" });
+    } catch (error: any) {
+      console.error("[API] Error cancelling job:", error);
+      res.status(502).json({ error: "Failed to cancel job", details: error.message });
+    }
+  });
+
   /**
    * Audio file transcription endpoint using Faster Whisper
    * Accepts audio/video files and converts them to text transcript
    */
-  app.post("/api/audio/transcribe", upload.single("audio"), async (req: Request, res: Response) => {
+  app.post("/api/audio/transcribe", uploadAudio, async (req: Request, res: Response) => {
     let uploadedFilePath: string | null = null;
     
     try {
@@ -539,7 +849,8 @@ export async function registerRoutes(
         return res.status(400).json({ error: "No audio file uploaded" });
       }
 
-      uploadedFilePath = req.file.path;
+      // Unset when the upload was kept in memory for the model server
+      uploadedFilePath = req.file.path || null;
       
       // Extract parameters from FormData (multer puts them in req.body)
       // Default to large-v3 for best quality (especially on GPU/RunPod)
@@ -551,6 +862,11 @@ export async function registerRoutes(
       if (device === "gpu") {
         device = "cuda";
       }
+      // Decoding profile ("fast" | "balanced" | "accurate"), automatic when omitted
+      const profile = req.body.profile || undefined;
+      const wordTimestamps = req.body.wordTimestamps === true || req.body.wordTimestamps === "true";
+      // Opt-in batched Whisper inference (segments decoded in parallel batches)
+      const batchSize = req.body.batchSize ? parseInt(req.body.batchSize, 10) || undefined : undefined;
       
       // Log configuration for debugging
       console.log(`[API] Whisper Configuration:`, {
@@ -564,26 +880,15 @@ export async function registerRoutes(
       console.log(`[API] Model: ${modelSize}, Language: ${language || "auto"}, Device: ${device}`);
 
       try {
-        const pythonScript = path.join(__dirname, "scripts", "transcribe_audio.py");
-        const pythonCmd = getPythonCommand();
-        
-        // Build command with parameters
-        let command = `${pythonCmd} "${pythonScript}" "${uploadedFilePath}" "${modelSize}"`;
-        if (language) {
-          command += ` "${language}"`;
-        } else {
-          command += ` "None"`;
-        }
-        command += ` "${device}"`;
-
-        console.log(`[API] Calling Python script for transcription...`);
-        const { stdout, stderr } = await execAsync(command);
-
-        if (stderr) {
-          console.error(`[API] Python stderr (transcription):`, stderr);
-        }
-
-        const result = JSON.parse(stdout.trim());
+        console.log(`[API] Sending audio for transcription...`);
+        const result = await transcribeAudio(req.file.buffer || uploadedFilePath!, {
+          modelSize,
+          language,
+          device,
+          profile,
+          wordTimestamps,
+          batchSize,
+        }, { signal: requestSignal(res) });
 
         if (!result.success) {
           return res.status(500).json({
@@ -610,6 +915,8 @@ export async function registerRoutes(
           wordCount: result.wordCount,
           characterCount: result.characterCount || transcript.length,
           language: result.language,
+          profile: result.profile,
+          segments: wordTimestamps ? result.segments : undefined,
         });
       } catch (pythonError: any) {
         console.error("[API] Error calling Python script for transcription:", pythonError);
@@ -643,6 +950,111 @@ export async function registerRoutes(
     }
   });
 
+  /**
+   * Live transcription endpoint (model server only)
+   * POST /api/transcribe/live?language=en&modelSize=large-v3&device=cuda
+   * Body: 16 kHz 16-bit mono PCM, sent with chunked transfer encoding while it is captured
+   * Returns newline-delimited JSON events as they are decoded:
+   *   { "type": "partial" | "final", "start": 1.2, "end": 3.4, "text": "..." }
+   *   ... { "type": "end", "audioSeconds": ..., "realTimeFactor": ... }
+   * A partial is replaced by the next partial or by the final segments of the same utterance.
+   */
+  app.post("/api/transcribe/live", async (req: Request, res: Response) => {
+    if (!isModelServerRunning()) {
+      return res.status(503).json({ error: "Live transcription needs the model server" });
+    }
+    const modelSize = String(req.query.modelSize || "large-v3");
+    const language = req.query.language ? String(req.query.language) : undefined;
+    const profile = req.query.profile ? String(req.query.profile) : undefined;
+    const device = req.query.device === "cpu" ? "cpu" : "cuda";
+
+    try {
+      console.log(`[API] Live transcription started (model: ${modelSize}, language: ${language || "auto"}, device: ${device})`);
+      const upstream = await openTranscriptionStream(req, { modelSize, language, profile, device }, requestSignal(res));
+      res.status(upstream.statusCode || 502);
+      res.setHeader("Content-Type", upstream.headers["content-type"] || "application/x-ndjson");
+      res.setHeader("Cache-Control", "no-cache");
+      upstream.on("error", (error) => {
+        console.error("[API] Live transcription stream ended early:", error.message);
+        res.end();
+      });
+      upstream.pipe(res);
+    } catch (error: any) {
+      console.error("[API] Error in live transcription:", error);
+      if (!res.headersSent) {
+        res.status(502).json({ error: "Live transcription failed", details: error.message });
+      }
+    }
+  });
+
+  /**
+   * End-to-end lecture processing on the model server (one request instead of
+   * transcription, summary, quiz and flashcards round trips)
+   * POST /api/lecture/process
+   * Body: { "videoId": "..." | "transcript": "...", "startTime"?, "endTime"?, "language"?, "modelSize"?,
+   *         "device"?, "source"?: "auto" | "whisper", "artifacts"?: ["summary", "quiz", "flashcards"] }
+   * Returns newline-delimited JSON events as each stage finishes (header X-Job-Id):
+   *   { "type": "artifact", "stage": "transcribe" | "summary" | ..., "status": "completed", "result": {...} }
+   *   { "type": "segment", "start", "end", "text" } while Whisper transcribes
+   *   { "type": "end", "status": "completed" | "failed" | "cancelled", "error", "result" }
+   */
+  app.post("/api/lecture/process", async (req: Request, res: Response) => {
+    const { videoId, transcript, startTime, endTime, language, modelSize, device, source, artifacts } = req.body;
+    if (!videoId && (!transcript || typeof transcript !== "string")) {
+      return res.status(400).json({ error: "Video ID or transcript is required" });
+    }
+    if (!isModelServerRunning()) {
+      return res.status(503).json({ error: "Lecture processing needs the model server" });
+    }
+
+    let jobId: string;
+    try {
+      jobId = await submitModelServerJob("process_lecture", {
+        video_id: videoId || null,
+        transcript: transcript || null,
+        start_time: startTime !== undefined && startTime !== null ? parseFloat(startTime) : null,
+        end_time: endTime !== undefined && endTime !== null ? parseFloat(endTime) : null,
+        model_size: modelSize || "large-v3",
+        language: language || null,
+        device: device === "cpu" ? "cpu" : "cuda",
+        source: source === "whisper" ? "whisper" : "auto",
+        artifacts: Array.isArray(artifacts) ? artifacts : null,
+        user_id: req.body.userId || (req as any).user?.uid || "anonymous",
+        priority: req.body.priority || "interactive",
+      });
+    } catch (error: any) {
+      console.error("[API] Error submitting lecture processing job:", error);
+      return res.status(502).json({ error: "Failed to submit lecture processing", details: error.message });
+    }
+    console.log(`[API] Processing lecture as job ${jobId} (${videoId ? `video ${videoId}` : `${transcript.length} character transcript`})`);
+
+    // Nobody is left to receive the artifacts, so the remaining stages are not worth running
+    res.on("close", () => {
+      if (!res.writableFinished) {
+        void cancelModelServerJob(jobId);
+      }
+    });
+
+    try {
+      const events = await openModelServerJobEvents(jobId, requestSignal(res));
+      res.status(200);
+      res.setHeader("Content-Type", "application/x-ndjson");
+      res.setHeader("Cache-Control", "no-cache");
+      res.setHeader("X-Job-Id", jobId);
+      events
+        .on("error", (error) => {
+          console.error(`[API] Lecture processing event stream for job ${jobId} ended early:`, error.message);
+          res.end();
+        })
+        .pipe(res);
+    } catch (error: any) {
+      console.error("[API] Error following lecture processing job:", error);
+      if (!res.headersSent) {
+        res.status(502).json({ error: "Failed to follow lecture processing", details: error.message, jobId });
+      }
+    }
+  });
+
   /**
    * AI Summary endpoint
    * Priority:
@@ -897,7 +1309,8 @@ ${transcript.substring(0, 20000)}`,
           
           const command = `${pythonCmd} "${pythonScript}" "${escapedTranscript}" "cuda"`;
           
-          const { stdout, stderr } = await execAsync(command);
+          // Killed if the client disconnects, freeing the GPU for other requests
+          const { stdout, stderr } = await execAsync(command, { signal: requestSignal(res) });
           
           if (stderr) {
             console.error(`[API] Python stderr (summary):`, stderr);
@@ -970,6 +1383,51 @@ ${transcript.substring(0, 20000)}`,
 
   });
 
+  /**
+   * Rolling summary of a live or streaming transcript (model server only)
+   * POST /api/ai/summary/live
+   * Body: { "sessionId": "...", "segments": [{ "start": 0, "end": 4.2, "text": "..." }], "final": false }
+   * Send only the segments transcribed since the previous call; every ~60s of
+   * speech is summarized and merged into the session's summary.
+   * Returns: { "summary", "intro", "keyPoints", "summarizedUntil", "pendingSeconds", ... }
+   */
+  app.post("/api/ai/summary/live", async (req: Request, res: Response) => {
+    try {
+      const { sessionId, segments, final, device } = req.body as {
+        sessionId?: string;
+        segments?: { start: number; end: number; text: string }[];
+        final?: boolean;
+        device?: string;
+      };
+
+      if (!sessionId || typeof sessionId !== "string") {
+        return res.status(400).json({ error: "Session ID is required" });
+      }
+      if (!Array.isArray(segments)) {
+        return res.status(400).json({ error: "Segments are required" });
+      }
+      if (!isModelServerRunning()) {
+        return res.status(503).json({ error: "Live summaries need the model server" });
+      }
+
+      const result = await callModelServer({
+        action: "summarize_segments",
+        session_id: sessionId,
+        segments,
+        final: final === true,
+        device: device || "cuda",
+      }, { signal: requestSignal(res) });
+
+      if (!result.success) {
+        return res.status(500).json({ error: result.error || "Failed to update summary" });
+      }
+      return res.json(result);
+    } catch (error: any) {
+      console.error("[API] Error updating live summary:", error);
+      res.status(500).json({ error: "Failed to update summary" });
+    }
+  });
+
   /**
    * Quiz generation endpoint using Gemini API
    * POST /api/ai/quiz
@@ -1113,7 +1571,8 @@ ${transcript.substring(0, 30000)}`;
           
           const command = `${pythonCmd} "${pythonScript}" "${escapedTranscript}" "cuda"`;
           
-          const { stdout, stderr } = await execAsync(command);
+          // Killed if the client disconnects, freeing the GPU for other requests
+          const { stdout, stderr } = await execAsync(command, { signal: requestSignal(res) });
           
           if (stderr) {
             console.error(`[API] Python stderr (quiz):`, stderr);
@@ -1336,7 +1795,8 @@ ${transcript.substring(0, 30000)}`;
           
           const command = `${pythonCmd} "${pythonScript}" "${escapedTranscript}" "cuda"`;
           
-          const { stdout, stderr } = await execAsync(command);
+          // Killed if the client disconnects, freeing the GPU for other requests
+          const { stdout, stderr } = await execAsync(command, { signal: requestSignal(res) });
           
           if (stderr) {
             console.error(`[API] Python stderr (flashcards):`, stderr);
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Startup autotuning for the model server
+Times a short fixture clip (and prompt) across candidate compute types and
+thread counts, and keeps the fastest configuration per host in a profile
+file so later starts apply it without calibrating again
+"""
+import os
+import sys
+import time
+import platform
+from typing import Any, Dict, List, Optional
+
+from local_cache import get_cache_dir, read_json, write_json, file_lock
+from model_replicas import pinned_to
+
+# off - never calibrate; auto - calibrate settings this host has no profile for; always - recalibrate on every start
+AUTOTUNE = os.environ.get("MODEL_SERVER_AUTOTUNE", "auto")
+PROFILE_PATH = os.environ.get("MODEL_SERVER_TUNING_PROFILE")
+# Relative compute-type and thread-count speed carries over between sizes, so a small model keeps calibration short
+TUNING_MODEL = os.environ.get("MODEL_SERVER_TUNING_MODEL", "small")
+# Optional audio file to time instead of the synthetic clip
+TUNING_CLIP = os.environ.get("MODEL_SERVER_TUNING_CLIP")
+FIXTURE_SECONDS = 10
+SAMPLE_RATE = 16000
+# Not calibrated (needs concurrent load to measure); parallel transcribe() calls per Whisper model
+WHISPER_NUM_WORKERS = int(os.environ.get("MODEL_SERVER_WHISPER_NUM_WORKERS", "1"))
+
+CANDIDATE_COMPUTE_TYPES = {
+    "cuda": ("float16", "int8_float16", "bfloat16"),
+    "cpu": ("int8", "int8_float32", "float32"),
+}
+DEFAULT_COMPUTE_TYPES = {"cuda": "float16", "cpu": "int8"}
+
+def host_id() -> str:
+    """Profile key: settings only carry over to the same machine and GPUs"""
+    gpus = []
+    try:
+        import torch
+        if torch.cuda.is_available():
+            gpus = [torch.cuda.get_device_name(i) for i in range(torch.cuda.device_count())]
+    except ImportError:
+        pass
+    return f"{platform.node()}|{os.cpu_count()}cpu|{','.join(gpus) or 'nogpu'}"
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def thread_candidates(cores: int) -> List[int]:
+    return sorted({max(1, cores // 4), max(1, cores // 2), cores})
+
+class TuningProfile:
+    """Per-host settings in a JSON file shared by every model server on the machine"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or PROFILE_PATH or os.path.join(get_cache_dir(), "tuning_profile.json")
+        self.host = host_id()
+        self.settings: Dict[str, Any] = (read_json(self.path) or {}).get(self.host, {})
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.settings.get(key)
+
+    def needs_tuning(self, key: str) -> bool:
+        return AUTOTUNE == "always" or (AUTOTUNE == "auto" and key not in self.settings)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        self.settings[key] = dict(value, tunedAt=time.time())
+        # Other instances may be saving their own results at the same time
+        with file_lock(self.path + ".lock"):
+            data = read_json(self.path) or {}
+            data.setdefault(self.host, {})[key] = self.settings[key]
+            write_json(self.path, data)
+        print(f"[Autotune] Saved {key}: {value}", file=sys.stderr)
+
+_profile = None
+
+def get_profile() -> TuningProfile:
+    global _profile
+    if _profile is None:
+        _profile = TuningProfile()
+    return _profile
+
+def whisper_key(device: str, cores: Optional[List[int]] = None) -> str:
+    if device == "cuda":
+        return "whisper:cuda"
+    return f"whisper:cpu:{len(cores) if cores else available_cores()}"
+
+def whisper_settings(device: str, cores: Optional[List[int]] = None) -> Dict[str, Any]:
+    """compute_type, cpu_threads and num_workers for a Whisper model (tuned, else defaults)"""
+    settings = {
+        "compute_type": DEFAULT_COMPUTE_TYPES.get(device, "int8"),
+        "cpu_threads": len(cores) if cores else 0,
+        "num_workers": WHISPER_NUM_WORKERS,
+    }
+    tuned = get_profile().get(whisper_key(device, cores))
+    if tuned:
+        settings["compute_type"] = tuned["compute_type"]
+        if device == "cpu":
+            settings["cpu_threads"] = tuned["cpu_threads"]
+    return settings
+
+def qwen_key(cores: Optional[int] = None) -> str:
+    return f"qwen:cpu:{cores or available_cores()}"
+
+def qwen_cpu_threads(cores: Optional[int] = None, replicas: int = 1) -> int:
+    """torch intra-op threads for Qwen on CPU: tuned, else the cores split between replicas"""
+    cores = cores or available_cores()
+    tuned = get_profile().get(qwen_key(cores))
+    if tuned:
+        return tuned["torch_threads"]
+    # torch's default of one thread per core oversubscribes when replicas run side by side
+    return max(1, cores // max(1, replicas))
+
+def fixture_audio():
+    """The calibration clip: TUNING_CLIP if set, else 10 s of speech-like synthetic audio"""
+    if TUNING_CLIP:
+        return TUNING_CLIP
+    import numpy as np
+    t = np.arange(FIXTURE_SECONDS * SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+    # Voiced harmonics with a pitch wobble, gated at a syllable-like 4 Hz, plus noise
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    noise = np.random.default_rng(0).normal(0, 0.02, t.shape)
+    return (0.3 * voiced * envelope + noise).astype(np.float32)
+
+def _time_transcription(model, audio, runs: int = 2) -> float:
+    """Best-of-`runs` seconds for one decode of the clip, after a warm-up run"""
+    options = dict(language="en", beam_size=5, temperature=0.0, vad_filter=False,
+                   condition_on_previous_text=False, max_new_tokens=64)
+    timings = []
+    for run in range(runs + 1):
+        started = time.perf_counter()
+        segments, _ = model.transcribe(audio, **options)
+        for _ in segments:
+            pass
+        if run:
+            timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def calibrate_whisper(device: str, device_index: int = 0, cores: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+    """Time every supported compute type (and thread count on CPU) and save the fastest
+
+    Returns:
+        The saved settings, or None if nothing could be timed
+    """
+    import ctranslate2
+    from faster_whisper import WhisperModel
+
+    key = whisper_key(device, cores)
+    supported = ctranslate2.get_supported_compute_types(device, device_index)
+    compute_types = [c for c in CANDIDATE_COMPUTE_TYPES[device] if c in supported]
+    threads = [0] if device == "cuda" else thread_candidates(len(cores) if cores else available_cores())
+    audio = fixture_audio()
+
+    print(f"[Autotune] Calibrating {key} with Whisper {TUNING_MODEL}: compute types {compute_types}, threads {threads}", file=sys.stderr)
+    trials = []
+    for compute_type in compute_types:
+        for cpu_threads in threads:
+            try:
+                with pinned_to(cores):
+                    model = WhisperModel(TUNING_MODEL, device=device, device_index=device_index,
+                                         compute_type=compute_type, cpu_threads=cpu_threads)
+                    seconds = _time_transcription(model, audio)
+                del model
+            except Exception as e:
+                print(f"[Autotune] {compute_type}/{cpu_threads} threads failed: {e}", file=sys.stderr)
+                continue
+            print(f"[Autotune] {compute_type}, {cpu_threads or 'default'} threads: {seconds:.2f}s", file=sys.stderr)
+            trials.append({"compute_type": compute_type, "cpu_threads": cpu_threads, "seconds": round(seconds, 3)})
+
+    if not trials:
+        return None
+    best = min(trials, key=lambda t: t["seconds"])
+    get_profile().set(key, dict(best, trials=trials))
+    return best
+
+def calibrate_qwen_cpu(model, tokenizer, cores: Optional[int] = None) -> int:
+    """Time a short greedy generation at each torch thread count, save and apply the fastest"""
+    import torch
+
+    cores = cores or available_cores()
+    previous = torch.get_num_threads()
+    inputs = tokenizer("Summarize the main idea of this lecture about photosynthesis in plants.", return_tensors="pt")
+    trials = []
+    try:
+        for threads in thread_candidates(cores):
+            torch.set_num_threads(threads)
+            timings = []
+            with torch.no_grad():
+                for run in range(3):
+                    started = time.perf_counter()
+                    model.generate(**inputs, max_new_tokens=16, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+                    if run:
+                        timings.append(time.perf_counter() - started)
+            print(f"[Autotune] Qwen CPU, {threads} threads: {min(timings):.2f}s", file=sys.stderr)
+            trials.append({"torch_threads": threads, "seconds": round(min(timings), 3)})
+    except Exception:
+        torch.set_num_threads(previous)
+        raise
+
+    best = min(trials, key=lambda t: t["seconds"])
+    torch.set_num_threads(best["torch_threads"])
+    get_profile().set(qwen_key(cores), dict(best, trials=trials))
+    return best["torch_threads"]
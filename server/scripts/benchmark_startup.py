@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the per-request Python scripts
+Measures how long each script takes to start, validate its arguments and exit
+"""
+import sys
+import json
+import os
+import time
+import statistics
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (script, args) pairs that exercise the cheap paths: missing or invalid
+# arguments that should fail fast without importing any model library
+CASES = [
+    ("get_video_info.py", []),
+    ("get_transcript.py", []),
+    ("download_youtube_audio.py", []),
+    ("youtube_prefetch.py", []),
+    ("transcribe_audio.py", []),
+    ("transcribe_audio.py", ["/nonexistent/audio.mp3"]),
+    ("generate_summary.py", ["too short"]),
+    ("generate_quiz.py", ["too short"]),
+    ("generate_flashcards.py", ["too short"]),
+]
+
+def time_command(command, runs=5):
+    """Run a command `runs` times and return wall-clock timings in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=SCRIPTS_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def run_benchmark(runs=5):
+    """Benchmark every case and return a list of result dictionaries"""
+    # Baseline: the interpreter itself, so script overhead can be read off directly
+    baseline = statistics.median(time_command([sys.executable, "-c", "pass"], runs))
+
+    results = []
+    for script, args in CASES:
+        timings = time_command([sys.executable, os.path.join(SCRIPTS_DIR, script)] + args, runs)
+        median_ms = statistics.median(timings)
+        results.append({
+            "script": script,
+            "args": args,
+            "minMs": round(min(timings), 1),
+            "medianMs": round(median_ms, 1),
+            "overInterpreterMs": round(median_ms - baseline, 1),
+        })
+    return {"interpreterMs": round(baseline, 1), "runs": runs, "results": results}
+
+if __name__ == "__main__":
+    numeric_args = [arg for arg in sys.argv[1:] if arg.isdigit()]
+    runs = int(numeric_args[0]) if numeric_args else 5
+    report = run_benchmark(runs)
+
+    if "--json" in sys.argv:
+        print(json.dumps(report))
+    else:
+        print(f"Interpreter baseline: {report['interpreterMs']} ms (median of {runs} runs)")
+        print(f"{'script':<28} {'args':<28} {'min ms':>8} {'median ms':>10} {'+python ms':>11}")
+        for r in report["results"]:
+            args = " ".join(r["args"]) or "-"
+            print(f"{r['script']:<28} {args[:28]:<28} {r['minMs']:>8} {r['medianMs']:>10} {r['overInterpreterMs']:>11}")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Request cancellation and deadlines for the model server
+A CancelToken is made active for the thread that runs a job, so the Whisper
+segment loop and Qwen generation can stop between segments / tokens without
+threading a parameter through every generator function
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+class Cancelled(BaseException):
+    """Raised where a cancelled request stops
+
+    A BaseException, like KeyboardInterrupt, so the generator scripts'
+    `except Exception` handlers do not turn it into an ordinary failed result.
+    """
+
+class CancelToken:
+    def __init__(self, deadline: Optional[float] = None):
+        # Absolute time.time() after which the request is cancelled
+        self.deadline = deadline
+        self._reason: Optional[str] = None
+
+    def cancel(self, reason: str = "Cancelled by client"):
+        if self._reason is None:
+            self._reason = reason
+
+    @property
+    def reason(self) -> Optional[str]:
+        if self._reason is None and self.deadline is not None and time.time() > self.deadline:
+            self._reason = "Deadline exceeded"
+        return self._reason
+
+    def is_cancelled(self) -> bool:
+        return self.reason is not None
+
+    def check(self):
+        """Raise Cancelled if the request was cancelled or its deadline passed"""
+        if self.reason is not None:
+            raise Cancelled(self.reason)
+
+_local = threading.local()
+
+def current() -> Optional[CancelToken]:
+    """The token of the request running on this thread, if any"""
+    return getattr(_local, "token", None)
+
+def check_current():
+    token = current()
+    if token is not None:
+        token.check()
+
+@contextmanager
+def active(token: Optional[CancelToken]):
+    """Make `token` the current thread's token for the block"""
+    previous = current()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+class CancelStoppingCriteria:
+    """transformers stopping criterion that ends generate() once the token is cancelled"""
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        return torch.full((input_ids.shape[0],), self.token.is_cancelled(), dtype=torch.bool, device=input_ids.device)
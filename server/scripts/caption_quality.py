@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Caption quality scoring for the caption-first transcription policy
+YouTube captions are served instead of a Whisper transcription when their
+score reaches CAPTION_QUALITY_THRESHOLD. The score combines whether the track
+is manual or auto-generated, how much of the requested time range it covers,
+and its text density (words per minute, excluding [Music]-style markers).
+"""
+import os
+import re
+from typing import Any, Dict, Optional
+
+from segment_index import SegmentIndex, merge_intervals
+
+CAPTION_QUALITY_THRESHOLD = float(os.environ.get("CAPTION_QUALITY_THRESHOLD", "0.6"))
+
+# Auto-generated (ASR) tracks are usable but less reliable than manual ones
+GENERATED_WEIGHT = 0.85
+# Captions cover speech, not pauses or music, so this coverage already scores in full
+FULL_COVERAGE = 0.8
+# Lectures run at 100-160 words per minute; much sparser tracks are missing speech
+FULL_DENSITY_WPM = 60.0
+
+_ANNOTATION = re.compile(r"\[[^\]]*\]|\([^)]*\)|♪+")
+
+def score_captions(index: SegmentIndex, is_generated: Optional[bool],
+                   start: Optional[float] = None, end: Optional[float] = None,
+                   duration_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """Score a caption track over [start, end] (the whole video when open-ended)
+
+    Args:
+        index: The caption track
+        is_generated: True for auto-generated captions, None if unknown
+        duration_seconds: Video length, used as the end of an open-ended range
+
+    Returns:
+        {"score", "acceptable", "isGenerated", "coverage", "wordsPerMinute", "annotationRatio"}
+    """
+    range_start = start or 0.0
+    range_end = end or duration_seconds
+    if not range_end and len(index):
+        # Unknown length: measure up to the last caption, so coverage only sees internal gaps
+        range_end = max(index.ends)
+    range_seconds = (range_end or 0.0) - range_start
+
+    segments = index.slice(start, end)
+    covered = merge_intervals((max(s, range_start), min(e, range_end)) for s, e, _ in segments) if range_seconds > 0 else []
+    coverage = sum(e - s for s, e in covered) / range_seconds if range_seconds > 0 else 0.0
+
+    text = " ".join(t for _, _, t in segments)
+    words = len(text.split())
+    spoken_words = len(_ANNOTATION.sub(" ", text).split())
+    annotation_ratio = 1.0 - spoken_words / words if words else 0.0
+    wpm = spoken_words / (range_seconds / 60.0) if range_seconds > 0 else 0.0
+
+    score = (
+        (GENERATED_WEIGHT if is_generated is not False else 1.0)
+        * min(1.0, coverage / FULL_COVERAGE)
+        * min(1.0, wpm / FULL_DENSITY_WPM)
+    )
+    return {
+        "score": round(score, 3),
+        "acceptable": score >= CAPTION_QUALITY_THRESHOLD,
+        "threshold": CAPTION_QUALITY_THRESHOLD,
+        "isGenerated": is_generated,
+        "coverage": round(coverage, 3),
+        "wordsPerMinute": round(wpm, 1),
+        "annotationRatio": round(annotation_ratio, 3),
+    }
@@ -7,7 +7,6 @@ import sys
 import json
 import os
 import tempfile
-import yt_dlp
 
 # Custom logger class to redirect all yt-dlp output to stderr
 class StderrLogger:
@@ -23,9 +22,54 @@ class StderrLogger:
     def error(self, msg):
         print(f"[yt-dlp] ERROR: {msg}", file=sys.stderr)
 
+# Opt-in: download the audio stream URL from the shared watch-page extraction
+# directly instead of running yt-dlp (only for full-length, uncut downloads).
+DIRECT_AUDIO = os.environ.get("YOUTUBE_DIRECT_AUDIO", "") in ("1", "true", "yes")
+
+AUDIO_EXTENSIONS = {
+    "audio/mp4": ".m4a",
+    "audio/webm": ".webm",
+}
+
+def download_audio_stream(video_id):
+    """Download the audio stream listed in the cached watch-page extraction
+    
+    Returns:
+        Path to the downloaded file, or None if no directly usable stream exists
+    """
+    from youtube_page import get_watch_page_data, http_client
+    
+    page = get_watch_page_data(video_id)
+    stream_url = page.get("audioStreamUrl")
+    if not stream_url:
+        return None
+    
+    mime_type = (page.get("audioMimeType") or "").split(";")[0]
+    temp_file = tempfile.NamedTemporaryFile(suffix=AUDIO_EXTENSIONS.get(mime_type, ".m4a"), delete=False)
+    print(f"[yt-dlp] Downloading audio stream directly ({mime_type or 'unknown type'})", file=sys.stderr)
+    
+    with temp_file:
+        status, _, response = http_client.request(stream_url, stream=True)
+        if status != 200:
+            response.read()
+            http_client.release(response)
+            os.unlink(temp_file.name)
+            return None
+        while True:
+            chunk = response.read(1024 * 1024)
+            if not chunk:
+                break
+            temp_file.write(chunk)
+        http_client.release(response)
+    
+    return temp_file.name
+
 def download_audio(video_id, start_time=None, end_time=None):
     """Download audio from YouTube video
     
+    Full-length downloads use the audio prefetched after the video's info was
+    looked up, when there is one (see youtube_prefetch).
+    
     Args:
         video_id: YouTube video ID
         start_time: Start time in seconds (optional)
@@ -34,7 +78,44 @@ def download_audio(video_id, start_time=None, end_time=None):
     Returns:
         Dictionary with download results
     """
+    if start_time is None and end_time is None:
+        try:
+            from youtube_prefetch import take_audio
+            prefetched_path = take_audio(video_id)
+            if prefetched_path:
+                return {
+                    "success": True,
+                    "filePath": prefetched_path,
+                    "fileSize": os.path.getsize(prefetched_path),
+                    "videoId": video_id,
+                    "prefetched": True
+                }
+        except Exception as e:
+            print(f"[yt-dlp] Prefetched audio unavailable: {e}", file=sys.stderr)
+    
+    return fetch_audio(video_id, start_time, end_time)
+
+def fetch_audio(video_id, start_time=None, end_time=None):
+    """Download audio from YouTube (yt-dlp, or the direct stream if enabled), skipping the prefetch cache"""
+    if DIRECT_AUDIO and start_time is None and end_time is None:
+        try:
+            direct_path = download_audio_stream(video_id)
+            if direct_path:
+                file_size = os.path.getsize(direct_path)
+                print(f"[yt-dlp] Audio downloaded successfully: {direct_path} ({file_size / 1024 / 1024:.2f} MB)", file=sys.stderr)
+                return {
+                    "success": True,
+                    "filePath": direct_path,
+                    "fileSize": file_size,
+                    "videoId": video_id
+                }
+        except Exception as e:
+            print(f"[yt-dlp] Direct stream download failed, falling back to yt-dlp: {e}", file=sys.stderr)
+    
     try:
+        # yt-dlp is slow to import; only pay for it once we actually download
+        import yt_dlp
+        
         url = f"https://www.youtube.com/watch?v={video_id}"
         
         # Create temporary file for audio
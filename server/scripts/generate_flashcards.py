@@ -8,155 +8,72 @@ import json
 import os
 import re
 
-try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM
-    import torch
-except ImportError as e:
-    print(json.dumps({
-        "success": False,
-        "error": f"Required libraries not installed: {str(e)}. Please install: pip install transformers torch accelerate"
-    }))
-    sys.exit(1)
-
-def generate_flashcards(transcript, device="cuda"):
+def generate_flashcards(transcript, device="cuda", assisted=None, model=None, tokenizer=None, kv_prefix_cache=False):
     """Generate flashcards from transcript using Qwen model
     
     Args:
         transcript: Lecture transcript text
         device: 'cuda' for GPU or 'cpu' for CPU
+        assisted: Assisted decoding mode ('off', 'prompt_lookup', 'draft');
+            None uses QWEN_ASSISTED_DECODING (see qwen_generation)
+        model, tokenizer: Already loaded Qwen model and tokenizer (the model
+            server passes its own); loaded through model_cache when omitted
+        kv_prefix_cache: Reuse the prefilled KV state of the static prompt
+            prefix (only worth it in a long-lived process)
     
     Returns:
         Dictionary with flashcards
     """
+    try:
+        import torch
+        import transformers  # noqa: F401 - required by model_cache.get_qwen_model
+    except ImportError as e:
+        return {
+            "success": False,
+            "error": f"Required libraries not installed: {str(e)}. Please install: pip install transformers torch accelerate"
+        }
+    
     try:
         # Check if CUDA is available
-        if device == "cuda" and not torch.cuda.is_available():
+        if device.startswith("cuda") and not torch.cuda.is_available():
             print(f"[Qwen] CUDA not available, falling back to CPU", file=sys.stderr)
             device = "cpu"
         
-        if device == "cuda":
-            print(f"[Qwen] Using GPU: {torch.cuda.get_device_name(0)}", file=sys.stderr)
-            print(f"[Qwen] GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB", file=sys.stderr)
+        if device.startswith("cuda"):
+            gpu = torch.device(device).index or 0
+            print(f"[Qwen] Using GPU: {torch.cuda.get_device_name(gpu)}", file=sys.stderr)
+            print(f"[Qwen] GPU Memory: {torch.cuda.get_device_properties(gpu).total_memory / 1024**3:.2f} GB", file=sys.stderr)
         else:
             print(f"[Qwen] Using CPU", file=sys.stderr)
         
         # Load model and tokenizer (use cache)
-        from model_cache import get_qwen_model
-        print(f"[Qwen] Loading model: Qwen/Qwen2.5-3B-Instruct on {device}", file=sys.stderr)
-        
-        model, tokenizer = get_qwen_model(device=device)
+        if model is None or tokenizer is None:
+            from model_cache import get_qwen_model
+            print(f"[Qwen] Loading model: Qwen/Qwen2.5-3B-Instruct on {device}", file=sys.stderr)
+            
+            model, tokenizer = get_qwen_model(device=device)
         
         print(f"[Qwen] Model ready", file=sys.stderr)
         
         # Detect language
-        has_arabic = any('\u0600' <= char <= '\u06FF' for char in transcript)
-        language = "Arabic" if has_arabic else "English"
+        from prompt_templates import detect_language, get_template
+        language_code = detect_language(transcript)
+        language = "Arabic" if language_code == "ar" else "English"
         
-        # Create enhanced prompt based on language (matching Gemini API quality)
-        if has_arabic:
-            prompt = f"""أنت خبير في إنشاء البطاقات التعليمية. قم بإنشاء 8-15 بطاقة تعليمية عالية الجودة بناءً على نص المحاضرة التالي.
-
-المتطلبات الحرجة:
-- النص بالعربية. يجب أن تكتب جميع المصطلحات والتعريفات بالعربية. لا تترجم أبداً.
-- أنشئ 8-15 بطاقة تعليمية تغطي أهم المصطلحات والمفاهيم والأفكار الرئيسية من النص.
-- كل بطاقة يجب أن تحتوي على:
-  * مصطلح أو مفهوم واضح ومحدد (Term) - يجب أن يكون قصيراً وواضحاً
-  * تعريف أو شرح مفصل ومفيد (Definition) - يجب أن يكون شاملاً وواضحاً
-- ركز على:
-  * المصطلحات التقنية والمفاهيم الأساسية
-  * التعريفات المهمة والأفكار الرئيسية
-  * المفاهيم التي تحتاج إلى حفظ أو فهم عميق
-- التعريفات يجب أن تكون:
-  * واضحة ومفهومة للطلاب
-  * شاملة وتغطي الجوانب المهمة
-  * مفيدة للمراجعة والدراسة
-- استخدم لغة مهنية وواضحة.
-- أعد فقط JSON صالح بهذا الشكل بالضبط (بدون markdown، بدون كتل كود، بدون نص إضافي):
-
-{{
-  "flashcards": [
-    {{
-      "id": 1,
-      "term": "المصطلح أو المفهوم الواضح",
-      "definition": "التعريف أو الشرح المفصل والشامل الذي يساعد الطلاب على الفهم"
-    }}
-  ]
-}}
-
-نص المحاضرة:
-{transcript[:20000]}
-
-JSON:"""
-        else:
-            prompt = f"""You are an expert flashcard creator. Create 8-15 high-quality flashcards based on the following lecture transcript.
-
-CRITICAL REQUIREMENTS:
-- The transcript is in {language}. You MUST write ALL terms and definitions in {language}. Do NOT translate.
-- Generate 8-15 flashcards covering the most important terms, concepts, and key ideas from the transcript.
-- Each flashcard must contain:
-  * A clear and specific term or concept (Term) - should be short and clear
-  * A detailed and useful definition or explanation (Definition) - should be comprehensive and clear
-- Focus on:
-  * Technical terms and fundamental concepts
-  * Important definitions and key ideas
-  * Concepts that need memorization or deep understanding
-- Definitions should be:
-  * Clear and understandable for students
-  * Comprehensive and cover important aspects
-  * Useful for review and study
-- Use clear, professional language.
-- Return ONLY valid JSON in this exact format (no markdown, no code blocks, no extra text):
-
-{{
-  "flashcards": [
-    {{
-      "id": 1,
-      "term": "Clear Term or Concept",
-      "definition": "Detailed and comprehensive definition or explanation that helps students understand"
-    }}
-  ]
-}}
-
-Transcript:
-{transcript[:20000]}
-
-JSON:"""
-        
-        # Tokenize and generate
         print(f"[Qwen] Generating flashcards for {len(transcript)} characters ({language})", file=sys.stderr)
         
-        messages = [
-            {"role": "user", "content": prompt}
-        ]
-        
-        text = tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True
-        )
-        
-        model_inputs = tokenizer([text], return_tensors="pt").to(device)
-        
         # Generate with appropriate parameters
-        with torch.no_grad():
-            generated_ids = model.generate(
-                model_inputs.input_ids,
-                max_new_tokens=2000,
-                temperature=0.7,
-                do_sample=True,
-                top_p=0.9,
-                pad_token_id=tokenizer.eos_token_id
-            )
-        
-        generated_ids = [
-            output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
-        ]
-        
-        response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        from qwen_generation import generate_from_template
+        response, generation_stats = generate_from_template(
+            model, tokenizer, get_template("flashcards", language_code), transcript, device, 2000,
+            assisted=assisted,
+            kv_prefix_cache=kv_prefix_cache,
+            temperature=0.7,
+            do_sample=True,
+            top_p=0.9
+        )
         
         # Clean up response - extract JSON
-        response = response.strip()
-        
         # Try to extract JSON from response (may contain markdown or extra text)
         json_match = re.search(r'\{[\s\S]*\}', response)
         if json_match:
@@ -212,7 +129,8 @@ JSON:"""
         
         return {
             "success": True,
-            "flashcards": flashcards
+            "flashcards": flashcards,
+            "generation": generation_stats
         }
         
     except Exception as e:
@@ -236,6 +154,7 @@ if __name__ == "__main__":
     
     transcript = sys.argv[1]
     device = sys.argv[2] if len(sys.argv) > 2 else "cuda"
+    assisted = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] else None
     
     # Normalize device name
     if device == "gpu":
@@ -248,6 +167,6 @@ if __name__ == "__main__":
         }))
         sys.exit(1)
     
-    result = generate_flashcards(transcript, device)
+    result = generate_flashcards(transcript, device, assisted)
     print(json.dumps(result))
 
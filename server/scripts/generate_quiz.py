@@ -8,145 +8,72 @@ import json
 import os
 import re
 
-try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM
-    import torch
-except ImportError as e:
-    print(json.dumps({
-        "success": False,
-        "error": f"Required libraries not installed: {str(e)}. Please install: pip install transformers torch accelerate"
-    }))
-    sys.exit(1)
-
-def generate_quiz(transcript, device="cuda"):
+def generate_quiz(transcript, device="cuda", assisted=None, model=None, tokenizer=None, kv_prefix_cache=False):
     """Generate quiz questions from transcript using Qwen model
     
     Args:
         transcript: Lecture transcript text
         device: 'cuda' for GPU or 'cpu' for CPU
+        assisted: Assisted decoding mode ('off', 'prompt_lookup', 'draft');
+            None uses QWEN_ASSISTED_DECODING (see qwen_generation)
+        model, tokenizer: Already loaded Qwen model and tokenizer (the model
+            server passes its own); loaded through model_cache when omitted
+        kv_prefix_cache: Reuse the prefilled KV state of the static prompt
+            prefix (only worth it in a long-lived process)
     
     Returns:
         Dictionary with quiz questions
     """
+    try:
+        import torch
+        import transformers  # noqa: F401 - required by model_cache.get_qwen_model
+    except ImportError as e:
+        return {
+            "success": False,
+            "error": f"Required libraries not installed: {str(e)}. Please install: pip install transformers torch accelerate"
+        }
+    
     try:
         # Check if CUDA is available
-        if device == "cuda" and not torch.cuda.is_available():
+        if device.startswith("cuda") and not torch.cuda.is_available():
             print(f"[Qwen] CUDA not available, falling back to CPU", file=sys.stderr)
             device = "cpu"
         
-        if device == "cuda":
-            print(f"[Qwen] Using GPU: {torch.cuda.get_device_name(0)}", file=sys.stderr)
-            print(f"[Qwen] GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB", file=sys.stderr)
+        if device.startswith("cuda"):
+            gpu = torch.device(device).index or 0
+            print(f"[Qwen] Using GPU: {torch.cuda.get_device_name(gpu)}", file=sys.stderr)
+            print(f"[Qwen] GPU Memory: {torch.cuda.get_device_properties(gpu).total_memory / 1024**3:.2f} GB", file=sys.stderr)
         else:
             print(f"[Qwen] Using CPU", file=sys.stderr)
         
         # Load model and tokenizer (use cache)
-        from model_cache import get_qwen_model
-        print(f"[Qwen] Loading model: Qwen/Qwen2.5-3B-Instruct on {device}", file=sys.stderr)
-        
-        model, tokenizer = get_qwen_model(device=device)
+        if model is None or tokenizer is None:
+            from model_cache import get_qwen_model
+            print(f"[Qwen] Loading model: Qwen/Qwen2.5-3B-Instruct on {device}", file=sys.stderr)
+            
+            model, tokenizer = get_qwen_model(device=device)
         
         print(f"[Qwen] Model ready", file=sys.stderr)
         
         # Detect language
-        has_arabic = any('\u0600' <= char <= '\u06FF' for char in transcript)
-        language = "Arabic" if has_arabic else "English"
+        from prompt_templates import detect_language, get_template
+        language_code = detect_language(transcript)
+        language = "Arabic" if language_code == "ar" else "English"
         
-        # Create enhanced prompt based on language (matching Gemini API quality)
-        if has_arabic:
-            prompt = f"""أنت خبير في إنشاء الاختبارات التعليمية. قم بإنشاء 5-10 أسئلة اختيار من متعدد عالية الجودة بناءً على نص المحاضرة التالي.
-
-المتطلبات الحرجة:
-- النص بالعربية. يجب أن تكتب جميع الأسئلة والخيارات والإجابات بالعربية. لا تترجم أبداً.
-- أنشئ 5-10 أسئلة تختبر فهم المفاهيم الرئيسية والحقائق المهمة والأفكار الأساسية من النص.
-- كل سؤال يجب أن يحتوي على 4 خيارات بالضبط (أ، ب، ج، د).
-- حدد الإجابة الصحيحة بوضوح في correctIndex (0-3).
-- يجب أن تكون الأسئلة واضحة ومحددة وتختبر الفهم الفعلي والتحليل (وليس فقط الحفظ).
-- الأسئلة يجب أن تغطي مختلف أجزاء المحاضرة بشكل متوازن.
-- استخدم لغة واضحة ومهنية مناسبة للطلاب.
-- أعد فقط JSON صالح بهذا الشكل بالضبط (بدون markdown، بدون كتل كود، بدون نص إضافي، بدون شرح):
-
-{{
-  "questions": [
-    {{
-      "id": 1,
-      "text": "نص السؤال الواضح والمحدد هنا؟",
-      "options": ["الخيار أ (صحيح)", "الخيار ب", "الخيار ج", "الخيار د"],
-      "correctIndex": 0,
-      "type": "multiple-choice"
-    }}
-  ]
-}}
-
-نص المحاضرة:
-{transcript[:20000]}
-
-JSON:"""
-        else:
-            prompt = f"""You are an expert educational quiz generator. Create 5-10 high-quality multiple-choice quiz questions based on the following lecture transcript.
-
-CRITICAL REQUIREMENTS:
-- The transcript is in {language}. You MUST write ALL questions, options, and answers in {language}. Do NOT translate.
-- Generate 5-10 questions that test understanding of key concepts, important facts, and main ideas from the transcript.
-- Each question must have exactly 4 options (A, B, C, D).
-- Mark the correct answer clearly in correctIndex (0-3).
-- Questions should be clear, specific, and test actual understanding and analysis (not just memorization).
-- Questions should cover different parts of the lecture in a balanced way.
-- Use clear, professional language appropriate for students.
-- Return ONLY valid JSON in this exact format (no markdown, no code blocks, no extra text, no explanation):
-
-{{
-  "questions": [
-    {{
-      "id": 1,
-      "text": "Clear and specific question text here?",
-      "options": ["Option A (correct)", "Option B", "Option C", "Option D"],
-      "correctIndex": 0,
-      "type": "multiple-choice"
-    }}
-  ]
-}}
-
-Transcript:
-{transcript[:20000]}
-
-JSON:"""
-        
-        # Tokenize and generate
         print(f"[Qwen] Generating quiz for {len(transcript)} characters ({language})", file=sys.stderr)
         
-        messages = [
-            {"role": "user", "content": prompt}
-        ]
-        
-        text = tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True
-        )
-        
-        model_inputs = tokenizer([text], return_tensors="pt").to(device)
-        
         # Generate with appropriate parameters
-        with torch.no_grad():
-            generated_ids = model.generate(
-                model_inputs.input_ids,
-                max_new_tokens=2000,
-                temperature=0.7,
-                do_sample=True,
-                top_p=0.9,
-                pad_token_id=tokenizer.eos_token_id
-            )
-        
-        generated_ids = [
-            output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
-        ]
-        
-        response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        from qwen_generation import generate_from_template
+        response, generation_stats = generate_from_template(
+            model, tokenizer, get_template("quiz", language_code), transcript, device, 2000,
+            assisted=assisted,
+            kv_prefix_cache=kv_prefix_cache,
+            temperature=0.7,
+            do_sample=True,
+            top_p=0.9
+        )
         
         # Clean up response - extract JSON
-        response = response.strip()
-        
         # Try to extract JSON from response (may contain markdown or extra text)
         json_match = re.search(r'\{[\s\S]*\}', response)
         if json_match:
@@ -217,7 +144,8 @@ JSON:"""
         
         return {
             "success": True,
-            "questions": questions
+            "questions": questions,
+            "generation": generation_stats
         }
         
     except Exception as e:
@@ -241,6 +169,7 @@ if __name__ == "__main__":
     
     transcript = sys.argv[1]
     device = sys.argv[2] if len(sys.argv) > 2 else "cuda"
+    assisted = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] else None
     
     # Normalize device name
     if device == "gpu":
@@ -253,6 +182,6 @@ if __name__ == "__main__":
         }))
         sys.exit(1)
     
-    result = generate_quiz(transcript, device)
+    result = generate_quiz(transcript, device, assisted)
     print(json.dumps(result))
 
@@ -5,59 +5,136 @@ Similar to the working Python code
 """
 import sys
 import json
-from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
+import os
+import re
+from segment_index import SegmentIndex
+from local_cache import get_cache_dir, read_json, write_json
+from caption_quality import score_captions
+
+CAPTION_LANGUAGES = ('ar', 'en')
+# Caption tracks rarely change once published
+CAPTION_CACHE_TTL_SECONDS = int(os.environ.get("CAPTION_CACHE_TTL", "86400"))
+
+# Per-process cache: video/languages key -> (SegmentIndex, language_code, is_generated)
+_caption_indexes = {}
 
 def get_video_id(url):
     """Extract video ID from YouTube URL"""
-    import re
     match = re.search(r"(?:v=|\/)([0-9A-Za-z_-]{11})", url)
     if match:
         return match.group(1)
     return None
 
-def fetch_transcript(video_id, start_time=None, end_time=None):
+def load_caption_snippets(video_id, languages=CAPTION_LANGUAGES):
+    """Load caption snippets as (start, duration, text) tuples
+    
+    Caption tracks listed in the shared watch-page extraction (see youtube_page)
+    are tried first, so a video whose info was just looked up needs no second
+    page fetch. youtube_transcript_api is the fallback.
+    
+    Returns:
+        (snippets, language_code, is_generated); is_generated is None if unknown
+    """
+    try:
+        from youtube_page import get_watch_page_data, select_caption_track, fetch_caption_track
+        track = select_caption_track(get_watch_page_data(video_id).get("captionTracks") or [], languages)
+        if track:
+            snippets = fetch_caption_track(track)
+            if snippets:
+                return snippets, track.get("languageCode") or 'unknown', track.get("isGenerated")
+    except Exception as e:
+        print(f"[Transcript] Watch-page captions unavailable, using transcript API: {e}", file=sys.stderr)
+    
+    from youtube_transcript_api import YouTubeTranscriptApi
+    # Use the same method as the working Python code
+    ytt_api = YouTubeTranscriptApi()
+    transcript = ytt_api.fetch(video_id, languages=list(languages))
+    # snippet is an object with attributes: text, start, duration
+    snippets = [(snippet.start, snippet.duration, snippet.text) for snippet in transcript]
+    language_code = transcript.language_code if hasattr(transcript, 'language_code') else 'unknown'
+    return snippets, language_code, getattr(transcript, 'is_generated', None)
+
+def caption_cache_key(video_id, languages=CAPTION_LANGUAGES):
+    return f"{video_id}_{'-'.join(languages)}"
+
+def caption_cache_path(key):
+    return os.path.join(get_cache_dir("captions"), f"{key}.json")
+
+def load_caption_index(video_id, languages=CAPTION_LANGUAGES, record_use=True):
+    """Caption track for a video as a SegmentIndex, cached per video
+    
+    The track is stored (in memory and on disk) in the index's columnar form,
+    so repeated range queries for the same video are a binary search with no
+    network access. With record_use, the lookup counts towards the prefetch
+    hit rate (see youtube_prefetch).
+    
+    Returns:
+        (SegmentIndex, language_code, is_generated)
+    """
+    key = caption_cache_key(video_id, languages)
+    cached = _caption_indexes.get(key)
+    if cached is not None:
+        return cached
+    
+    if record_use:
+        from youtube_prefetch import record_lookup
+        record_lookup("captions", key)
+    path = caption_cache_path(key)
+    record = read_json(path, CAPTION_CACHE_TTL_SECONDS)
+    index = None
+    if record is not None:
+        try:
+            index = SegmentIndex.from_columns(record["starts"], record["ends"], record["text"], record["offsets"])
+            language_code = record["language"]
+            # Missing from records cached before quality scoring
+            is_generated = record.get("isGenerated")
+            print(f"[Transcript] Using cached captions for {video_id}", file=sys.stderr)
+        except (KeyError, ValueError) as e:
+            print(f"[Transcript] Ignoring unusable caption cache for {video_id}: {e}", file=sys.stderr)
+            index = None
+    if index is None:
+        snippets, language_code, is_generated = load_caption_snippets(video_id, languages)
+        index = SegmentIndex((s, s + d, text) for s, d, text in snippets)
+        write_json(path, dict(index.to_columns(), language=language_code, isGenerated=is_generated))
+    
+    _caption_indexes[key] = (index, language_code, is_generated)
+    return index, language_code, is_generated
+
+def _video_duration(video_id):
+    try:
+        from youtube_page import get_watch_page_data
+        return get_watch_page_data(video_id).get("durationSeconds")
+    except Exception as e:
+        print(f"[Transcript] Video duration unavailable for quality scoring: {e}", file=sys.stderr)
+        return None
+
+def fetch_transcript(video_id, start_time=None, end_time=None, language=None):
     """Fetch transcript from YouTube video
     
     Args:
         video_id: YouTube video ID
         start_time: Start time in seconds (optional)
         end_time: End time in seconds (optional)
+        language: Only accept captions in this language (optional; default ar, then en)
+    
+    The result's "quality" (see caption_quality) tells the caption-first
+    policy whether the captions can stand in for a Whisper transcription.
     """
+    # Imported here so argument errors exit without loading the API client
     try:
-        # Use the same method as the working Python code
-        ytt_api = YouTubeTranscriptApi()
-        transcript = ytt_api.fetch(video_id, languages=['ar', 'en'])
+        from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled
+    except ImportError as e:
+        return {
+            "success": False,
+            "error": f"Required library not installed: {str(e)}. Please install: pip install youtube-transcript-api"
+        }
+    
+    try:
+        languages = (language,) if language else CAPTION_LANGUAGES
+        index, language_code, is_generated = load_caption_index(video_id, languages)
         
-        # Extract text: loop directly on transcript (iterable)
-        full_text = ""
-        for snippet in transcript:
-            # snippet is an object with attributes: text, start, duration
-            snippet_start = snippet.start
-            snippet_duration = snippet.duration
-            snippet_end = snippet_start + snippet_duration
-            
-            # Filter by time range if specified
-            if start_time is not None and snippet_end < start_time:
-                continue
-            if end_time is not None and snippet_start > end_time:
-                continue
-            
-            # Include snippet if it overlaps with the time range
-            if start_time is None and end_time is None:
-                # No time filter, include all
-                full_text += snippet.text + " "
-            elif start_time is not None and end_time is not None:
-                # Both start and end specified
-                if snippet_start <= end_time and snippet_end >= start_time:
-                    full_text += snippet.text + " "
-            elif start_time is not None:
-                # Only start specified
-                if snippet_end >= start_time:
-                    full_text += snippet.text + " "
-            elif end_time is not None:
-                # Only end specified
-                if snippet_start <= end_time:
-                    full_text += snippet.text + " "
+        # Overlap query on the shared interval index (None bounds are open-ended)
+        full_text = index.text(start_time, end_time)
         
         # Clean up the text
         full_text = " ".join(full_text.split()).strip()
@@ -66,7 +143,9 @@ def fetch_transcript(video_id, start_time=None, end_time=None):
             "success": True,
             "transcript": full_text,
             "wordCount": len(full_text.split()),
-            "language": transcript.language_code if hasattr(transcript, 'language_code') else 'unknown'
+            "language": language_code,
+            "quality": score_captions(index, is_generated, start_time, end_time,
+                                      None if end_time is not None else _video_duration(video_id)),
         }
     except NoTranscriptFound:
         return {
@@ -115,6 +194,11 @@ if __name__ == "__main__":
         except ValueError:
             end_time = None
     
-    result = fetch_transcript(video_id, start_time, end_time)
+    # Optional caption language (e.g. "en"); empty or "auto" accepts the defaults
+    language = None
+    if len(sys.argv) > 4 and sys.argv[4].strip() and sys.argv[4].strip() != "auto":
+        language = sys.argv[4].strip()
+    
+    result = fetch_transcript(video_id, start_time, end_time, language)
     print(json.dumps(result))
 
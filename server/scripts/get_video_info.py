@@ -5,71 +5,39 @@ Extracts title, duration, and channel name from YouTube video
 """
 import sys
 import json
-import re
-import urllib.request
-from html import unescape
+
+def format_duration(duration_seconds):
+    """Format duration as MM:SS or HH:MM:SS"""
+    if not duration_seconds:
+        return "0:00"
+    hours = duration_seconds // 3600
+    minutes = (duration_seconds % 3600) // 60
+    seconds = duration_seconds % 60
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
 
 def get_video_info(video_id):
-    """Extract video info from YouTube page"""
+    """Extract video info from YouTube page
+    
+    The watch page is fetched through youtube_page, which caches the extracted
+    record per video ID (shared with the transcript and download scripts) and
+    collapses concurrent lookups for the same ID into one fetch.
+    """
     try:
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        
-        # Fetch the video page
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        
-        with urllib.request.urlopen(req) as response:
-            html = response.read().decode('utf-8')
-        
-        # Extract title from <title> tag
-        title_match = re.search(r'<title>(.*?)</title>', html)
-        title = title_match.group(1) if title_match else f"YouTube Video {video_id}"
-        # Remove " - YouTube" suffix
-        title = title.replace(" - YouTube", "").strip()
-        title = unescape(title)
-        
-        # Extract duration from videoDetails (in player response)
-        duration_seconds = None
-        duration_match = re.search(r'"lengthSeconds":"(\d+)"', html)
-        if duration_match:
-            duration_seconds = int(duration_match.group(1))
-        else:
-            # Try alternative pattern
-            duration_match = re.search(r'"approxDurationMs":"(\d+)"', html)
-            if duration_match:
-                duration_seconds = int(duration_match.group(1)) // 1000
-        
-        # Format duration as MM:SS or HH:MM:SS
-        duration = "0:00"
-        if duration_seconds:
-            hours = duration_seconds // 3600
-            minutes = (duration_seconds % 3600) // 60
-            seconds = duration_seconds % 60
-            
-            if hours > 0:
-                duration = f"{hours}:{minutes:02d}:{seconds:02d}"
-            else:
-                duration = f"{minutes}:{seconds:02d}"
+        # Deferred so argument errors exit before the HTTP/SSL stack is imported
+        from youtube_page import get_watch_page_data
         
-        # Extract channel name
-        channel_name = None
-        channel_match = re.search(r'"ownerChannelName":"([^"]+)"', html)
-        if channel_match:
-            channel_name = unescape(channel_match.group(1))
-        else:
-            # Try alternative pattern
-            channel_match = re.search(r'<link itemprop="name" content="([^"]+)"', html)
-            if channel_match:
-                channel_name = unescape(channel_match.group(1))
+        page = get_watch_page_data(video_id)
+        duration_seconds = page.get("durationSeconds")
         
         return {
             "success": True,
             "videoId": video_id,
-            "title": title,
-            "duration": duration,
+            "title": page.get("title") or f"YouTube Video {video_id}",
+            "duration": format_duration(duration_seconds),
             "durationSeconds": duration_seconds,
-            "channelName": channel_name,
+            "channelName": page.get("channelName"),
             "thumbnailUrl": f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
         }
     except Exception as e:
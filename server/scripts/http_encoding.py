@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Response encoding for the model server
+JSON serialization (orjson when installed), negotiated gzip/zstd compression,
+and serialization time versus payload size statistics
+"""
+import os
+import json
+import gzip
+import time
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used instead
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # optional: only gzip is offered
+    zstandard = None
+
+# "auto" uses orjson when installed, "json" forces the stdlib encoder
+JSON_ENCODER = os.environ.get("MODEL_SERVER_JSON_ENCODER", "auto")
+# Smaller bodies are sent uncompressed (not worth the CPU or the header)
+MIN_COMPRESS_BYTES = int(os.environ.get("MODEL_SERVER_MIN_COMPRESS_BYTES", "1024"))
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+# Upper bounds of the payload size buckets in the statistics
+SIZE_BUCKETS = (16 * 1024, 256 * 1024, 4 * 1024 * 1024)
+BUCKET_NAMES = ("<16KB", "16KB-256KB", "256KB-4MB", ">=4MB")
+
+_zstd_local = threading.local()
+
+def encoder_name() -> str:
+    return "orjson" if orjson is not None and JSON_ENCODER != "json" else "json"
+
+def dumps(payload: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes"""
+    if orjson is not None and JSON_ENCODER != "json":
+        # Same output as json.dumps for the types results contain; NaN becomes null
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload).encode("utf-8")
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick "zstd" or "gzip" from an Accept-Encoding header (None = identity)"""
+    offered = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    if zstandard is not None and offered.get("zstd", 0) > 0:
+        return "zstd"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        # ZstdCompressor objects are not thread-safe, so one per thread
+        compressor = getattr(_zstd_local, "compressor", None)
+        if compressor is None:
+            compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return compressor.compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class SerializationStats:
+    """Serialization and compression time per payload size bucket"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = [
+            {"responses": 0, "bytes": 0, "sentBytes": 0, "serializeSeconds": 0.0, "compressSeconds": 0.0}
+            for _ in BUCKET_NAMES
+        ]
+
+    def record(self, size: int, sent: int, serialize_seconds: float, compress_seconds: float):
+        bucket = self._buckets[bisect_right(SIZE_BUCKETS, size)]
+        with self._lock:
+            bucket["responses"] += 1
+            bucket["bytes"] += size
+            bucket["sentBytes"] += sent
+            bucket["serializeSeconds"] += serialize_seconds
+            bucket["compressSeconds"] += compress_seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = {}
+            for name, b in zip(BUCKET_NAMES, self._buckets):
+                n = b["responses"]
+                buckets[name] = {
+                    "responses": n,
+                    "avgBytes": round(b["bytes"] / n) if n else 0,
+                    "avgSerializeMs": round(b["serializeSeconds"] * 1000 / n, 3) if n else 0.0,
+                    "avgCompressMs": round(b["compressSeconds"] * 1000 / n, 3) if n else 0.0,
+                    # Serialized bytes per second of encoder time
+                    "serializeMBps": round(b["bytes"] / b["serializeSeconds"] / 1e6, 1) if b["serializeSeconds"] else None,
+                    "compressionRatio": round(b["sentBytes"] / b["bytes"], 3) if b["bytes"] else None,
+                }
+        return {"encoder": encoder_name(), "zstdAvailable": zstandard is not None, "buckets": buckets}
+
+def encode_response(payload: Any, accept_encoding: Optional[str],
+                    stats: Optional[SerializationStats] = None) -> Tuple[bytes, Optional[str]]:
+    """Serialize and, if the client accepts it and the body is large enough, compress
+
+    Returns:
+        (body bytes, Content-Encoding or None)
+    """
+    started = time.perf_counter()
+    body = dumps(payload)
+    serialized = time.perf_counter()
+    size = len(body)
+
+    encoding = negotiate(accept_encoding) if size >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+    if stats is not None:
+        stats.record(size, len(body), serialized - started, time.perf_counter() - serialized)
+    return body, encoding
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Rolling incremental summarization for live and streaming transcripts
+Segments are buffered into chunks of about CHUNK_SECONDS of audio. Each
+finished chunk gets its own summary and key points, which are then merged
+into the running summary, key points and introduction. Merge inputs are
+bounded (the running summary is capped), so an update costs time in
+proportion to the new chunk, not to everything said before it.
+"""
+import os
+import re
+import sys
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from prompt_templates import detect_language
+from generate_summary import MAX_KEY_POINTS, strip_label, parse_key_points, format_summary
+
+CHUNK_SECONDS = float(os.environ.get("SUMMARY_CHUNK_SECONDS", "60"))
+# The running summary handed to each merge is cut to this many characters
+RUNNING_SUMMARY_CHARS = int(os.environ.get("SUMMARY_RUNNING_CHARS", "4000"))
+# Key points sharing this share of their words are treated as the same point
+DUPLICATE_POINT_OVERLAP = 0.6
+
+SUMMARY_LABELS = ("Updated Summary:", "Summary:", "الملخص المحدّث:", "الملخص:")
+INTRO_LABELS = ("Introduction:", "المقدمة:")
+POINTS_LABELS = ("Key Points:", "النقاط الرئيسية:")
+
+# generate(task, language, text, max_new_tokens) -> reply to the prompt
+# template (task, language) filled with `text` (see prompt_templates)
+Generate = Callable[[str, str, str, int], str]
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+def is_duplicate_point(point: str, points: List[str]) -> bool:
+    words = _words(point)
+    for other in points:
+        other_words = _words(other)
+        if words and other_words and len(words & other_words) / min(len(words), len(other_words)) >= DUPLICATE_POINT_OVERLAP:
+            return True
+    return False
+
+class IncrementalSummarizer:
+    """Running intro, summary and key points of a transcript that is still growing
+
+    Args:
+        generate: generate(task, language, text, max_new_tokens) -> reply text
+        chunk_seconds: Audio covered by each chunk before it is summarized
+    """
+
+    def __init__(self, generate: Generate, chunk_seconds: float = CHUNK_SECONDS):
+        self.generate = generate
+        self.chunk_seconds = chunk_seconds
+        self.language: Optional[str] = None
+        self.intro = ""
+        self.summary = ""
+        self.key_points: List[str] = []
+        self.chunks: List[Dict[str, Any]] = []
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.updated_at = time.time()
+
+    def add_segments(self, segments: List[Dict[str, Any]], final: bool = False) -> int:
+        """Buffer new segments ({start, end, text}) and fold in every finished chunk
+
+        With final, the remaining partial chunk is folded in too.
+
+        Returns:
+            Number of chunks folded in by this call
+        """
+        with self._lock:
+            self._pending.extend(s for s in segments if (s.get("text") or "").strip())
+            folded = 0
+            while self._pending and self._pending[-1]["end"] - self._pending[0]["start"] >= self.chunk_seconds:
+                cut = next(i for i, s in enumerate(self._pending)
+                           if s["end"] - self._pending[0]["start"] >= self.chunk_seconds) + 1
+                self._fold(self._pending[:cut])
+                del self._pending[:cut]
+                folded += 1
+            if final and self._pending:
+                self._fold(self._pending)
+                self._pending = []
+                folded += 1
+            self.updated_at = time.time()
+            return folded
+
+    def _fold(self, segments: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        text = " ".join(" ".join(s["text"].split()) for s in segments)
+        if self.language is None:
+            self.language = detect_language(text)
+        language = self.language
+        has_arabic = language == "ar"
+
+        chunk_summary = strip_label(self.generate("summary_chunk", language, text, 300), SUMMARY_LABELS)
+        chunk_points = parse_key_points(strip_label(self.generate("summary_chunk_points", language, text, 300), POINTS_LABELS))
+
+        # Built aside and assigned together, so a generation cancelled midway
+        # leaves the state as it was and the chunk still pending
+        if self.summary:
+            running = self.summary[-RUNNING_SUMMARY_CHARS:]
+            merge_input = (
+                f"{'الملخص حتى الآن' if has_arabic else 'Summary So Far'}:\n{running}\n\n"
+                f"{'ملخص الجزء الجديد' if has_arabic else 'Newest Part'}:\n{chunk_summary}"
+            )
+            summary = strip_label(self.generate("summary_merge", language, merge_input, 1000), SUMMARY_LABELS)
+        else:
+            summary = chunk_summary
+
+        key_points = self.key_points + [p for p in chunk_points if not is_duplicate_point(p, self.key_points)]
+        if len(key_points) > MAX_KEY_POINTS:
+            merged = parse_key_points(strip_label(
+                self.generate("summary_points_merge", language, "\n".join(f"- {p}" for p in key_points), 800),
+                POINTS_LABELS,
+            ))
+            key_points = (merged or key_points)[:MAX_KEY_POINTS]
+
+        # The intro is written from the (bounded) running summary, not the transcript
+        intro = strip_label(self.generate("summary_intro", language, summary, 200), INTRO_LABELS)
+        self.summary, self.key_points, self.intro = summary, key_points, intro
+
+        seconds = time.perf_counter() - started
+        self.chunks.append({
+            "start": segments[0]["start"],
+            "end": segments[-1]["end"],
+            "summary": chunk_summary,
+            "keyPoints": chunk_points,
+            "seconds": round(seconds, 3),
+        })
+        print(f"[Summary] Folded chunk {len(self.chunks)} ({segments[0]['start']:.0f}s-{segments[-1]['end']:.0f}s, "
+              f"{len(text)} chars) in {seconds:.2f}s", file=sys.stderr)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "summary": format_summary(self.intro, self.summary, self.key_points, self.language == "ar"),
+                "intro": self.intro,
+                "summaryText": self.summary,
+                "keyPoints": list(self.key_points),
+                "chunks": [dict(c) for c in self.chunks],
+                "summarizedUntil": self.chunks[-1]["end"] if self.chunks else None,
+                "pendingSeconds": round(self._pending[-1]["end"] - self._pending[0]["start"], 3) if self._pending else 0.0,
+                "language": self.language,
+            }
+
+class SummarySessions:
+    """Summarizers keyed by session ID; idle sessions are dropped after `ttl_seconds`"""
+
+    def __init__(self, ttl_seconds: float = 3600.0):
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, IncrementalSummarizer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, generate: Generate) -> IncrementalSummarizer:
+        with self._lock:
+            now = time.time()
+            for key in [k for k, s in self._sessions.items() if now - s.updated_at > self.ttl_seconds]:
+                del self._sessions[key]
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = IncrementalSummarizer(generate)
+            return session
+
+    def close(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Job scheduler for the model server
+Shortest-job-first across priority classes, with aging so long jobs still
+run, per-user concurrency caps, and queue-wait statistics per class
+"""
+import os
+import sys
+import time
+import heapq
+import itertools
+import threading
+from typing import Dict, Any, Optional
+
+# Priority classes and the head start (in estimated seconds of work) each one gets.
+# A job's key is class_offset + estimated_cost - AGING_RATE * seconds_waited,
+# lowest first, so a long job overtakes newer short ones once it has waited
+# about as long as its own cost.
+PRIORITY_CLASSES = {
+    "interactive": 0.0,
+    "normal": 60.0,
+    "batch": 600.0,
+}
+DEFAULT_PRIORITY = "normal"
+AGING_RATE = float(os.environ.get("SCHEDULER_AGING_RATE", "1.0"))
+# Only applies to identified users: jobs without a user ID (or "anonymous") come from
+# unrelated callers, so one long anonymous job must not hold up all the others
+MAX_RUNNING_PER_USER = int(os.environ.get("SCHEDULER_MAX_RUNNING_PER_USER", "1"))
+ANONYMOUS_USER = "anonymous"
+
+# Rough cost model, in seconds of model time
+WHISPER_SECONDS_PER_AUDIO_SECOND = 0.1
+QWEN_SECONDS_PER_INPUT_TOKEN = 0.0005
+QWEN_SECONDS_PER_GENERATION = 20.0
+UNKNOWN_COST_SECONDS = 120.0
+CHARS_PER_TOKEN = 4
+
+def estimate_cost(data: Dict[str, Any]) -> float:
+    """Estimate a job's cost in seconds from its audio duration or transcript length"""
+    action = data.get("action")
+
+    if action in ("transcribe", "transcribe_youtube"):
+        duration = data.get("duration_seconds")
+        if duration is None and data.get("start_time") is not None and data.get("end_time") is not None:
+            duration = float(data["end_time"]) - float(data["start_time"])
+        if duration is None and data.get("file_path"):
+            from whisper_decoding import get_audio_duration
+            duration = get_audio_duration(data["file_path"])
+        if duration is None and data.get("video_id"):
+            duration = _cached_video_duration(data["video_id"])
+        if duration is None:
+            return UNKNOWN_COST_SECONDS
+        return max(1.0, float(duration) * WHISPER_SECONDS_PER_AUDIO_SECOND)
+
+    if action == "process_lecture":
+        # Transcription (unless a transcript is given), then one generation per artifact
+        transcript = data.get("transcript")
+        transcription = 0.0 if transcript else estimate_cost(dict(data, action="transcribe_youtube"))
+        generation = QWEN_SECONDS_PER_GENERATION + len(transcript or "") / CHARS_PER_TOKEN * QWEN_SECONDS_PER_INPUT_TOKEN
+        return transcription + len(data.get("artifacts") or ("summary", "quiz", "flashcards")) * generation
+
+    # Incremental summaries only process the new segments (about a minute of speech per chunk)
+    transcript = data.get("transcript") or " ".join(s.get("text") or "" for s in data.get("segments") or [])
+    if transcript:
+        tokens = len(transcript) / CHARS_PER_TOKEN
+        return QWEN_SECONDS_PER_GENERATION + tokens * QWEN_SECONDS_PER_INPUT_TOKEN
+
+    return UNKNOWN_COST_SECONDS
+
+def _cached_video_duration(video_id):
+    try:
+        from youtube_page import get_watch_page_data
+        return get_watch_page_data(video_id).get("durationSeconds")
+    except Exception:
+        return None
+
+class JobScheduler:
+    """Thread-safe priority queue of job IDs
+
+    submit() adds a job, next() blocks until a job is eligible to run (its user
+    is under the concurrency cap, anonymous jobs always are) and returns it,
+    finished() releases the slot.
+    cancel() withdraws a job that has not started yet.
+    """
+
+    def __init__(self, aging_rate=AGING_RATE, max_running_per_user=MAX_RUNNING_PER_USER):
+        self.aging_rate = aging_rate
+        self.max_running_per_user = max_running_per_user
+        self._heap = []
+        self._counter = itertools.count()
+        self._running_per_user: Dict[str, int] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._wait_stats = {
+            name: {"started": 0, "totalWaitSeconds": 0.0, "maxWaitSeconds": 0.0}
+            for name in PRIORITY_CLASSES
+        }
+
+    def submit(self, job_id: str, cost_seconds: float, priority: Optional[str] = None,
+               user_id: Optional[str] = None, enqueued_at: Optional[float] = None):
+        if priority not in PRIORITY_CLASSES:
+            priority = DEFAULT_PRIORITY
+        enqueued_at = enqueued_at or time.time()
+        # Aging applies at the same rate to every waiting job, so the ordering
+        # key can be fixed at submit time
+        key = PRIORITY_CLASSES[priority] + cost_seconds + self.aging_rate * enqueued_at
+        entry = {
+            "jobId": job_id,
+            "priority": priority,
+            "userId": user_id or ANONYMOUS_USER,
+            "costSeconds": cost_seconds,
+            "enqueuedAt": enqueued_at,
+        }
+        with self._cond:
+            self._entries[job_id] = entry
+            heapq.heappush(self._heap, (key, next(self._counter), job_id))
+            self._cond.notify()
+        print(f"[Scheduler] Job {job_id} queued (priority={priority}, user={entry['userId']}, cost~{cost_seconds:.0f}s)", file=sys.stderr)
+
+    def next(self) -> Dict[str, Any]:
+        """Block until a job may start; returns its entry (with waitSeconds)"""
+        with self._cond:
+            while True:
+                skipped = []
+                chosen = None
+                while self._heap:
+                    item = heapq.heappop(self._heap)
+                    entry = self._entries.get(item[2])
+                    if entry is None:
+                        # Cancelled while queued
+                        continue
+                    if (entry["userId"] == ANONYMOUS_USER
+                            or self._running_per_user.get(entry["userId"], 0) < self.max_running_per_user):
+                        chosen = entry
+                        break
+                    skipped.append(item)
+                for item in skipped:
+                    heapq.heappush(self._heap, item)
+
+                if chosen is not None:
+                    user = chosen["userId"]
+                    chosen["started"] = True
+                    self._running_per_user[user] = self._running_per_user.get(user, 0) + 1
+                    wait = time.time() - chosen["enqueuedAt"]
+                    stats = self._wait_stats[chosen["priority"]]
+                    stats["started"] += 1
+                    stats["totalWaitSeconds"] += wait
+                    stats["maxWaitSeconds"] = max(stats["maxWaitSeconds"], wait)
+                    return dict(chosen, waitSeconds=wait)
+
+                # Either empty, or every waiting job belongs to a user at the cap
+                self._cond.wait()
+
+    def cancel(self, job_id: str) -> bool:
+        """Withdraw a queued job; returns False if it is unknown or already running"""
+        with self._cond:
+            entry = self._entries.get(job_id)
+            if entry is None or entry.get("started"):
+                return False
+            # Its heap item is dropped when next() reaches it
+            del self._entries[job_id]
+            return True
+
+    def finished(self, job_id: str):
+        with self._cond:
+            entry = self._entries.pop(job_id, None)
+            if entry is not None:
+                user = entry["userId"]
+                self._running_per_user[user] = max(0, self._running_per_user.get(user, 0) - 1)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and queue-wait statistics per priority class"""
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_CLASSES}
+            for _, _, job_id in self._heap:
+                if job_id in self._entries:
+                    queued[self._entries[job_id]["priority"]] += 1
+            classes = {}
+            for name, stats in self._wait_stats.items():
+                started = stats["started"]
+                classes[name] = {
+                    "queued": queued[name],
+                    "started": started,
+                    "avgWaitSeconds": round(stats["totalWaitSeconds"] / started, 3) if started else 0.0,
+                    "maxWaitSeconds": round(stats["maxWaitSeconds"], 3),
+                }
+            return {
+                "classes": classes,
+                "runningPerUser": {u: n for u, n in self._running_per_user.items() if n},
+            }
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed job store for the model server
+Keeps job state, progress, partial transcription segments and pipeline
+artifacts on disk so queued and running jobs survive a server restart
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Optional, Dict, Any, List
+
+from local_cache import get_cache_dir
+
+# Finished jobs older than this are purged at startup
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_segments (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    segment TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS job_artifacts (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    artifact TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+def default_db_path(port=None):
+    """Job database path; local instances on other ports than 8765 get their own file"""
+    if os.environ.get("MODEL_SERVER_JOB_DB"):
+        return os.environ["MODEL_SERVER_JOB_DB"]
+    name = "model_server_jobs.sqlite3" if port in (None, 8765) else f"model_server_jobs_{port}.sqlite3"
+    return os.path.join(get_cache_dir(), name)
+
+class JobStore:
+    """Thread-safe job table. Status is one of: queued, running, completed, failed, cancelled."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_db_path()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        print(f"[JobStore] Using job database: {self.db_path}", file=sys.stderr)
+
+    def create(self, action: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, action, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, action, json.dumps(payload), time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str, segments_since: int = 0) -> Optional[Dict[str, Any]]:
+        """Job status plus partial segments with index >= segments_since and the artifacts so far"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            segment_rows = self._conn.execute(
+                "SELECT segment FROM job_segments WHERE job_id = ? AND idx >= ? ORDER BY idx",
+                (job_id, segments_since),
+            ).fetchall()
+            segment_count = self._conn.execute(
+                "SELECT COUNT(*) FROM job_segments WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            artifact_rows = self._conn.execute(
+                "SELECT name, artifact FROM job_artifacts WHERE job_id = ? ORDER BY created_at", (job_id,)
+            ).fetchall()
+
+        return {
+            "id": row["id"],
+            "action": row["action"],
+            "status": row["status"],
+            "progress": row["progress"],
+            "createdAt": row["created_at"],
+            "startedAt": row["started_at"],
+            "finishedAt": row["finished_at"],
+            "error": row["error"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "segments": [json.loads(r["segment"]) for r in segment_rows],
+            "segmentCount": segment_count,
+            "artifacts": {r["name"]: json.loads(r["artifact"]) for r in artifact_rows},
+        }
+
+    def load_payload(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT action, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row["payload"])
+        payload["action"] = row["action"]
+        return payload
+
+    def mark_running(self, job_id: str):
+        with self._lock, self._conn:
+            # A restarted job starts over, so drop segments and artifacts from the interrupted run
+            self._conn.execute("DELETE FROM job_segments WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM job_artifacts WHERE job_id = ?", (job_id,))
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', progress = 0, started_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+
+    def add_segment(self, job_id: str, index: int, segment: Dict[str, Any], progress: Optional[float] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_segments (job_id, idx, segment) VALUES (?, ?, ?)",
+                (job_id, index, json.dumps(segment)),
+            )
+            if progress is not None:
+                self._conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (progress, job_id))
+
+    def add_artifact(self, job_id: str, name: str, artifact: Dict[str, Any]):
+        """Store one finished pipeline stage's outcome (see lecture_pipeline)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_artifacts (job_id, name, artifact, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, name, json.dumps(artifact), time.time()),
+            )
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'completed', progress = 1, result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str, result: Optional[Dict[str, Any]] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, result = ?, finished_at = ? WHERE id = ?",
+                (error, json.dumps(result) if result else None, time.time(), job_id),
+            )
+
+    def cancel(self, job_id: str, reason: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', error = ?, finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (reason, time.time(), job_id),
+            )
+
+    def unfinished(self) -> List[str]:
+        """IDs of jobs that were queued or running when the server stopped, oldest first"""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        return [r["id"] for r in rows]
+
+    def purge_finished(self, older_than_seconds: float = JOB_RETENTION_SECONDS) -> int:
+        cutoff = time.time() - older_than_seconds
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM job_segments WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('completed', 'failed', 'cancelled') AND finished_at < ?)",
+                (cutoff,),
+            )
+            self._conn.execute(
+                "DELETE FROM job_artifacts WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('completed', 'failed', 'cancelled') AND finished_at < ?)",
+                (cutoff,),
+            )
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed', 'cancelled') AND finished_at < ?", (cutoff,)
+            )
+        return cursor.rowcount
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Dependency-aware stage execution for the "process lecture" pipeline
+A pipeline is a set of named stages, each listing the stages whose results
+it needs. A stage starts as soon as all of them have succeeded, so stages
+that do not depend on each other (summary, quiz and flashcards) run in
+parallel, and every stage's result is handed to on_artifact the moment it
+is ready rather than when the whole pipeline is done. A failed stage skips
+the stages that depend on it; the others still run.
+"""
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional
+
+import cancellation
+from prompt_templates import detect_language
+
+# The generators' longest transcript (the quiz and flashcards templates' limit)
+MAX_TRANSCRIPT_CHARS = 20000
+# Shorter transcripts are not worth summarizing (same minimum as the web tier)
+MIN_TRANSCRIPT_CHARS = 100
+
+# Caption markers such as [Music], [Applause] or ♪
+_CAPTION_ANNOTATION = re.compile(r"\[[^\]]*\]|♪+")
+
+class Stage:
+    """A named step; run(results) gets the results of `deps` by stage name"""
+
+    __slots__ = ("name", "run", "deps")
+
+    def __init__(self, name: str, run: Callable[[Dict[str, Dict[str, Any]]], Dict[str, Any]], deps: List[str] = ()):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+
+def _check_graph(stages: List[Stage]):
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in names]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stage(s): {', '.join(missing)}")
+    # Every stage must become runnable once its dependencies are done (no cycles)
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [s for s in remaining if all(d in done for d in s.deps)]
+        if not ready:
+            raise ValueError(f"Stages form a cycle: {', '.join(s.name for s in remaining)}")
+        done.update(s.name for s in ready)
+        remaining = [s for s in remaining if s.name not in done]
+
+def run_stages(stages: List[Stage], on_artifact: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+               max_workers: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """Run stages in dependency order, independent ones in parallel
+
+    The caller's cancel token is active in every stage; once it fires, no
+    further stage starts and Cancelled is raised after the running ones stop.
+
+    Args:
+        on_artifact: on_artifact(stage name, outcome), called as each stage finishes
+        max_workers: Stages running at once (default: all that are ready)
+
+    Returns:
+        {stage name: {"status": "completed" | "failed" | "skipped", "seconds",
+        "result" (completed) or "error"}}
+    """
+    _check_graph(stages)
+    token = cancellation.current()
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+
+    def execute(stage, inputs):
+        with cancellation.active(token):
+            cancellation.check_current()
+            started = time.perf_counter()
+            result = stage.run(inputs)
+            return result, time.perf_counter() - started
+
+    def finish(name, outcome):
+        outcomes[name] = outcome
+        print(f"[Pipeline] Stage {name} {outcome['status']}"
+              + (f" in {outcome['seconds']:.2f}s" if "seconds" in outcome else "")
+              + (f": {outcome['error']}" if outcome.get("error") else ""), file=sys.stderr)
+        if on_artifact:
+            on_artifact(name, outcome)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages), thread_name_prefix="pipeline") as executor:
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    failed = [d for d in stage.deps if d in outcomes and outcomes[d]["status"] != "completed"]
+                    if failed:
+                        del pending[name]
+                        finish(name, {"status": "skipped", "error": f"Stage {failed[0]} did not complete"})
+                    elif all(d in outcomes for d in stage.deps):
+                        del pending[name]
+                        inputs = {d: outcomes[d]["result"] for d in stage.deps}
+                        running[executor.submit(execute, stage, inputs)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, seconds = future.result()
+                    except cancellation.Cancelled:
+                        raise
+                    except Exception as e:
+                        finish(name, {"status": "failed", "error": str(e)})
+                        continue
+                    outcome = {"status": "completed" if result.get("success") else "failed", "seconds": round(seconds, 3)}
+                    if result.get("success"):
+                        outcome["result"] = result
+                    else:
+                        outcome["error"] = result.get("error") or "Stage failed"
+                    finish(name, outcome)
+        except cancellation.Cancelled:
+            for future in running:
+                future.cancel()
+            raise
+    return outcomes
+
+def preprocess_transcript(transcript: str, from_captions: bool = False) -> Dict[str, Any]:
+    """The transcript every generator stage gets: whitespace-normalized, without
+    caption markers, and cut at a sentence end to MAX_TRANSCRIPT_CHARS
+
+    Cutting once here (instead of in each generator) gives all of them the
+    identical transcript text.
+    """
+    text = _CAPTION_ANNOTATION.sub(" ", transcript) if from_captions else transcript
+    text = " ".join(text.split())
+    if len(text) < MIN_TRANSCRIPT_CHARS:
+        return {"success": False, "error": f"Transcript is too short to process ({len(text)} characters)"}
+
+    truncated = len(text) > MAX_TRANSCRIPT_CHARS
+    if truncated:
+        cut = MAX_TRANSCRIPT_CHARS
+        for i in range(MAX_TRANSCRIPT_CHARS, MAX_TRANSCRIPT_CHARS - 500, -1):
+            if text[i] in ".!?\n":
+                cut = i + 1
+                break
+        text = text[:cut]
+    return {
+        "success": True,
+        "transcript": text,
+        "language": detect_language(text),
+        "characterCount": len(text),
+        "truncated": truncated,
+    }
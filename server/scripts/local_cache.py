@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Local on-disk cache shared by the per-request scripts
+Small JSON records with a TTL, plus a cross-process lock so concurrent
+script invocations for the same key do the expensive work only once
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows - fall back to no cross-process locking
+    fcntl = None
+
+def get_cache_dir(subdir=None):
+    """Return (and create) the cache directory, optionally a subdirectory of it
+
+    Defaults to <tmp>/lecture-assistant-cache; override with LECTURE_CACHE_DIR.
+    """
+    base = os.environ.get("LECTURE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "lecture-assistant-cache")
+    path = os.path.join(base, subdir) if subdir else base
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def read_json(path, ttl_seconds=None):
+    """Read a cached JSON record, or None if missing, unreadable or older than ttl_seconds"""
+    try:
+        if ttl_seconds is not None and time.time() - os.path.getmtime(path) > ttl_seconds:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json(path, data):
+    """Atomically write a JSON record (readers never see a partial file)"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[Cache] Could not write {path}: {e}", file=sys.stderr)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+@contextmanager
+def file_lock(path):
+    """Exclusive cross-process lock on `path` (no-op where fcntl is unavailable)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Memory-aware admission control and out-of-memory recovery for the model server
+Each request reserves its estimated memory on its device and waits while the
+device's budget is taken; a request that still runs out of memory is retried
+as lighter variants after caches are freed, and every event is counted
+"""
+import gc
+import os
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MB = 1024 * 1024
+
+# Budget per device: MODEL_SERVER_MEMORY_BUDGET_MB if set, else this share of
+# the memory that is free when the device is first used (models already loaded)
+MEMORY_BUDGET_MB = os.environ.get("MODEL_SERVER_MEMORY_BUDGET_MB")
+MEMORY_BUDGET_FRACTION = float(os.environ.get("MODEL_SERVER_MEMORY_FRACTION", "0.9"))
+
+# Rough working-memory model, beyond the weights
+WHISPER_BASE_BYTES = 600 * MB          # encoder output, decoder state and beams for one 30 s window
+WHISPER_PER_BATCH_BYTES = 350 * MB     # each extra window decoded in parallel (batched inference)
+WHISPER_WORD_TIMESTAMPS_BYTES = 100 * MB
+AUDIO_BYTES_PER_SECOND = 16000 * 4     # decoded float32 waveform at 16 kHz
+# Qwen2.5-3B: 36 layers x (K, V) x 2 KV heads x 128 dims x fp16
+QWEN_KV_BYTES_PER_TOKEN = 36 * 2 * 2 * 128 * 2
+# MLP activations (11008 intermediate, fp16, gate + up) held during prefill
+QWEN_PREFILL_BYTES_PER_TOKEN = 2 * 11008 * 2
+# Qwen2.5-0.5B draft model: 24 layers x (K, V) x 2 KV heads x 64 dims x fp16
+QWEN_DRAFT_KV_BYTES_PER_TOKEN = 24 * 2 * 2 * 64 * 2
+QWEN_OVERHEAD_BYTES = 300 * MB         # logits over the 152k vocabulary, sampling buffers
+QWEN_GENERATION_TOKENS = 2048
+CHARS_PER_TOKEN = 4
+
+def estimate_whisper_bytes(duration_seconds: Optional[float], batch_size: Optional[int],
+                           word_timestamps: bool = False) -> int:
+    estimate = WHISPER_BASE_BYTES + max(0, (batch_size or 1) - 1) * WHISPER_PER_BATCH_BYTES
+    if word_timestamps:
+        estimate += WHISPER_WORD_TIMESTAMPS_BYTES
+    return estimate + int((duration_seconds or 0) * AUDIO_BYTES_PER_SECOND)
+
+def estimate_qwen_bytes(transcript_chars: int, assisted: Optional[str] = None) -> int:
+    tokens = transcript_chars / CHARS_PER_TOKEN + QWEN_GENERATION_TOKENS
+    estimate = tokens * (QWEN_KV_BYTES_PER_TOKEN + QWEN_PREFILL_BYTES_PER_TOKEN) + QWEN_OVERHEAD_BYTES
+    if assisted == "draft":
+        estimate += tokens * QWEN_DRAFT_KV_BYTES_PER_TOKEN
+    return int(estimate)
+
+def batch_size_ladder(batch_size: Optional[int]) -> List[Optional[int]]:
+    """Batch sizes to fall back through after running out of memory: halving, then sequential"""
+    ladder = []
+    while batch_size and batch_size > 1:
+        ladder.append(batch_size)
+        batch_size //= 2
+    return ladder + [None]
+
+def is_oom(error: BaseException) -> bool:
+    """True for torch, CTranslate2 and host out-of-memory errors"""
+    if isinstance(error, MemoryError):
+        return True
+    torch = sys.modules.get("torch")
+    oom_type = getattr(getattr(torch, "cuda", None), "OutOfMemoryError", None)
+    if oom_type is not None and isinstance(error, oom_type):
+        return True
+    return "out of memory" in str(error).lower()
+
+def is_oom_result(result: Dict[str, Any]) -> bool:
+    """True for a failed result whose error came from running out of memory
+
+    The generator scripts catch their own exceptions and return them as
+    {"success": False, "error", "details"}.
+    """
+    if not isinstance(result, dict) or result.get("success", True):
+        return False
+    text = f"{result.get('error') or ''} {result.get('details') or ''}"
+    return "out of memory" in text.lower() or "MemoryError" in text
+
+def free_memory():
+    """Drop unreferenced tensors and return cached CUDA blocks to the driver"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+def _canonical_device(device: str) -> str:
+    return "cuda:0" if device == "cuda" else device
+
+def _available_bytes(device: str) -> Optional[int]:
+    """Free memory on `device` right now, or None if it cannot be measured"""
+    try:
+        if device.startswith("cuda"):
+            import torch
+            if torch.cuda.is_available():
+                free, _ = torch.cuda.mem_get_info(torch.device(device))
+                return free
+            return None
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ImportError, ValueError, OSError, AttributeError, RuntimeError):
+        return None
+
+class MemoryGuard:
+    """Per-device memory reservations and out-of-memory statistics"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._devices: Dict[str, Dict[str, Any]] = {}
+        self._events = deque(maxlen=20)
+
+    def _state(self, device: str) -> Dict[str, Any]:
+        state = self._devices.get(device)
+        if state is None:
+            if MEMORY_BUDGET_MB:
+                budget = int(float(MEMORY_BUDGET_MB) * MB)
+            else:
+                available = _available_bytes(device)
+                budget = int(available * MEMORY_BUDGET_FRACTION) if available else None
+            state = self._devices[device] = {
+                "budget": budget, "reserved": 0, "peakReserved": 0, "running": 0,
+                "admitted": 0, "waited": 0, "waitSeconds": 0.0,
+                "oomEvents": 0, "recovered": 0, "failed": 0,
+            }
+            print(f"[Memory] Budget for {device}: {f'{budget / MB:.0f} MB' if budget else 'unlimited'}", file=sys.stderr)
+        return state
+
+    @contextmanager
+    def reserve(self, device: str, nbytes: int):
+        """Hold `nbytes` of `device`'s budget for the block, waiting until it fits
+
+        A request alone on its device is always admitted, even above the budget;
+        running out of memory is then handled by run_with_recovery().
+        """
+        device = _canonical_device(device)
+        with self._cond:
+            state = self._state(device)
+            started = time.perf_counter()
+            waited = False
+            while state["budget"] is not None and state["running"] and state["reserved"] + nbytes > state["budget"]:
+                waited = True
+                self._cond.wait()
+            state["reserved"] += nbytes
+            state["running"] += 1
+            state["admitted"] += 1
+            state["peakReserved"] = max(state["peakReserved"], state["reserved"])
+            if waited:
+                state["waited"] += 1
+                state["waitSeconds"] += time.perf_counter() - started
+        try:
+            yield
+        finally:
+            with self._cond:
+                state["reserved"] -= nbytes
+                state["running"] -= 1
+                self._cond.notify_all()
+
+    def run_with_recovery(self, device: str, attempts: List[Tuple[str, int, Callable[[], Dict[str, Any]]]],
+                          on_oom: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """Run the first of `attempts` that does not run out of memory
+
+        Args:
+            device: Device the work runs on
+            attempts: (label, estimated bytes, run) from the preferred variant to
+                the lightest; run() returns a result dictionary
+            on_oom: Extra cleanup after an out-of-memory error (besides free_memory)
+
+        Returns:
+            The result, with "memoryFallback" set to the label of the variant
+            that succeeded after an out-of-memory error, or a failed result
+            with "outOfMemory": True if every variant ran out of memory
+        """
+        device = _canonical_device(device)
+        error = None
+        for i, (label, nbytes, run) in enumerate(attempts):
+            try:
+                with self.reserve(device, nbytes):
+                    result = run()
+                oom = is_oom_result(result)
+                if oom:
+                    error = result.get("error")
+            except Exception as e:
+                if not is_oom(e):
+                    raise
+                oom, error = True, str(e)
+
+            if not oom:
+                if i:
+                    self._record(device, "recovered")
+                    result["memoryFallback"] = label
+                return result
+
+            self._record(device, "oomEvents")
+            self._events.append({"time": time.time(), "device": device, "attempt": label,
+                                 "estimatedMB": round(nbytes / MB), "error": (error or "")[:200]})
+            print(f"[Memory] Out of memory on {device} ({label}, ~{nbytes / MB:.0f} MB estimated), freeing caches", file=sys.stderr)
+            free_memory()
+            if on_oom:
+                on_oom()
+
+        self._record(device, "failed")
+        return {
+            "success": False,
+            "error": f"Out of memory on {device}, even after retrying with lighter settings: {error}",
+            "outOfMemory": True,
+        }
+
+    def _record(self, device: str, counter: str):
+        with self._cond:
+            self._state(device)[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            devices = {}
+            for device, state in self._devices.items():
+                devices[device] = {
+                    "budgetMB": round(state["budget"] / MB) if state["budget"] else None,
+                    "reservedMB": round(state["reserved"] / MB),
+                    "peakReservedMB": round(state["peakReserved"] / MB),
+                    "running": state["running"],
+                    "admitted": state["admitted"],
+                    "waited": state["waited"],
+                    "avgWaitSeconds": round(state["waitSeconds"] / state["waited"], 3) if state["waited"] else 0.0,
+                    "oomEvents": state["oomEvents"],
+                    "recovered": state["recovered"],
+                    "failed": state["failed"],
+                }
+            return {"devices": devices, "recentOomEvents": list(self._events)}
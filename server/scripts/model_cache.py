@@ -41,10 +41,19 @@ def get_whisper_model(model_size: str, device: str = "cuda", compute_type: str =
             else:
                 return WhisperModel(model_size, device="cpu", compute_type="int8")
 
+# Small model used as the draft for assisted decoding; must share Qwen2.5's tokenizer
+QWEN_DRAFT_MODEL = os.environ.get("QWEN_DRAFT_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+
 def get_qwen_model(device: str = "cuda"):
     """Get or load Qwen model from cache"""
-    cache_key = f"qwen_3b_{device}"
-    
+    return _get_causal_lm("Qwen/Qwen2.5-3B-Instruct", f"qwen_3b_{device}", device)
+
+def get_qwen_draft_model(device: str = "cuda"):
+    """Get or load the draft model for assisted decoding (model only, the tokenizer is shared)"""
+    model, _ = _get_causal_lm(QWEN_DRAFT_MODEL, f"qwen_draft_{QWEN_DRAFT_MODEL}_{device}", device)
+    return model
+
+def _get_causal_lm(model_name: str, cache_key: str, device: str):
     with _cache_lock:
         if cache_key in _model_cache:
             print(f"[ModelCache] Using cached Qwen model: {cache_key}", file=sys.stderr)
@@ -56,12 +65,20 @@ def get_qwen_model(device: str = "cuda"):
             import torch
             from transformers import AutoTokenizer, AutoModelForCausalLM
             
-            model_name = "Qwen/Qwen2.5-3B-Instruct"
+            on_gpu = device.startswith("cuda")
+            if device == "cuda":
+                device_map = "auto"
+            elif on_gpu:
+                # A specific GPU (e.g. a model-server replica's "cuda:1")
+                device_map = {"": torch.device(device).index}
+            else:
+                device_map = None
+            
             tokenizer = AutoTokenizer.from_pretrained(model_name)
             model = AutoModelForCausalLM.from_pretrained(
                 model_name,
-                torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-                device_map="auto" if device == "cuda" else None,
+                torch_dtype=torch.float16 if on_gpu else torch.float32,
+                device_map=device_map,
             )
             
             if device == "cpu":
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Model replicas for the model server
+Each replica is one copy of a model pinned to a GPU or to a set of CPU cores.
+Requests go to the least-loaded replica of the requested device type, and
+per-replica load and utilization are tracked for the stats endpoint.
+
+Replica lists are comma-separated device specs:
+    cuda:all      one replica per visible GPU
+    cuda:1        GPU 1
+    cuda          default GPU (single-instance behaviour)
+    cpu:0-7       CPU, pinned to cores 0-7 (lists like 0,2,4-6 work too)
+    cpu           CPU, unpinned
+
+Core pinning fully applies to Whisper (CTranslate2 gives each model its own
+thread pool); torch's intra-op pool is process-wide, so Qwen CPU replicas
+only pin the calling thread.
+"""
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+WHISPER_REPLICAS = os.environ.get("MODEL_SERVER_WHISPER_REPLICAS", "")
+QWEN_REPLICAS = os.environ.get("MODEL_SERVER_QWEN_REPLICAS", "")
+
+def cuda_device_count() -> int:
+    try:
+        import torch
+        return torch.cuda.device_count() if torch.cuda.is_available() else 0
+    except ImportError:
+        pass
+    try:
+        import ctranslate2
+        return ctranslate2.get_cuda_device_count()
+    except ImportError:
+        return 0
+
+def parse_cores(text: str) -> List[int]:
+    """'0-3,8' -> [0, 1, 2, 3, 8]"""
+    cores = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cores.extend(range(int(first), int(last) + 1))
+        else:
+            cores.append(int(part))
+    return sorted(set(cores))
+
+def normalize_device(device: Optional[str]) -> str:
+    return "cuda" if device in ("cuda", "gpu") or (device or "").startswith("cuda:") else "cpu"
+
+class Replica:
+    def __init__(self, name: str, device: str, index: Optional[int] = None, cores: Optional[List[int]] = None):
+        self.name = name
+        self.device = device
+        self.index = index
+        self.cores = cores
+        self.active = 0
+        self.completed = 0
+        self.busy_seconds = 0.0
+        self.created_at = time.time()
+
+    @property
+    def torch_device(self) -> str:
+        """Device string for tensors ('cuda:1', 'cuda' or 'cpu')"""
+        if self.device == "cuda" and self.index is not None:
+            return f"cuda:{self.index}"
+        return self.device
+
+    @property
+    def key(self) -> str:
+        """Distinguishes this replica's copy in the model cache"""
+        if self.index is not None:
+            return f"{self.device}{self.index}"
+        if self.cores:
+            return f"{self.device}[{self.cores[0]}-{self.cores[-1]}x{len(self.cores)}]"
+        return self.device
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = max(time.time() - self.created_at, 1e-9)
+        return {
+            "name": self.name,
+            "device": self.torch_device,
+            "cores": self.cores,
+            "active": self.active,
+            "completed": self.completed,
+            "busySeconds": round(self.busy_seconds, 3),
+            # Average number of requests in flight since startup (can exceed 1)
+            "utilization": round(self.busy_seconds / uptime, 4),
+        }
+
+def parse_replicas(kind: str, spec: str) -> List[Replica]:
+    replicas = []
+    for item in (s.strip() for s in spec.split(",") if s.strip()):
+        device, _, arg = item.partition(":")
+        device = normalize_device(device)
+        if device == "cuda" and arg == "all":
+            indices = list(range(cuda_device_count()))
+            if not indices:
+                print(f"[Replicas] No CUDA devices visible for '{item}'", file=sys.stderr)
+            for index in indices:
+                replicas.append(Replica(f"{kind}-cuda{index}", "cuda", index=index))
+        elif device == "cuda":
+            index = int(arg) if arg else None
+            replicas.append(Replica(f"{kind}-cuda{'' if index is None else index}", "cuda", index=index))
+        else:
+            cores = parse_cores(arg) if arg else None
+            cpu_count = sum(1 for r in replicas if r.device == "cpu")
+            replicas.append(Replica(f"{kind}-cpu{cpu_count}", "cpu", cores=cores))
+    return replicas
+
+@contextmanager
+def pinned_to(cores: Optional[List[int]]):
+    """Restrict the calling thread to `cores` (Linux only; threads it starts inherit this)"""
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cores)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+class ReplicaPool:
+    """Least-loaded dispatch over the replicas of one model kind
+
+    A device type without configured replicas gets a single unpinned replica
+    on first use, which is the previous single-instance behaviour.
+    """
+
+    def __init__(self, kind: str, spec: str = ""):
+        self.kind = kind
+        self.replicas = parse_replicas(kind, spec)
+        self._lock = threading.Lock()
+        if self.replicas:
+            print(f"[Replicas] {kind}: {', '.join(r.name for r in self.replicas)}", file=sys.stderr)
+
+    def candidates(self, device: Optional[str]) -> List[Replica]:
+        device = normalize_device(device)
+        with self._lock:
+            matching = [r for r in self.replicas if r.device == device]
+            if not matching:
+                replica = Replica(f"{self.kind}-{device}", device)
+                self.replicas.append(replica)
+                matching = [replica]
+            return matching
+
+    @contextmanager
+    def acquire(self, device: Optional[str]):
+        """Reserve the least-loaded replica for `device` for the duration of the block"""
+        candidates = self.candidates(device)
+        with self._lock:
+            replica = min(candidates, key=lambda r: (r.active, r.busy_seconds))
+            replica.active += 1
+        started = time.perf_counter()
+        try:
+            with pinned_to(replica.cores):
+                yield replica
+        finally:
+            with self._lock:
+                replica.active -= 1
+                replica.completed += 1
+                replica.busy_seconds += time.perf_counter() - started
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [r.stats() for r in self.replicas]
@@ -4,20 +4,61 @@ Model Server for Whisper and Qwen models
 Loads models once and keeps them in memory
 Communicates via HTTP API
 """
+import io
 import sys
 import json
 import os
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import threading
+import cancellation
+from job_store import JobStore, default_db_path
+from job_scheduler import JobScheduler, estimate_cost
+from transcript_store import TranscriptStore, model_key
+from segment_index import SegmentBuffer
+from model_replicas import ReplicaPool, pinned_to, cuda_device_count, WHISPER_REPLICAS, QWEN_REPLICAS
+from autotune import (
+    get_profile, whisper_key, whisper_settings, qwen_key, qwen_cpu_threads, calibrate_whisper, calibrate_qwen_cpu,
+)
+from http_encoding import SerializationStats, encode_response
+from memory_guard import MemoryGuard, batch_size_ladder, estimate_whisper_bytes, estimate_qwen_bytes
+from prompt_templates import TEMPLATES, get_template
+from incremental_summary import SummarySessions
+from streaming_transcription import StreamingTranscriber, transcribe_stream, SAMPLE_RATE
+from lecture_pipeline import Stage, run_stages, preprocess_transcript
+from qwen_generation import resolve_assisted_mode, clear_prefix_caches
+from whisper_decoding import (
+    select_profile, get_audio_duration, build_transcribe_options, segment_to_dict,
+    run_transcription, parse_batch_size,
+)
 
 # Global model cache
 _models = {}
 _lock = threading.Lock()
 
-def load_whisper_model(model_size="large-v3", device="cuda", compute_type="float16"):
-    """Load Whisper model"""
-    cache_key = f"whisper_{model_size}_{device}_{compute_type}"
+# In-flight transcription count, used as queue depth by the decoding profile policy
+_active_transcriptions = 0
+# Open live transcription streams (POST /transcribe/stream)
+_active_streams = 0
+_active_lock = threading.Lock()
+
+# Memory reservations and out-of-memory recovery per device
+_memory = MemoryGuard()
+
+# Model copies per GPU / CPU core set (MODEL_SERVER_WHISPER_REPLICAS, MODEL_SERVER_QWEN_REPLICAS)
+_whisper_replicas = ReplicaPool("whisper", WHISPER_REPLICAS)
+_qwen_replicas = ReplicaPool("qwen", QWEN_REPLICAS)
+
+def load_whisper_model(model_size="large-v3", device="cuda", compute_type=None, replica=None):
+    """Load Whisper model (for one replica: its GPU index or pinned CPU cores)
+    
+    compute_type, CPU threads and num_workers default to this host's tuning profile.
+    """
+    cores = replica.cores if replica else None
+    settings = whisper_settings(device, cores)
+    compute_type = compute_type or settings["compute_type"]
+    cache_key = f"whisper_{model_size}_{replica.key if replica else device}_{compute_type}"
     
     with _lock:
         if cache_key in _models:
@@ -29,9 +70,14 @@ def load_whisper_model(model_size="large-v3", device="cuda", compute_type="float
         
         try:
             if device == "cuda":
-                model = WhisperModel(model_size, device="cuda", compute_type=compute_type)
+                model = WhisperModel(model_size, device="cuda", compute_type=compute_type,
+                                     device_index=replica.index if replica and replica.index is not None else 0,
+                                     num_workers=settings["num_workers"])
             else:
-                model = WhisperModel(model_size, device="cpu", compute_type="int8")
+                # CTranslate2 starts its inference threads here, so they inherit the core set
+                with pinned_to(cores):
+                    model = WhisperModel(model_size, device="cpu", compute_type=compute_type,
+                                         cpu_threads=settings["cpu_threads"], num_workers=settings["num_workers"])
             
             _models[cache_key] = model
             print(f"[ModelServer] Whisper model loaded and cached: {cache_key}", file=sys.stderr)
@@ -40,9 +86,9 @@ def load_whisper_model(model_size="large-v3", device="cuda", compute_type="float
             print(f"[ModelServer] Error loading Whisper model: {e}", file=sys.stderr)
             raise
 
-def load_qwen_model(device="cuda"):
-    """Load Qwen model"""
-    cache_key = f"qwen_3b_{device}"
+def load_qwen_model(device="cuda", replica=None):
+    """Load Qwen model (for one replica: pinned to its GPU instead of device_map="auto")"""
+    cache_key = f"qwen_3b_{replica.key if replica else device}"
     
     with _lock:
         if cache_key in _models:
@@ -56,14 +102,21 @@ def load_qwen_model(device="cuda"):
         
         model_name = "Qwen/Qwen2.5-3B-Instruct"
         tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if device == "cuda" and replica and replica.index is not None:
+            device_map = {"": replica.index}
+        else:
+            device_map = "auto" if device == "cuda" else None
         model = AutoModelForCausalLM.from_pretrained(
             model_name,
             torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            device_map="auto" if device == "cuda" else None,
+            device_map=device_map,
         )
         
         if device == "cpu":
             model = model.to(device)
+            # Process-wide; split between the Qwen CPU replicas unless tuned
+            cpu_replicas = sum(1 for r in _qwen_replicas.replicas if r.device == "cpu")
+            torch.set_num_threads(qwen_cpu_threads(len(replica.cores) if replica and replica.cores else None, cpu_replicas))
         
         _models[cache_key] = {
             'model': model,
@@ -72,198 +125,1007 @@ def load_qwen_model(device="cuda"):
         print(f"[ModelServer] Qwen model loaded and cached: {cache_key}", file=sys.stderr)
         return model, tokenizer
 
-class ModelHandler(BaseHTTPRequestHandler):
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        
-        try:
-            data = json.loads(post_data.decode('utf-8'))
-            action = data.get('action')
-            
-            if action == 'transcribe':
-                result = self.handle_transcribe(data)
-            elif action == 'generate_summary':
-                result = self.handle_generate_summary(data)
-            elif action == 'generate_quiz':
-                result = self.handle_generate_quiz(data)
-            elif action == 'generate_flashcards':
-                result = self.handle_generate_flashcards(data)
-            else:
-                result = {"success": False, "error": f"Unknown action: {action}"}
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(result).encode('utf-8'))
-            
-        except Exception as e:
-            import traceback
-            error_trace = traceback.format_exc()
-            print(f"[ModelServer] Error: {str(e)}", file=sys.stderr)
-            print(f"[ModelServer] Traceback: {error_trace}", file=sys.stderr)
-            
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({
-                "success": False,
-                "error": str(e),
-                "details": error_trace
-            }).encode('utf-8'))
+def loaded_models():
+    """Model names held in memory, e.g. ["whisper:large-v3", "qwen"] (for load balancer affinity)"""
+    with _lock:
+        keys = list(_models)
+    names = set()
+    for key in keys:
+        if key.startswith("whisper_"):
+            names.add("whisper:" + key.split("_")[1])
+        elif key.startswith("qwen_"):
+            names.add("qwen")
+    return sorted(names)
+
+def handle_transcribe(data, on_segment=None):
+    """Handle transcription request
+    
+    on_segment(segment_dict, progress) is called for every decoded segment,
+    which lets jobs publish partial results while decoding is still running.
+    Segments are returned in data['segment_format'] ("objects", "columns" or "none").
+    """
+    result, collected = transcribe_file(data, on_segment)
+    if collected is not None:
+        result.update(collected.format_segments(data.get('segment_format')))
+    return result
+
+def transcribe_file(data, on_segment=None):
+    """Transcribe data['audio'] (uploaded bytes) or data['file_path']
+    
+    Returns:
+        (result without segments, SegmentBuffer or None on error)
+    """
+    file_path = data.get('file_path')
+    model_size = data.get('model_size', 'large-v3')
+    language = data.get('language')
+    device = data.get('device', 'cuda')
+    word_timestamps = bool(data.get('word_timestamps'))
+    batch_size = parse_batch_size(data.get('batch_size'))
+
+    if data.get('audio') is not None:
+        # Decoded straight from the request body, no temp file
+        file_path = io.BytesIO(data['audio'])
+    elif data.get('audio_upload'):
+        return {"success": False, "error": "Uploaded audio is no longer available (server restarted)"}, None
+    elif not file_path or not os.path.exists(file_path):
+        return {"success": False, "error": f"File not found: {file_path}"}, None
+
+    global _active_transcriptions
+    with _active_lock:
+        queue_depth = _active_transcriptions
+        _active_transcriptions += 1
+    try:
+        return _transcribe(file_path, model_size, language, device,
+                           data.get('profile'), word_timestamps, queue_depth, batch_size, on_segment)
+    finally:
+        with _active_lock:
+            _active_transcriptions -= 1
+
+def _transcribe(file_path, model_size, language, device, profile, word_timestamps, queue_depth, batch_size, on_segment=None):
+    """Transcribe within the device's memory budget, retrying lighter settings after running out of memory
     
-    def handle_transcribe(self, data):
-        """Handle transcription request"""
-        file_path = data.get('file_path')
-        model_size = data.get('model_size', 'large-v3')
-        language = data.get('language')
-        device = data.get('device', 'cuda')
+    Fallbacks: halve the batch size down to sequential decoding, then the
+    fast profile (smaller beams).
+    """
+    # Segments are decoded lazily, so the replica stays reserved until the loop below is done
+    with _whisper_replicas.acquire(device) as replica:
+        duration_seconds = get_audio_duration(file_path)
+        collected = [None]
+        emitted_until = [float('-inf')]
         
-        if not file_path or not os.path.exists(file_path):
-            return {"success": False, "error": f"File not found: {file_path}"}
+        def publish(segment, progress):
+            # A retry decodes from the start again; segments already published are skipped
+            if segment["end"] > emitted_until[0]:
+                emitted_until[0] = segment["end"]
+                on_segment(segment, progress)
         
+        def attempt(attempt_batch_size, attempt_profile):
+            def run():
+                result, collected[0] = _transcribe_on(replica, file_path, model_size, language, device, attempt_profile,
+                                                      word_timestamps, queue_depth, attempt_batch_size,
+                                                      publish if on_segment else None, duration_seconds)
+                return result
+            return run
+        
+        attempts = [
+            (f"batch_size={b}" if b else "sequential", estimate_whisper_bytes(duration_seconds, b, word_timestamps), attempt(b, profile))
+            for b in batch_size_ladder(batch_size)
+        ]
+        if profile != "fast":
+            attempts.append(("sequential, fast profile", estimate_whisper_bytes(duration_seconds, None, word_timestamps), attempt(None, "fast")))
+        result = _memory.run_with_recovery(replica.torch_device, attempts)
+        return result, collected[0] if result.get("success") else None
+
+def _transcribe_on(replica, file_path, model_size, language, device, profile, word_timestamps, queue_depth, batch_size,
+                   on_segment=None, duration_seconds=None):
+    # Load model (will use cache if already loaded)
+    model = load_whisper_model(model_size, replica.device, None, replica)
+
+    # Pick a decoding profile; other in-flight transcriptions count as queue depth
+    if duration_seconds is None:
+        duration_seconds = get_audio_duration(file_path)
+    elif hasattr(file_path, "seek"):
+        # Uploaded audio may have been partly read by an attempt that ran out of memory
+        file_path.seek(0)
+    profile = select_profile(duration_seconds, queue_depth, device, profile)
+    options = build_transcribe_options(profile, language, word_timestamps)
+
+    source = file_path if isinstance(file_path, str) else f"<{len(file_path.getbuffer())} uploaded bytes>"
+    print(f"[ModelServer] Transcribing on {replica.name}: {source} (profile={profile}, beam_size={options['beam_size']}, duration={duration_seconds}, queue_depth={queue_depth}, word_timestamps={word_timestamps}, batch_size={batch_size})", file=sys.stderr)
+    segments, info = run_transcription(model, file_path, options, batch_size)
+
+    # Collect segments into a columnar buffer; dicts are only built for on_segment
+    collected = SegmentBuffer(word_timestamps)
+    total_duration = getattr(info, 'duration', None) or duration_seconds
+    for segment in segments:
+        # Stops decoding between segments (the generator is lazy) once the request is cancelled
+        cancellation.check_current()
+        words = getattr(segment, 'words', None) if word_timestamps else None
+        if collected.append(segment.start, segment.end, segment.text, words) and on_segment:
+            progress = min(1.0, segment.end / total_duration) if total_duration else None
+            on_segment(segment_to_dict(segment, " ".join(segment.text.split()), word_timestamps), progress)
+
+    detected_language = info.language if hasattr(info, 'language') else language or 'unknown'
+
+    print(f"[ModelServer] Transcription complete: {collected.character_count} chars", file=sys.stderr)
+
+    return {
+        "success": True,
+        "transcript": collected.transcript,
+        "wordCount": collected.word_count,
+        "characterCount": collected.character_count,
+        "language": detected_language,
+        "profile": profile,
+    }, collected
+
+def stream_decoder(model_size, device, profile=None):
+    """Window decoder for a live stream (see streaming_transcription.Decode)
+    
+    A replica is acquired per window rather than per stream, so concurrent
+    streams take turns on the same loaded model between their windows.
+    """
+    def decode(pcm, language, prompt, final):
+        import numpy as np
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        seconds = len(audio) / SAMPLE_RATE
+        with _active_lock:
+            queue_depth = _active_transcriptions + _active_streams - 1
+        # Partials are superseded within a second or two, so they get the cheapest profile
+        window_profile = select_profile(seconds, queue_depth, device, profile) if final else "fast"
+        options = build_transcribe_options(window_profile, language)
+        # Windows are decoded separately; the previous windows' text is the context instead
+        options.update(condition_on_previous_text=False, initial_prompt=prompt or options["initial_prompt"])
+        with _whisper_replicas.acquire(device) as replica:
+            model = load_whisper_model(model_size, replica.device, None, replica)
+            with _memory.reserve(replica.torch_device, estimate_whisper_bytes(seconds, None)):
+                segments, info = model.transcribe(audio, **options)
+                segments = [(segment.start, segment.end, segment.text) for segment in segments]
+        return segments, getattr(info, 'language', None)
+    return decode
+
+def _generate_with_recovery(data, generator_name):
+    """Run a Qwen generator script function within the device's memory budget
+    
+    After running out of memory it is retried once without the prefix KV
+    cache and assisted decoding (the draft model and cached prefixes hold
+    memory); if that runs out of memory too, the result is a failure with
+    "outOfMemory": True rather than output for part of the transcript.
+    """
+    transcript = data.get('transcript')
+    device = data.get('device', 'cuda')
+
+    if not transcript:
+        return {"success": False, "error": "Transcript is required"}
+
+    import importlib
+    generator = getattr(importlib.import_module(generator_name), generator_name)
+    assisted = data.get('assisted')
+    # Templates never send more than this many transcript characters
+    chars = min(len(transcript), max(t.transcript_limit or len(transcript) for t in TEMPLATES.values()))
+
+    with _qwen_replicas.acquire(device) as replica:
         # Load model (will use cache if already loaded)
-        model = load_whisper_model(model_size, device, "float16")
+        model, tokenizer = load_qwen_model(replica.device, replica)
+        torch_device = replica.torch_device
         
-        # Use the cached model directly for transcription
-        import sys
+        attempts = [
+            # Reuse the replica's model and its prefilled prompt-prefix KV cache
+            ("full", estimate_qwen_bytes(chars, resolve_assisted_mode(assisted)),
+             lambda: generator(transcript, torch_device, assisted, model, tokenizer, kv_prefix_cache=True)),
+            ("no prefix cache, no assisted decoding", estimate_qwen_bytes(chars),
+             lambda: generator(transcript, torch_device, "off", model, tokenizer, kv_prefix_cache=False)),
+        ]
+        return _memory.run_with_recovery(torch_device, attempts, on_oom=clear_prefix_caches)
+
+def handle_generate_summary(data, on_segment=None):
+    """Handle summary generation request"""
+    return _generate_with_recovery(data, "generate_summary")
+
+def handle_generate_quiz(data, on_segment=None):
+    """Handle quiz generation request"""
+    return _generate_with_recovery(data, "generate_quiz")
+
+def handle_generate_flashcards(data, on_segment=None):
+    """Handle flashcards generation request"""
+    return _generate_with_recovery(data, "generate_flashcards")
+
+_summary_sessions = SummarySessions()
+
+def handle_summarize_segments(data, on_segment=None):
+    """Fold newly transcribed segments into a session's rolling summary
+    
+    Payload: session_id, segments ([{start, end, text}], only the new ones),
+    final (summarize the last partial chunk too), device, assisted. Returns
+    the session's current intro, summary and key points.
+    """
+    session_id = data.get('session_id')
+    if not session_id:
+        return {"success": False, "error": "Session ID is required"}
+    device = data.get('device', 'cuda')
+    assisted = data.get('assisted')
+    
+    def generate(task, language, text, max_new_tokens):
+        from qwen_generation import generate_from_template
+        from generate_summary import SECTION_SAMPLING
+        with _qwen_replicas.acquire(device) as replica:
+            model, tokenizer = load_qwen_model(replica.device, replica)
+            with _memory.reserve(replica.torch_device, estimate_qwen_bytes(len(text), resolve_assisted_mode(assisted))):
+                response, _ = generate_from_template(
+                    model, tokenizer, get_template(task, language), text, replica.torch_device, max_new_tokens,
+                    assisted=assisted, kv_prefix_cache=True,
+                    eos_token_id=tokenizer.eos_token_id, **SECTION_SAMPLING,
+                )
+        return response
+    
+    session = _summary_sessions.get(session_id, generate)
+    folded = session.add_segments(data.get('segments') or [], final=bool(data.get('final')))
+    result = dict(session.snapshot(), success=True, sessionId=session_id, chunksFolded=folded)
+    if data.get('final'):
+        _summary_sessions.close(session_id)
+    return result
+
+def handle_transcribe_youtube(data, on_segment=None):
+    """Download a YouTube video's audio and transcribe it (used by async jobs)"""
+    video_id = data.get('video_id')
+    if not video_id:
+        return {"success": False, "error": "Video ID is required"}
+    
+    from download_youtube_audio import download_audio
+    download = download_audio(video_id, data.get('start_time'), data.get('end_time'))
+    if not download.get("success"):
+        return download
+    
+    file_path = download["filePath"]
+    try:
+        return handle_transcribe(dict(data, file_path=file_path), on_segment)
+    finally:
         try:
-            import torch
-            torch_module = torch
-            cuda_available = torch.cuda.is_available() if torch.cuda.is_available() else False
-        except ImportError:
-            torch_module = None
-            cuda_available = (device == "cuda" or device == "gpu")
-        
-        # Transcribe using cached model with quality settings
-        is_gpu = (device == "cuda" or device == "gpu")
-        is_large_model = "large" in model_size.lower() or "medium" in model_size.lower()
-        
-        # Optimal quality/speed balance settings for Whisper
-        # beam_size=5 gives excellent quality with good speed (recommended by faster-whisper)
-        if is_gpu and is_large_model:
-            beam_size = 5
-            best_of = 5
-            patience = 1.0
-        elif is_gpu:
-            beam_size = 5
-            best_of = 5
-            patience = 1.0
+            os.unlink(file_path)
+        except OSError:
+            pass
+
+_transcript_store = None
+_transcript_store_lock = threading.Lock()
+
+def get_transcript_store():
+    global _transcript_store
+    with _transcript_store_lock:
+        if _transcript_store is None:
+            _transcript_store = TranscriptStore()
+        return _transcript_store
+
+def handle_transcribe_range(data, on_segment=None):
+    """Transcribe a time range of a YouTube video, reusing stored segments
+    
+    Only the parts of [start_time, end_time] not transcribed before (for this
+    video, model and language) are downloaded and decoded; the new segments
+    are shifted to video time and spliced into the transcript store.
+    
+    The store keeps no word timings, so word_timestamps requests transcribe
+    the whole range and return it like handle_transcribe (times relative to
+    start_time); its segments are still spliced into the store.
+    """
+    video_id = data.get('video_id')
+    if not video_id:
+        return {"success": False, "error": "Video ID is required"}
+    
+    model = model_key(data.get('model_size', 'large-v3'), data.get('language'))
+    start = float(data.get('start_time') or 0)
+    end = data.get('end_time')
+    duration = None
+    if end is None:
+        # Open-ended range: resolve to the video length (or "to the end" if unknown)
+        try:
+            from youtube_page import get_watch_page_data
+            end = duration = get_watch_page_data(video_id).get('durationSeconds')
+        except Exception as e:
+            print(f"[ModelServer] Could not resolve video duration: {e}", file=sys.stderr)
+    end = float(end) if end else float('inf')
+    
+    store = get_transcript_store()
+    word_timestamps = bool(data.get('word_timestamps'))
+    gaps = [(start, end)] if word_timestamps else store.uncovered(video_id, model, start, end)
+    print(f"[ModelServer] Range {start:.1f}s-{end:.1f}s of {video_id}: {len(gaps)} uncovered gap(s)", file=sys.stderr)
+    
+    from download_youtube_audio import download_audio
+    transcribed_seconds = 0.0
+    language = None
+    profile = None
+    for gap_start, gap_end in gaps:
+        cancellation.check_current()
+        open_end = gap_end == float('inf')
+        if gap_start <= 0 and (open_end or (duration and gap_end >= duration)):
+            # The whole video: an unranged download can use the prefetched audio
+            download = download_audio(video_id)
         else:
-            beam_size = 3
-            best_of = 3
-            patience = 1.0
-        
-        # Prepare ULTRA-ENHANCED initial prompt for maximum accuracy (especially for Arabic)
-        initial_prompt = None
-        if language == "ar":
-            initial_prompt = "هذه محاضرة أكاديمية تعليمية باللغة العربية الفصحى. المتحدث يتحدث بوضوح وبطء معتدل. النص دقيق ومفصل مع استخدام المصطلحات العلمية والأكاديمية الصحيحة. علامات الترقيم والفواصل واضحة."
-        elif language == "en":
-            initial_prompt = "This is an academic educational lecture in clear English. The speaker speaks clearly and at a moderate pace. The text is accurate and detailed with proper use of scientific and academic terminology. Punctuation and pauses are clear."
-        elif language and language != "None":
-            initial_prompt = f"This is an academic educational lecture in {language}. The speaker speaks clearly. The text is accurate and detailed with proper terminology."
-        
-        print(f"[ModelServer] Transcribing: {file_path} (beam_size={beam_size}, best_of={best_of}, patience={patience}, optimal quality/speed)", file=sys.stderr)
-        segments, info = model.transcribe(
-            file_path,
-            language=language,
-            beam_size=beam_size,
-            vad_filter=True,
-            vad_parameters=dict(
-                min_silence_duration_ms=300,  # Lower for better detection
-                threshold=0.3,  # Lower threshold for maximum detection
-                min_speech_duration_ms=250,  # Minimum speech duration
-            ),
-            condition_on_previous_text=True,  # Always use context for better accuracy
-            initial_prompt=initial_prompt,  # Ultra-enhanced prompt for maximum accuracy
-            word_timestamps=True,  # Enable for better word-level accuracy
-            temperature=0.0,  # Deterministic output (most accurate)
-            compression_ratio_threshold=2.2,  # Stricter filter for better quality
-            log_prob_threshold=-0.8,  # Higher threshold for better confidence
-            no_speech_threshold=0.4,  # Lower threshold for maximum speech detection
-            best_of=best_of,  # Maximum candidates for best quality
-            patience=patience,  # Higher patience for better results
-            suppress_blank=True,  # Suppress blank outputs
-            suppress_tokens=[-1],  # Suppress special tokens
-            without_timestamps=False,  # Keep timestamps for better alignment
+            download = download_audio(video_id, gap_start, None if open_end else gap_end)
+        if not download.get("success"):
+            return download
+        
+        def shifted(segment, progress, offset=gap_start):
+            if on_segment:
+                on_segment(dict(segment, start=segment["start"] + offset, end=segment["end"] + offset), None)
+        
+        try:
+            result, collected = transcribe_file(dict(data, file_path=download["filePath"]),
+                                                on_segment if word_timestamps else shifted)
+        finally:
+            try:
+                os.unlink(download["filePath"])
+            except OSError:
+                pass
+        if collected is None:
+            return result
+        
+        segments = collected.shifted(gap_start)
+        if open_end:
+            gap_end = segments[-1][1] if segments else gap_start
+        language = result.get("language")
+        profile = result.get("profile")
+        store.splice(video_id, model, gap_start, gap_end, segments, language)
+        transcribed_seconds += gap_end - gap_start
+        if word_timestamps:
+            result.update(collected.format_segments(data.get('segment_format')))
+            return dict(result, transcribedSeconds=transcribed_seconds, reusedSeconds=0.0)
+    
+    open_ended = end == float('inf')
+    selected = SegmentBuffer()
+    for seg_start, seg_end, text in store.index(video_id, model).slice(start, None if open_ended else end):
+        selected.append(seg_start, seg_end, text)
+    range_end = (selected.ends[-1] if len(selected) else start) if open_ended else end
+    
+    result = {
+        "success": True,
+        "transcript": selected.transcript,
+        "wordCount": selected.word_count,
+        "characterCount": selected.character_count,
+        "language": language or store.language(video_id, model) or data.get('language') or 'unknown',
+        "profile": profile,
+        "transcribedSeconds": transcribed_seconds,
+        "reusedSeconds": max(0.0, range_end - start - transcribed_seconds),
+    }
+    result.update(selected.format_segments(data.get('segment_format')))
+    return result
+
+# Pipeline artifacts and the generator script behind each
+LECTURE_GENERATORS = {
+    'summary': 'generate_summary',
+    'quiz': 'generate_quiz',
+    'flashcards': 'generate_flashcards',
+}
+
+def handle_process_lecture(data, on_segment=None, on_artifact=None):
+    """Transcribe a lecture and generate its summary, quiz and flashcards in one request
+    
+    Stages (see lecture_pipeline): captions (YouTube only, unless
+    source=whisper) -> transcribe -> preprocess -> the generators, in
+    parallel. Captions that pass the caption-first policy stand in for the
+    Whisper transcription, and a 'transcript' in the payload skips both.
+    Every generator gets the same preprocessed transcript and reuses the
+    replica's prefilled prompt prefixes. on_artifact(stage, outcome) is
+    called as each stage finishes (jobs store it, see GET /jobs/{id}/events).
+    
+    Payload: video_id (with start_time, end_time), file_path or transcript;
+    the transcribe and generate options; artifacts (default all generators).
+    """
+    video_id = data.get('video_id')
+    transcript = data.get('transcript')
+    if not (video_id or transcript or data.get('file_path') or data.get('audio') is not None):
+        return {"success": False, "error": "Video ID, file path or transcript is required"}
+    artifacts = data.get('artifacts') or list(LECTURE_GENERATORS)
+    unknown = [a for a in artifacts if a not in LECTURE_GENERATORS]
+    if unknown:
+        return {"success": False, "error": f"Unknown artifact(s): {', '.join(unknown)}"}
+    
+    def captions(results):
+        from get_transcript import fetch_transcript
+        fetched = fetch_transcript(video_id, data.get('start_time'), data.get('end_time'), data.get('language'))
+        # Missing or poor captions are not a failure: transcription falls back to Whisper
+        acceptable = bool(fetched.get('success') and fetched['quality']['acceptable'])
+        return dict(fetched, success=True, acceptable=acceptable)
+    
+    def transcribe(results):
+        if transcript:
+            return {"success": True, "transcript": transcript, "source": "client"}
+        fetched = results.get('captions')
+        if fetched and fetched['acceptable']:
+            return {"success": True, "transcript": fetched['transcript'], "language": fetched['language'],
+                    "wordCount": fetched['wordCount'], "source": "captions"}
+        options = dict(data, segment_format='none')
+        result = handle_transcribe_range(options, on_segment) if video_id else handle_transcribe(options, on_segment)
+        return dict(result, source="whisper")
+    
+    def preprocess(results):
+        transcribed = results['transcribe']
+        return preprocess_transcript(transcribed['transcript'], from_captions=transcribed['source'] == 'captions')
+    
+    def generator(name):
+        return lambda results: _generate_with_recovery(dict(data, transcript=results['preprocess']['transcript']), name)
+    
+    use_captions = bool(video_id) and not transcript and data.get('source') != 'whisper' and not data.get('word_timestamps')
+    stages = [Stage('captions', captions)] if use_captions else []
+    stages += [
+        Stage('transcribe', transcribe, ['captions'] if use_captions else []),
+        Stage('preprocess', preprocess, ['transcribe']),
+    ]
+    stages += [Stage(name, generator(LECTURE_GENERATORS[name]), ['preprocess']) for name in artifacts]
+    
+    started = time.perf_counter()
+    outcomes = run_stages(stages, on_artifact)
+    failed = [name for name, outcome in outcomes.items() if outcome['status'] != 'completed']
+    result = {
+        "success": not failed,
+        "stages": {name: {k: v for k, v in outcome.items() if k != 'result'} for name, outcome in outcomes.items()},
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    for name, outcome in outcomes.items():
+        if outcome['status'] == 'completed':
+            result[name] = outcome['result']
+    if failed:
+        result["error"] = f"Stage {failed[0]} {outcomes[failed[0]]['status']}: {outcomes[failed[0]].get('error')}"
+    return result
+
+ACTIONS = {
+    'transcribe': handle_transcribe,
+    'transcribe_youtube': handle_transcribe_youtube,
+    'transcribe_range': handle_transcribe_range,
+    'generate_summary': handle_generate_summary,
+    'generate_quiz': handle_generate_quiz,
+    'generate_flashcards': handle_generate_flashcards,
+    'summarize_segments': handle_summarize_segments,
+    'process_lecture': handle_process_lecture,
+}
+# Actions whose handlers also publish intermediate results: handler(data, on_segment, on_artifact)
+ARTIFACT_ACTIONS = {'process_lecture'}
+
+def run_action(data, on_segment=None, on_artifact=None):
+    action = data.get('action')
+    handler = ACTIONS.get(action)
+    if handler is None:
+        return {"success": False, "error": f"Unknown action: {action}"}
+    if action in ARTIFACT_ACTIONS:
+        return handler(data, on_segment, on_artifact)
+    return handler(data, on_segment)
+
+class JobManager:
+    """Runs submitted jobs on a bounded pool of worker threads
+    
+    State lives in the JobStore, so the HTTP request that submits a job returns
+    immediately and clients poll GET /jobs/{id} for status, progress and
+    partial segments. The JobScheduler decides which waiting job runs next.
+    
+    Jobs can be cancelled by job ID or by the client's request_id, and expire
+    deadline_seconds after submission; a running job stops at its next
+    segment or token and frees its worker.
+    """
+    
+    def __init__(self, store, workers=1):
+        self.store = store
+        self.scheduler = JobScheduler()
+        self._done_events = {}
+        self._events_lock = threading.Lock()
+        # Uploaded audio per job; kept in memory only, never in the job store
+        self._audio = {}
+        # Cancel tokens of unfinished jobs, and the job behind each client request ID
+        self._tokens = {}
+        self._request_jobs = {}
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def submit(self, action, payload, default_priority="normal"):
+        job_id = self.store.create(action, payload)
+        self._track(job_id, payload)
+        self._schedule(job_id, dict(payload, action=action), default_priority)
+        return job_id
+    
+    def run_sync(self, action, payload, audio=None):
+        """Run an action through the scheduler and wait for its result
+        
+        Synchronous requests share the same queue as jobs so they cannot jump
+        past the scheduler; they default to the interactive class. `audio`
+        (uploaded bytes) is handed to the handler as data['audio'].
+        
+        The job is marked sync_request, so after a restart it is failed
+        rather than resumed: no caller is waiting for its result any more.
+        """
+        event = threading.Event()
+        payload = dict(payload, sync_request=True)
+        if audio is not None:
+            payload = dict(payload, audio_upload=len(audio))
+        job_id = self.store.create(action, payload)
+        with self._events_lock:
+            self._done_events[job_id] = event
+            if audio is not None:
+                self._audio[job_id] = audio
+        self._track(job_id, payload)
+        self._schedule(job_id, dict(payload, action=action), "interactive")
+        event.wait()
+        
+        job = self.store.get(job_id, segments_since=sys.maxsize)
+        if job["status"] == "cancelled":
+            return {"success": False, "error": job["error"], "cancelled": True, "jobId": job_id}
+        if job["result"] is not None:
+            return job["result"]
+        return {"success": False, "error": job["error"] or "Job failed"}
+    
+    def _track(self, job_id, payload, created_at=None):
+        """Create the job's cancel token; its deadline counts from submission"""
+        deadline = payload.get('deadline_seconds')
+        if deadline is not None:
+            deadline = (created_at or time.time()) + float(deadline)
+        with self._events_lock:
+            self._tokens[job_id] = cancellation.CancelToken(deadline)
+            if payload.get('request_id'):
+                self._request_jobs[payload['request_id']] = job_id
+    
+    def cancel(self, job_id=None, request_id=None, reason="Cancelled by client"):
+        """Cancel a queued or running job
+        
+        A queued job is withdrawn at once; a running one stops at its next
+        cancellation check. Returns the job ID, or None if no unfinished job matched.
+        """
+        with self._events_lock:
+            if job_id is None:
+                job_id = self._request_jobs.get(request_id)
+            token = self._tokens.get(job_id)
+        if token is None:
+            return None
+        token.cancel(reason)
+        if self.scheduler.cancel(job_id):
+            self._finish_cancelled(job_id, reason)
+        print(f"[ModelServer] Job {job_id} cancelled: {reason}", file=sys.stderr)
+        return job_id
+    
+    def _finish_cancelled(self, job_id, reason):
+        self.store.cancel(job_id, reason)
+        with self._events_lock:
+            self._audio.pop(job_id, None)
+        self._release(job_id)
+    
+    def _release(self, job_id):
+        """Drop the job's cancel state and wake its run_sync caller"""
+        with self._events_lock:
+            self._tokens.pop(job_id, None)
+            for request_id in [r for r, j in self._request_jobs.items() if j == job_id]:
+                del self._request_jobs[request_id]
+            event = self._done_events.pop(job_id, None)
+        if event:
+            event.set()
+    
+    def _schedule(self, job_id, data, default_priority, enqueued_at=None):
+        self.scheduler.submit(
+            job_id,
+            estimate_cost(data),
+            priority=data.get('priority') or default_priority,
+            user_id=data.get('user_id'),
+            enqueued_at=enqueued_at,
         )
+    
+    def resume_unfinished(self):
+        """Re-queue jobs that were queued or running when the server last stopped
         
-        # Collect segments
-        full_text = ""
-        segments_list = []
-        for segment in segments:
-            segment_text = segment.text.strip()
-            if segment_text:
-                full_text += segment_text + " "
-                segments_list.append({
-                    "text": segment_text,
-                    "start": segment.start,
-                    "end": segment.end
-                })
-        
-        full_text = " ".join(full_text.split()).strip()
-        detected_language = info.language if hasattr(info, 'language') else language or 'unknown'
-        
-        print(f"[ModelServer] Transcription complete: {len(full_text)} chars", file=sys.stderr)
-        
-        return {
-            "success": True,
-            "transcript": full_text,
-            "wordCount": len(full_text.split()),
-            "characterCount": len(full_text),
-            "language": detected_language,
-            "segments": segments_list
-        }
+        Synchronous requests are failed instead: their callers' connections
+        died with the old process.
+        """
+        resumed = 0
+        for job_id in self.store.unfinished():
+            job = self.store.get(job_id, segments_since=sys.maxsize)
+            payload = self.store.load_payload(job_id)
+            if payload.get('sync_request'):
+                self.store.fail(job_id, "Server restarted before the request finished")
+                continue
+            self._track(job_id, payload, job["createdAt"])
+            self._schedule(job_id, payload, "normal", job["createdAt"])
+            resumed += 1
+        if resumed:
+            print(f"[ModelServer] Resumed {resumed} unfinished job(s)", file=sys.stderr)
+    
+    def _worker(self):
+        while True:
+            entry = self.scheduler.next()
+            job_id = entry["jobId"]
+            try:
+                print(f"[ModelServer] Job {job_id} waited {entry['waitSeconds']:.1f}s ({entry['priority']})", file=sys.stderr)
+                self._run(job_id)
+            finally:
+                self.scheduler.finished(job_id)
+                self._release(job_id)
     
-    def handle_generate_summary(self, data):
-        """Handle summary generation request"""
-        transcript = data.get('transcript')
-        device = data.get('device', 'cuda')
+    def _run(self, job_id):
+        data = self.store.load_payload(job_id)
+        with self._events_lock:
+            audio = self._audio.pop(job_id, None)
+            token = self._tokens.get(job_id)
+        if data is None:
+            return
+        if token is not None and token.is_cancelled():
+            # Deadline passed while it was queued
+            self.store.cancel(job_id, token.reason)
+            print(f"[ModelServer] Job {job_id} cancelled before starting: {token.reason}", file=sys.stderr)
+            return
+        if audio is not None:
+            data['audio'] = audio
         
-        if not transcript:
-            return {"success": False, "error": "Transcript is required"}
+        self.store.mark_running(job_id)
+        print(f"[ModelServer] Job {job_id} started ({data.get('action')})", file=sys.stderr)
+        segment_index = [0]
         
-        # Load model (will use cache if already loaded)
-        model, tokenizer = load_qwen_model(device)
+        def on_segment(segment, progress):
+            self.store.add_segment(job_id, segment_index[0], segment, progress)
+            segment_index[0] += 1
+        
+        def on_artifact(name, artifact):
+            self.store.add_artifact(job_id, name, artifact)
         
-        # Import generation logic from generate_summary.py
-        from generate_summary import generate_summary
-        return generate_summary(transcript, device)
+        try:
+            with cancellation.active(token):
+                result = run_action(data, on_segment, on_artifact)
+        except cancellation.Cancelled as e:
+            self.store.cancel(job_id, str(e))
+            print(f"[ModelServer] Job {job_id} stopped: {e}", file=sys.stderr)
+            return
+        except Exception as e:
+            import traceback
+            print(f"[ModelServer] Job {job_id} failed: {traceback.format_exc()}", file=sys.stderr)
+            self.store.fail(job_id, str(e))
+            return
+        
+        if result.get("success"):
+            self.store.complete(job_id, result)
+            print(f"[ModelServer] Job {job_id} completed", file=sys.stderr)
+        else:
+            self.store.fail(job_id, result.get("error") or "Job failed", result)
+            print(f"[ModelServer] Job {job_id} failed: {result.get('error')}", file=sys.stderr)
+
+_job_manager = None
+
+# Request body limits (413 above them): JSON actions and raw audio uploads
+MAX_JSON_BODY_BYTES = int(os.environ.get("MODEL_SERVER_MAX_JSON_BYTES", str(64 * 1024 * 1024)))
+MAX_AUDIO_BODY_BYTES = int(os.environ.get("MODEL_SERVER_MAX_AUDIO_BYTES", str(500 * 1024 * 1024)))
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT_SECONDS = float(os.environ.get("MODEL_SERVER_KEEPALIVE_TIMEOUT", "60"))
+# How often GET /jobs/{id}/events checks the job store for new segments and artifacts
+JOB_EVENTS_POLL_SECONDS = 0.25
+
+_serialization_stats = SerializationStats()
+
+class BodyTooLarge(Exception):
+    pass
+
+class ModelHandler(BaseHTTPRequestHandler):
+    # Persistent connections: every response carries a Content-Length
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT_SECONDS
     
-    def handle_generate_quiz(self, data):
-        """Handle quiz generation request"""
-        transcript = data.get('transcript')
-        device = data.get('device', 'cuda')
+    def send_json(self, status, payload):
+        body, encoding = encode_response(payload, self.headers.get('Accept-Encoding'), _serialization_stats)
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split('/') if p]
         
-        if not transcript:
-            return {"success": False, "error": "Transcript is required"}
+        if parts == ['scheduler', 'stats']:
+            stats = _job_manager.scheduler.stats() if _job_manager else {}
+            self.send_json(200, dict(stats, success=True))
+            return
         
-        # Load model (will use cache if already loaded)
-        model, tokenizer = load_qwen_model(device)
+        if parts == ['health']:
+            stats = _job_manager.scheduler.stats() if _job_manager else {}
+            self.send_json(200, {
+                "success": True,
+                "status": "ok" if _job_manager else "starting",
+                "models": loaded_models(),
+                "queued": sum(c["queued"] for c in stats.get("classes", {}).values()),
+                "running": sum(stats.get("runningPerUser", {}).values()),
+                "streams": _active_streams,
+            })
+            return
+        
+        if parts == ['stats', 'serialization']:
+            self.send_json(200, dict(_serialization_stats.snapshot(), success=True))
+            return
+        
+        if parts == ['memory']:
+            self.send_json(200, dict(_memory.stats(), success=True))
+            return
+        
+        if parts == ['tuning']:
+            profile = get_profile()
+            self.send_json(200, {"success": True, "host": profile.host, "settings": profile.settings})
+            return
+        
+        if parts == ['replicas']:
+            self.send_json(200, {
+                "success": True,
+                "whisper": _whisper_replicas.stats(),
+                "qwen": _qwen_replicas.stats(),
+            })
+            return
+        
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            self.stream_job_events(parts[1])
+            return
+        
+        if len(parts) == 2 and parts[0] == 'jobs':
+            query = parse_qs(parsed.query)
+            try:
+                since = int(query.get('since', ['0'])[0])
+            except ValueError:
+                since = 0
+            job = _job_manager.store.get(parts[1], since) if _job_manager else None
+            if job is None:
+                self.send_json(404, {"success": False, "error": f"Job not found: {parts[1]}"})
+            else:
+                self.send_json(200, dict(job, success=True))
+            return
+        
+        self.send_json(404, {"success": False, "error": f"Unknown path: {parsed.path}"})
+    
+    def do_DELETE(self):
+        parts = [p for p in urlparse(self.path).path.split('/') if p]
+        if len(parts) == 2 and parts[0] == 'jobs':
+            if _job_manager and _job_manager.cancel(job_id=parts[1]):
+                self.send_json(200, {"success": True, "jobId": parts[1], "status": "cancelled"})
+            else:
+                self.send_json(404, {"success": False, "error": f"No unfinished job: {parts[1]}"})
+            return
+        self.send_json(404, {"success": False, "error": f"Unknown path: {self.path}"})
+    
+    def read_body(self, limit):
+        """Request body, sent with Content-Length or chunked transfer encoding
         
-        # Import generation logic from generate_quiz.py
-        from generate_quiz import generate_quiz
-        return generate_quiz(transcript, device)
+        Raises:
+            BodyTooLarge if it exceeds `limit` bytes (the rest is not read)
+        """
+        if 'chunked' not in self.headers.get('Transfer-Encoding', '').lower():
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > limit:
+                raise BodyTooLarge(f"Request body of {length} bytes exceeds the {limit} byte limit")
+            return self.rfile.read(length)
+        return b''.join(self.iter_body(limit))
     
-    def handle_generate_flashcards(self, data):
-        """Handle flashcards generation request"""
-        transcript = data.get('transcript')
-        device = data.get('device', 'cuda')
+    def iter_body(self, limit):
+        """Request body in pieces as they arrive (for bodies that are produced while they are sent)
         
-        if not transcript:
-            return {"success": False, "error": "Transcript is required"}
+        Raises:
+            BodyTooLarge once more than `limit` bytes were received
+        """
+        if 'chunked' not in self.headers.get('Transfer-Encoding', '').lower():
+            remaining = int(self.headers.get('Content-Length') or 0)
+            if remaining > limit:
+                raise BodyTooLarge(f"Request body of {remaining} bytes exceeds the {limit} byte limit")
+            while remaining > 0:
+                piece = self.rfile.read1(min(remaining, 64 * 1024))
+                if not piece:
+                    return
+                remaining -= len(piece)
+                yield piece
+            return
+        received = 0
+        while True:
+            size = int(self.rfile.readline().split(b';', 1)[0].strip() or b'0', 16)
+            if size == 0:
+                # Skip trailers up to the blank line that ends the body
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            received += size
+            if received > limit:
+                raise BodyTooLarge(f"Request body exceeds the {limit} byte limit")
+            yield self.rfile.read(size)
+            self.rfile.readline()
+    
+    def write_event(self, event):
+        """Write one newline-delimited JSON event as a chunk of a chunked response"""
+        line = json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n'
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+    
+    def stream_job_events(self, job_id):
+        """GET /jobs/{id}/events: a job's progress as newline-delimited JSON, until it finishes
         
-        # Load model (will use cache if already loaded)
-        model, tokenizer = load_qwen_model(device)
+        Events: {"type": "segment", ...} per partial segment, {"type":
+        "artifact", "stage", ...outcome} per finished pipeline stage, and a
+        last {"type": "end", "status", "error", "result"}.
+        """
+        job = _job_manager.store.get(job_id) if _job_manager else None
+        if job is None:
+            self.send_json(404, {"success": False, "error": f"Job not found: {job_id}"})
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        
+        segments_sent = 0
+        artifacts_sent = set()
+        try:
+            while True:
+                job = _job_manager.store.get(job_id, segments_sent)
+                for segment in job["segments"]:
+                    self.write_event(dict(segment, type="segment"))
+                segments_sent += len(job["segments"])
+                for name, artifact in job["artifacts"].items():
+                    if name not in artifacts_sent:
+                        artifacts_sent.add(name)
+                        self.write_event(dict(artifact, type="artifact", stage=name))
+                if job["status"] in ("completed", "failed", "cancelled"):
+                    self.write_event({"type": "end", "status": job["status"], "error": job["error"], "result": job["result"]})
+                    break
+                time.sleep(JOB_EVENTS_POLL_SECONDS)
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped listening; the job itself keeps running
+            self.close_connection = True
+    
+    def handle_stream(self, query):
+        """POST /transcribe/stream?model_size=...: live transcription of 16 kHz 16-bit mono PCM
+        
+        The body is sent with chunked transfer encoding as the audio is
+        captured. Newline-delimited JSON events (see StreamingTranscriber)
+        are written back while it is still arriving, ending with an "end"
+        event that carries the stream's statistics.
+        """
+        global _active_streams
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        if int(params.get('sample_rate') or SAMPLE_RATE) != SAMPLE_RATE:
+            self.close_connection = True
+            self.send_json(400, {"success": False, "error": f"Audio must be {SAMPLE_RATE} Hz 16-bit mono PCM"})
+            return
+        device = params.get('device', 'cuda')
+        transcriber = StreamingTranscriber(
+            stream_decoder(params.get('model_size', 'large-v3'), device, params.get('profile')),
+            params.get('language') or None,
+        )
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        
+        with _active_lock:
+            _active_streams += 1
+        print(f"[ModelServer] Live stream started (device={device}, open streams: {_active_streams})", file=sys.stderr)
+        try:
+            for event in transcribe_stream(self.iter_body(MAX_AUDIO_BODY_BYTES), transcriber):
+                self.write_event(event)
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            print(f"[ModelServer] Live stream client disconnected", file=sys.stderr)
+        except Exception as e:
+            # Headers are already sent, so the error is reported as the last event
+            self.close_connection = True
+            print(f"[ModelServer] Live stream failed: {e}", file=sys.stderr)
+            try:
+                self.write_event({"type": "error", "error": str(e)})
+                self.wfile.write(b'0\r\n\r\n')
+            except OSError:
+                pass
+        finally:
+            with _active_lock:
+                _active_streams -= 1
+            print(f"[ModelServer] Live stream closed: {transcriber.summary()}", file=sys.stderr)
+    
+    def handle_audio_upload(self, query):
+        """POST /transcribe/audio?model_size=...: transcribe the raw audio request body
         
-        # Import generation logic from generate_flashcards.py
-        from generate_flashcards import generate_flashcards
-        return generate_flashcards(transcript, device)
+        Lets the web tier send uploads without a file on a shared disk; options
+        are the 'transcribe' payload fields, as query parameters.
+        """
+        audio = self.read_body(MAX_AUDIO_BODY_BYTES)
+        if not audio:
+            self.send_json(400, {"success": False, "error": "Audio body is required"})
+            return
+        payload = {k: v[0] for k, v in parse_qs(query).items()}
+        payload['word_timestamps'] = payload.get('word_timestamps', '').lower() in ('1', 'true')
+        # Lets the scheduler cost the job from the container header
+        payload['duration_seconds'] = get_audio_duration(io.BytesIO(audio))
+        self.send_json(200, _job_manager.run_sync('transcribe', payload, audio=audio))
+    
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        try:
+            if parsed.path.rstrip('/') == '/transcribe/audio':
+                self.handle_audio_upload(parsed.query)
+                return
+            if parsed.path.rstrip('/') == '/transcribe/stream':
+                self.handle_stream(parsed.query)
+                return
+            
+            post_data = self.read_body(MAX_JSON_BODY_BYTES)
+            data = json.loads(post_data.decode('utf-8'))
+            
+            if parsed.path.rstrip('/') == '/cancel':
+                # Cancel by the request_id a client sent with a synchronous request (or by job_id)
+                job_id = _job_manager.cancel(data.get('job_id'), data.get('request_id'),
+                                             data.get('reason') or "Cancelled by client")
+                if job_id:
+                    self.send_json(200, {"success": True, "jobId": job_id, "status": "cancelled"})
+                else:
+                    self.send_json(404, {"success": False, "error": "No unfinished job for that request"})
+                return
+            
+            if parsed.path.rstrip('/') == '/jobs':
+                action = data.get('action')
+                if action not in ACTIONS:
+                    self.send_json(400, {"success": False, "error": f"Unknown action: {action}"})
+                    return
+                payload = {k: v for k, v in data.items() if k != 'action'}
+                job_id = _job_manager.submit(action, payload)
+                self.send_json(202, {"success": True, "jobId": job_id, "status": "queued"})
+                return
+            
+            action = data.get('action')
+            if action not in ACTIONS:
+                self.send_json(200, {"success": False, "error": f"Unknown action: {action}"})
+                return
+            result = _job_manager.run_sync(action, {k: v for k, v in data.items() if k != 'action'})
+            self.send_json(200, result)
+            
+        except BodyTooLarge as e:
+            # The unread body is still on the socket, so this connection cannot be reused
+            self.close_connection = True
+            self.send_json(413, {"success": False, "error": str(e)})
+        except Exception as e:
+            import traceback
+            error_trace = traceback.format_exc()
+            print(f"[ModelServer] Error: {str(e)}", file=sys.stderr)
+            print(f"[ModelServer] Traceback: {error_trace}", file=sys.stderr)
+            
+            self.send_json(500, {
+                "success": False,
+                "error": str(e),
+                "details": error_trace
+            })
     
     def log_message(self, format, *args):
         # Suppress default logging
         pass
 
+def calibrate_models():
+    """Time candidate compute types / thread counts for the configured devices (see autotune)
+    
+    Only settings missing from this host's profile are calibrated
+    (MODEL_SERVER_AUTOTUNE=always recalibrates, =off skips).
+    """
+    profile = get_profile()
+    try:
+        if cuda_device_count() > 0 and profile.needs_tuning(whisper_key("cuda")):
+            calibrate_whisper("cuda")
+        
+        # Configured CPU replicas only (before candidates() adds the default one)
+        cpu_cores = {whisper_key("cpu", r.cores): r.cores for r in _whisper_replicas.replicas if r.device == "cpu"}
+        if not cuda_device_count():
+            cpu_cores.setdefault(whisper_key("cpu"), None)
+        for key, cores in cpu_cores.items():
+            if profile.needs_tuning(key):
+                calibrate_whisper("cpu", cores=cores)
+        
+        qwen_cpu = [r for r in _qwen_replicas.replicas if r.device == "cpu"]
+        if qwen_cpu:
+            cores = len(qwen_cpu[0].cores) if qwen_cpu[0].cores else None
+            if profile.needs_tuning(qwen_key(cores)):
+                model, tokenizer = load_qwen_model("cpu", qwen_cpu[0])
+                calibrate_qwen_cpu(model, tokenizer, cores)
+    except Exception as e:
+        print(f"[ModelServer] ⚠ Autotuning failed, using default settings: {e}", file=sys.stderr)
+
 def preload_models():
     """Preload all models at startup for better performance"""
     print("[ModelServer] ========================================", file=sys.stderr)
@@ -272,14 +1134,16 @@ def preload_models():
     print("[ModelServer] ========================================", file=sys.stderr)
     
     try:
-        # Preload Whisper large-v3 on GPU (most commonly used)
-        print("[ModelServer] [1/2] Preloading Whisper large-v3 on GPU...", file=sys.stderr)
-        load_whisper_model("large-v3", "cuda", "float16")
+        # Preload Whisper large-v3 on every GPU replica (most commonly used)
+        for replica in _whisper_replicas.candidates("cuda"):
+            print(f"[ModelServer] [1/2] Preloading Whisper large-v3 on {replica.name}...", file=sys.stderr)
+            load_whisper_model("large-v3", "cuda", None, replica)
         print("[ModelServer] ✓ Whisper large-v3 loaded successfully", file=sys.stderr)
         
-        # Preload Qwen model on GPU
-        print("[ModelServer] [2/2] Preloading Qwen 3B-Instruct on GPU...", file=sys.stderr)
-        load_qwen_model("cuda")
+        # Preload Qwen model on every GPU replica
+        for replica in _qwen_replicas.candidates("cuda"):
+            print(f"[ModelServer] [2/2] Preloading Qwen 3B-Instruct on {replica.name}...", file=sys.stderr)
+            load_qwen_model("cuda", replica)
         print("[ModelServer] ✓ Qwen 3B-Instruct loaded successfully", file=sys.stderr)
         
         print("[ModelServer] ========================================", file=sys.stderr)
@@ -295,10 +1159,24 @@ def preload_models():
 def main():
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
     
-    # Preload models before starting server
+    # Calibrate settings this host has no tuning profile for, then preload with them
+    calibrate_models()
     preload_models()
     
-    server = HTTPServer(('localhost', port), ModelHandler)
+    # Jobs from a previous run are picked up again before new ones arrive
+    global _job_manager
+    store = JobStore(default_db_path(port))
+    purged = store.purge_finished()
+    if purged:
+        print(f"[ModelServer] Purged {purged} old finished job(s)", file=sys.stderr)
+    # Enough job workers to keep every replica busy
+    default_workers = max(2, len(_whisper_replicas.replicas) + len(_qwen_replicas.replicas))
+    _job_manager = JobManager(store, workers=max(1, int(os.environ.get("MODEL_SERVER_JOB_WORKERS", str(default_workers)))))
+    _job_manager.resume_unfinished()
+    
+    # Threaded so job status polls are answered while long requests run
+    # MODEL_SERVER_HOST=0.0.0.0 lets a web tier on another machine use this node
+    server = ThreadingHTTPServer((os.environ.get("MODEL_SERVER_HOST", "localhost"), port), ModelHandler)
     print(f"[ModelServer] Starting model server on port {port}", file=sys.stderr)
     
     try:
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Prompt templates for the Qwen generators
+Every task/language prompt is registered once as static text around a single
+{transcript} placeholder, so the part before the transcript can be tokenized
+once (and, on the model server, prefilled once) and only the transcript and
+the short suffix are processed per request
+"""
+from typing import Dict, Optional, Tuple
+
+TRANSCRIPT_PLACEHOLDER = "{transcript}"
+
+class PromptTemplate:
+    """A prompt split into a static prefix, the transcript and a static suffix"""
+
+    __slots__ = ("task", "language", "prefix", "suffix", "transcript_limit")
+
+    def __init__(self, task: str, language: str, text: str, transcript_limit: Optional[int] = None):
+        prefix, placeholder, suffix = text.partition(TRANSCRIPT_PLACEHOLDER)
+        if not placeholder or TRANSCRIPT_PLACEHOLDER in suffix:
+            raise ValueError(f"Template {task}/{language} must contain {TRANSCRIPT_PLACEHOLDER} exactly once")
+        self.task = task
+        self.language = language
+        self.prefix = prefix
+        self.suffix = suffix
+        self.transcript_limit = transcript_limit
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.task, self.language)
+
+    def transcript_part(self, transcript: str) -> str:
+        """The transcript as it appears in the prompt (truncated to transcript_limit characters)"""
+        return transcript[:self.transcript_limit] if self.transcript_limit else transcript
+
+    def render(self, transcript: str) -> str:
+        return self.prefix + self.transcript_part(transcript) + self.suffix
+
+TEMPLATES: Dict[Tuple[str, str], PromptTemplate] = {}
+
+def register(task: str, language: str, text: str, transcript_limit: Optional[int] = None) -> PromptTemplate:
+    template = PromptTemplate(task, language, text, transcript_limit)
+    TEMPLATES[template.key] = template
+    return template
+
+def get_template(task: str, language: str) -> PromptTemplate:
+    try:
+        return TEMPLATES[(task, language)]
+    except KeyError:
+        raise ValueError(f"No prompt template for task '{task}' and language '{language}'")
+
+def detect_language(transcript: str) -> str:
+    """'ar' if the transcript contains Arabic script, else 'en'"""
+    return "ar" if any('\u0600' <= char <= '\u06FF' for char in transcript) else "en"
+
+# Summary: introduction section
+
+register("summary_intro", "ar", """أنت خبير في المحاضرات التعليمية. اكتب فقط قسم المقدمة لهذه المحاضرة.
+
+المتطلبات:
+- اللغة: العربية. لا تغير اللغة.
+- الطول: 2-4 جمل كحد أقصى.
+- الأسلوب: واضح وملموس وجذاب، كما لو كنت تتحدث إلى طالب متحمس.
+- المحتوى: أجب باختصار: ما الموضوع الرئيسي؟ لماذا هو مهم؟ ما السؤال أو الالتباس الذي ستحل هذه المحاضرة؟
+- النبرة: واثق لكن بسيط، تجنب الكلمات الرنانة.
+- مهم: لا تضع أي عناوين مثل "المقدمة" في إجابتك، فقط نص المقدمة نفسه.
+
+نص المحاضرة:
+{transcript}
+
+المقدمة:""", transcript_limit=12000)
+
+register("summary_intro", "en", """You are an expert academic lecturer. Write ONLY the introduction section for this lecture transcript.
+
+Requirements:
+- Language: English. Do NOT switch languages.
+- Length: 2-4 sentences maximum.
+- Style: Clear, concrete, and engaging, as if you are talking to a motivated student.
+- Content: Briefly answer: What is the main topic? Why is it important? What key question or confusion will this lecture resolve?
+- Tone: Confident but simple, avoid buzzwords.
+- IMPORTANT: Do NOT include any headings like "Introduction" in your answer, just the introduction text itself.
+
+Lecture Transcript:
+{transcript}
+
+Introduction:""", transcript_limit=12000)
+
+# Summary: main summary section
+
+register("summary_main", "ar", """أنت خبير في تلخيص المحاضرات الأكاديمية. اكتب فقط قسم الملخص الرئيسي لهذه المحاضرة.
+
+المتطلبات:
+- اللغة: العربية. لا تغير اللغة.
+- الطول: 2-3 فقرات قوية ومنظمة جيداً.
+- الأسلوب: مجرد، أعد الصياغة بكلماتك الخاصة (لا تنسخ الجمل كما هي). استخدم انتقالات سلسة وتفسيرات واضحة.
+- المحتوى: التقط القصة الكاملة للمحاضرة بالترتيب. اشرح بوضوح:
+  * ما الذي يتم مقارنته أو شرحه؟
+  * ما هي المفاهيم والتعريفات الرئيسية؟
+  * كيف توضح الأمثلة والاستعارات الفرق؟
+  * ما الآثار العملية أو حالات الاستخدام التي تسلط عليها المحاضرة الضوء؟
+- الهدف: القارئ الذي يرى هذا الملخص فقط يجب أن يفهم المحاضرة بالكامل ولا يشعر أنه يفتقد أفكاراً مهمة.
+- مهم: لا تضع أي عناوين مثل "الملخص" في إجابتك، فقط فقرات الملخص.
+
+نص المحاضرة:
+{transcript}
+
+الملخص:""")
+
+register("summary_main", "en", """You are an expert academic summarizer. Write ONLY the main summary section for this lecture transcript.
+
+Requirements:
+- Language: English. Do NOT switch languages.
+- Length: 2-3 strong, well-structured paragraphs.
+- Style: Abstract, rewrite in your own words (do NOT copy raw sentences). Use smooth transitions and clear explanations.
+- Content: Capture the full story of the lecture in order. Explicitly explain:
+  * What is being compared or explained?
+  * What are the key concepts and definitions?
+  * How do the examples and analogies clarify the difference?
+  * What practical implications or use-cases does the lecture highlight?
+- Goal: A reader who only sees this summary should fully understand the lecture and not feel they are missing important ideas.
+- IMPORTANT: Do NOT include any headings like "Summary" in your answer, just the summary paragraphs.
+
+Lecture Transcript:
+{transcript}
+
+Summary:""")
+
+# Summary: key points section
+
+register("summary_points", "ar", """أنت خبير في تدوين الملاحظات. استخرج فقط النقاط الرئيسية من نص هذه المحاضرة.
+
+المتطلبات:
+- اللغة: العربية. لا تغير اللغة.
+- تنسيق الإخراج: قائمة نصية عادية حيث كل سطر هو نقطة واحدة تبدأ بـ "- ".
+- اجعل النقاط غنية ومفيدة، وليست تسميات من كلمة واحدة.
+- حاول تجميع الأفكار ذات الصلة ببدء بعض النقاط بتسميات بخط عريض، على سبيل المثال:
+  - **تشبيه أساسي:** ...
+  - **ما هو الـ LLM؟:** ...
+  - **قصور الـ LLM:** ...
+  - **ما هو الـ AI Agent؟:** ...
+  - **مثال عملي:** ...
+- ركز على: أهم الأفكار، المقارنات، التعريفات، الأمثلة الملموسة، الاستعارات، والآثار العملية.
+- الطول: 8-16 نقطة كحد أقصى.
+- مهم: لا تضيف أي عناوين خارج القائمة، لا مقدمات أو خواتم، فقط القائمة نفسها.
+
+نص المحاضرة:
+{transcript}
+
+النقاط الرئيسية:""")
+
+register("summary_points", "en", """You are an expert note-taker. Extract ONLY the key points from this lecture transcript.
+
+Requirements:
+- Language: English. Do NOT switch languages.
+- Output format: a plain text list where EACH line is ONE bullet point starting with "- ".
+- Make the bullets rich and informative, not one-word labels.
+- Try to group related ideas by starting some bullets with bold-style labels, for example:
+  - **Key Analogy:** ...
+  - **What is LLM?:** ...
+  - **LLM Limitations:** ...
+  - **What is AI Agent?:** ...
+  - **Practical Example:** ...
+- Focus on: the most important ideas, comparisons, definitions, concrete examples, analogies, and practical implications.
+- Length: 8-16 bullet points maximum.
+- IMPORTANT: Do NOT add any headings outside the list, no intros or outros, just the bullet list itself.
+
+Lecture Transcript:
+{transcript}
+
+Key Points:""")
+
+# Quiz (JSON output)
+
+register("quiz", "ar", """أنت خبير في إنشاء الاختبارات التعليمية. قم بإنشاء 5-10 أسئلة اختيار من متعدد عالية الجودة بناءً على نص المحاضرة التالي.
+
+المتطلبات الحرجة:
+- النص بالعربية. يجب أن تكتب جميع الأسئلة والخيارات والإجابات بالعربية. لا تترجم أبداً.
+- أنشئ 5-10 أسئلة تختبر فهم المفاهيم الرئيسية والحقائق المهمة والأفكار الأساسية من النص.
+- كل سؤال يجب أن يحتوي على 4 خيارات بالضبط (أ، ب، ج، د).
+- حدد الإجابة الصحيحة بوضوح في correctIndex (0-3).
+- يجب أن تكون الأسئلة واضحة ومحددة وتختبر الفهم الفعلي والتحليل (وليس فقط الحفظ).
+- الأسئلة يجب أن تغطي مختلف أجزاء المحاضرة بشكل متوازن.
+- استخدم لغة واضحة ومهنية مناسبة للطلاب.
+- أعد فقط JSON صالح بهذا الشكل بالضبط (بدون markdown، بدون كتل كود، بدون نص إضافي، بدون شرح):
+
+{
+  "questions": [
+    {
+      "id": 1,
+      "text": "نص السؤال الواضح والمحدد هنا؟",
+      "options": ["الخيار أ (صحيح)", "الخيار ب", "الخيار ج", "الخيار د"],
+      "correctIndex": 0,
+      "type": "multiple-choice"
+    }
+  ]
+}
+
+نص المحاضرة:
+{transcript}
+
+JSON:""", transcript_limit=20000)
+
+register("quiz", "en", """You are an expert educational quiz generator. Create 5-10 high-quality multiple-choice quiz questions based on the following lecture transcript.
+
+CRITICAL REQUIREMENTS:
+- The transcript is in English. You MUST write ALL questions, options, and answers in English. Do NOT translate.
+- Generate 5-10 questions that test understanding of key concepts, important facts, and main ideas from the transcript.
+- Each question must have exactly 4 options (A, B, C, D).
+- Mark the correct answer clearly in correctIndex (0-3).
+- Questions should be clear, specific, and test actual understanding and analysis (not just memorization).
+- Questions should cover different parts of the lecture in a balanced way.
+- Use clear, professional language appropriate for students.
+- Return ONLY valid JSON in this exact format (no markdown, no code blocks, no extra text, no explanation):
+
+{
+  "questions": [
+    {
+      "id": 1,
+      "text": "Clear and specific question text here?",
+      "options": ["Option A (correct)", "Option B", "Option C", "Option D"],
+      "correctIndex": 0,
+      "type": "multiple-choice"
+    }
+  ]
+}
+
+Transcript:
+{transcript}
+
+JSON:""", transcript_limit=20000)
+
+# Flashcards (JSON output)
+
+register("flashcards", "ar", """أنت خبير في إنشاء البطاقات التعليمية. قم بإنشاء 8-15 بطاقة تعليمية عالية الجودة بناءً على نص المحاضرة التالي.
+
+المتطلبات الحرجة:
+- النص بالعربية. يجب أن تكتب جميع المصطلحات والتعريفات بالعربية. لا تترجم أبداً.
+- أنشئ 8-15 بطاقة تعليمية تغطي أهم المصطلحات والمفاهيم والأفكار الرئيسية من النص.
+- كل بطاقة يجب أن تحتوي على:
+  * مصطلح أو مفهوم واضح ومحدد (Term) - يجب أن يكون قصيراً وواضحاً
+  * تعريف أو شرح مفصل ومفيد (Definition) - يجب أن يكون شاملاً وواضحاً
+- ركز على:
+  * المصطلحات التقنية والمفاهيم الأساسية
+  * التعريفات المهمة والأفكار الرئيسية
+  * المفاهيم التي تحتاج إلى حفظ أو فهم عميق
+- التعريفات يجب أن تكون:
+  * واضحة ومفهومة للطلاب
+  * شاملة وتغطي الجوانب المهمة
+  * مفيدة للمراجعة والدراسة
+- استخدم لغة مهنية وواضحة.
+- أعد فقط JSON صالح بهذا الشكل بالضبط (بدون markdown، بدون كتل كود، بدون نص إضافي):
+
+{
+  "flashcards": [
+    {
+      "id": 1,
+      "term": "المصطلح أو المفهوم الواضح",
+      "definition": "التعريف أو الشرح المفصل والشامل الذي يساعد الطلاب على الفهم"
+    }
+  ]
+}
+
+نص المحاضرة:
+{transcript}
+
+JSON:""", transcript_limit=20000)
+
+register("flashcards", "en", """You are an expert flashcard creator. Create 8-15 high-quality flashcards based on the following lecture transcript.
+
+CRITICAL REQUIREMENTS:
+- The transcript is in English. You MUST write ALL terms and definitions in English. Do NOT translate.
+- Generate 8-15 flashcards covering the most important terms, concepts, and key ideas from the transcript.
+- Each flashcard must contain:
+  * A clear and specific term or concept (Term) - should be short and clear
+  * A detailed and useful definition or explanation (Definition) - should be comprehensive and clear
+- Focus on:
+  * Technical terms and fundamental concepts
+  * Important definitions and key ideas
+  * Concepts that need memorization or deep understanding
+- Definitions should be:
+  * Clear and understandable for students
+  * Comprehensive and cover important aspects
+  * Useful for review and study
+- Use clear, professional language.
+- Return ONLY valid JSON in this exact format (no markdown, no code blocks, no extra text):
+
+{
+  "flashcards": [
+    {
+      "id": 1,
+      "term": "Clear Term or Concept",
+      "definition": "Detailed and comprehensive definition or explanation that helps students understand"
+    }
+  ]
+}
+
+Transcript:
+{transcript}
+
+JSON:""", transcript_limit=20000)
+
+# Incremental summary (incremental_summary.py): per-chunk notes, then merges
+# into the running sections. Chunk inputs are about a minute of speech and merge
+# inputs are bounded summaries, so each update costs the same however long the
+# lecture has run.
+
+register("summary_chunk", "ar", """أنت خبير في تلخيص المحاضرات. هذا جزء قصير من محاضرة مباشرة. لخّص ما قيل في هذا الجزء فقط.
+
+المتطلبات:
+- اللغة: العربية. لا تغير اللغة.
+- الطول: 2-4 جمل.
+- أعد الصياغة بكلماتك الخاصة، ولا تضف أي عناوين.
+
+جزء المحاضرة:
+{transcript}
+
+الملخص:""", transcript_limit=6000)
+
+register("summary_chunk", "en", """You are an expert lecture summarizer. This is a short part of a live lecture. Summarize ONLY what is said in this part.
+
+Requirements:
+- Language: English. Do NOT switch languages.
+- Length: 2-4 sentences.
+- Rewrite in your own words and do NOT add any headings.
+
+Lecture Part:
+{transcript}
+
+Summary:""", transcript_limit=6000)
+
+register("summary_chunk_points", "ar", """أنت خبير في تدوين الملاحظات. استخرج النقاط الرئيسية من هذا الجزء القصير من محاضرة مباشرة.
+
+المتطلبات:
+- اللغة: العربية. لا تغير اللغة.
+- تنسيق الإخراج: كل سطر نقطة واحدة تبدأ بـ "- ".
+- الطول: 1-4 نقاط، فقط الأفكار أو التعريفات أو الأمثلة المهمة فعلاً.
+- لا تضف أي عناوين أو مقدمات.
+
+جزء المحاضرة:
+{transcript}
+
+النقاط الرئيسية:""", transcript_limit=6000)
+
+register("summary_chunk_points", "en", """You are an expert note-taker. Extract the key points from this short part of a live lecture.
+
+Requirements:
+- Language: English. Do NOT switch languages.
+- Output format: EACH line is ONE bullet point starting with "- ".
+- Length: 1-4 bullets, only ideas, definitions or examples that really matter.
+- Do NOT add any headings or intros.
+
+Lecture Part:
+{transcript}
+
+Key Points:""", transcript_limit=6000)
+
+register("summary_merge", "ar", """أنت خبير في تلخيص المحاضرات. لديك ملخص ما قيل حتى الآن في محاضرة مباشرة، وملخص الجزء الجديد منها. اكتب الملخص المحدّث للمحاضرة كلها.
+
+المتطلبات:
+- اللغة: العربية. لا تغير اللغة.
+- الطول: 2-3 فقرات كحد أقصى.
+- حافظ على تسلسل المحاضرة وأدمج الجزء الجديد في مكانه، واختصر التفاصيل القديمة الأقل أهمية عند الحاجة.
+- لا تضف أي عناوين مثل "الملخص".
+
+{transcript}
+
+الملخص المحدّث:""")
+
+register("summary_merge", "en", """You are an expert lecture summarizer. You have the summary of a live lecture so far and the summary of its newest part. Write the updated summary of the whole lecture.
+
+Requirements:
+- Language: English. Do NOT switch languages.
+- Length: 2-3 paragraphs maximum.
+- Keep the order of the lecture, fold the new part in where it belongs, and condense older, less important details if needed.
+- Do NOT include any headings like "Summary".
+
+{transcript}
+
+Updated Summary:""")
+
+register("summary_points_merge", "ar", """أنت خبير في تدوين الملاحظات. هذه النقاط الرئيسية المجمّعة من محاضرة مباشرة وفيها تكرار. ادمجها في قائمة واحدة.
+
+المتطلبات:
+- اللغة: العربية. لا تغير اللغة.
+- تنسيق الإخراج: كل سطر نقطة واحدة تبدأ بـ "- ".
+- ادمج النقاط المتكررة أو المتشابهة، واحتفظ بالترتيب، و8-16 نقطة كحد أقصى.
+- لا تضف أي عناوين أو مقدمات.
+
+النقاط:
+{transcript}
+
+النقاط الرئيسية:""")
+
+register("summary_points_merge", "en", """You are an expert note-taker. These key points were collected from a live lecture and overlap. Merge them into one list.
+
+Requirements:
+- Language: English. Do NOT switch languages.
+- Output format: EACH line is ONE bullet point starting with "- ".
+- Merge repeated or similar points, keep the lecture order, 8-16 bullet points maximum.
+- Do NOT add any headings or intros.
+
+Points:
+{transcript}
+
+Key Points:""")
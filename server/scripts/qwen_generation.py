@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Shared Qwen generation helper
+Runs the chat-template + generate + decode sequence used by the summary,
+quiz and flashcard scripts, with optional assisted (speculative) decoding,
+cached tokenization/prefill of static prompt prefixes, and per-call decode
+statistics
+
+torch and transformers are imported inside the functions (here and in the
+generator scripts), so argument validation and other cheap failures do not
+pay seconds of import time
+"""
+import os
+import sys
+import time
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import cancellation
+
+# Assisted decoding modes:
+#   off           - plain sampling (default)
+#   prompt_lookup - draft tokens by n-gram lookup in the prompt; outputs copy a
+#                   lot of transcript phrasing, so candidates are often accepted
+#   draft         - draft tokens from a small Qwen model sharing the tokenizer
+ASSISTED_MODES = ("off", "prompt_lookup", "draft")
+ASSISTED_DECODING = os.environ.get("QWEN_ASSISTED_DECODING", "off")
+PROMPT_LOOKUP_NUM_TOKENS = int(os.environ.get("QWEN_PROMPT_LOOKUP_TOKENS", "10"))
+
+def resolve_assisted_mode(requested: Optional[str] = None) -> str:
+    """Requested mode, else QWEN_ASSISTED_DECODING; unknown values mean off"""
+    mode = (requested or ASSISTED_DECODING or "off").lower()
+    if mode not in ASSISTED_MODES:
+        print(f"[Qwen] Unknown assisted decoding mode '{mode}', using off", file=sys.stderr)
+        return "off"
+    return mode
+
+class _ForwardCounter:
+    """Counts a module's forward calls made from the current thread"""
+
+    def __init__(self, module):
+        self.count = 0
+        self._thread = threading.get_ident()
+        self._handle = module.register_forward_pre_hook(self._hook) if module is not None else None
+
+    def _hook(self, module, args):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+    def remove(self):
+        if self._handle is not None:
+            self._handle.remove()
+
+class IncrementalNoRepeatNGram:
+    """Logits processor with the same bans as no_repeat_ngram_size=n
+
+    The stock processor rebuilds the n-gram table from the whole sequence
+    (prompt included) on every step, so its per-token cost grows with the
+    sequence. This one keeps, per batch row, a table of (n-1)-gram prefix ->
+    next-token counts and only adds the n-grams ending at newly appended
+    tokens. Assisted decoding appends several candidate tokens at once and
+    later replaces rejected ones, so the last ROLLBACK_WINDOW tokens are
+    compared on each call and n-grams past the first difference are removed;
+    earlier tokens are never rewritten by sampling or assisted decoding.
+    """
+
+    ROLLBACK_WINDOW = 64
+
+    def __init__(self, ngram_size: int):
+        self.ngram_size = ngram_size
+        self._rows = []
+
+    def __call__(self, input_ids, scores):
+        for row in range(input_ids.shape[0]):
+            if row == len(self._rows):
+                self._rows.append(([], {}))
+            banned = self._update(input_ids[row], *self._rows[row])
+            if banned:
+                scores[row, banned] = float("-inf")
+        return scores
+
+    def _update(self, ids, tokens, table):
+        n = self.ngram_size
+        length = ids.shape[0]
+        overlap = min(len(tokens), length)
+
+        # First position where the stored tokens and the new sequence differ
+        lo = max(0, overlap - self.ROLLBACK_WINDOW)
+        diverge = overlap
+        for offset, token in enumerate(ids[lo:overlap].tolist()):
+            if token != tokens[lo + offset]:
+                diverge = lo + offset
+                break
+
+        # Drop n-grams ending at rolled-back positions
+        for end in range(len(tokens) - 1, max(diverge, n - 1) - 1, -1):
+            prefix = tuple(tokens[end - n + 1:end])
+            counts = table[prefix]
+            counts[tokens[end]] -= 1
+            if not counts[tokens[end]]:
+                del counts[tokens[end]]
+        del tokens[diverge:]
+
+        # Add n-grams ending at new positions
+        for token in ids[diverge:length].tolist():
+            tokens.append(token)
+            if len(tokens) >= n:
+                counts = table.setdefault(tuple(tokens[-n:-1]), {})
+                counts[token] = counts.get(token, 0) + 1
+
+        if len(tokens) + 1 < n:
+            return None
+        counts = table.get(tuple(tokens[len(tokens) - n + 1:]))
+        return list(counts) if counts else None
+
+# Chat-template text before/after the user message, per tokenizer
+_chat_wrappers: Dict[int, Tuple[str, str]] = {}
+# Token IDs of chat header + template prefix, per (tokenizer, task, language)
+_prefix_ids: Dict[tuple, List[int]] = {}
+# Prefilled KV cache of those prefixes, per (model, task, language)
+_prefix_kv: Dict[tuple, Any] = {}
+_prefix_lock = threading.Lock()
+
+_MESSAGE_MARKER = "\x00MESSAGE\x00"
+
+def _chat_wrapper(tokenizer) -> Tuple[str, str]:
+    key = id(tokenizer)
+    with _prefix_lock:
+        wrapper = _chat_wrappers.get(key)
+    if wrapper is None:
+        text = tokenizer.apply_chat_template(
+            [{"role": "user", "content": _MESSAGE_MARKER}],
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        before, _, after = text.partition(_MESSAGE_MARKER)
+        wrapper = (before, after)
+        with _prefix_lock:
+            _chat_wrappers[key] = wrapper
+    return wrapper
+
+def template_input_ids(tokenizer, template, transcript: str) -> Tuple[List[int], int]:
+    """Token IDs of the chat-formatted template for a transcript
+
+    The chat header plus the template's static prefix is tokenized once per
+    tokenizer and template; per call only the transcript, the template suffix
+    and the chat footer are tokenized.
+
+    Returns:
+        (input IDs, number of leading IDs that are the static prefix)
+    """
+    before, after = _chat_wrapper(tokenizer)
+    key = (id(tokenizer),) + template.key
+    with _prefix_lock:
+        prefix = _prefix_ids.get(key)
+    if prefix is None:
+        prefix = tokenizer(before + template.prefix, add_special_tokens=False).input_ids
+        with _prefix_lock:
+            _prefix_ids[key] = prefix
+    tail = tokenizer(template.transcript_part(transcript) + template.suffix + after, add_special_tokens=False).input_ids
+    return prefix + tail, len(prefix)
+
+def _prefix_kv_cache(model, template, prefix_ids: List[int], device: str):
+    """A private copy of the prefilled KV cache for a template prefix (prefilled on first use)"""
+    import copy
+    import torch
+    from transformers import DynamicCache
+
+    key = (id(model),) + template.key
+    with _prefix_lock:
+        cached = _prefix_kv.get(key)
+    if cached is None:
+        started = time.perf_counter()
+        cached = DynamicCache()
+        with torch.no_grad():
+            model(torch.tensor([prefix_ids], device=device), past_key_values=cached, use_cache=True)
+        with _prefix_lock:
+            _prefix_kv[key] = cached
+        print(f"[Qwen] Prefilled {template.task}/{template.language} prefix ({len(prefix_ids)} tokens) in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    # generate() extends the cache in place, so every request gets its own copy
+    return copy.deepcopy(cached)
+
+def clear_prefix_caches():
+    """Drop the prefilled prefix KV caches (they hold device memory); they are rebuilt on demand"""
+    with _prefix_lock:
+        _prefix_kv.clear()
+
+def generate_text(model, tokenizer, prompt: str, device: str, max_new_tokens: int,
+                  assisted: Optional[str] = None, **sampling) -> Tuple[str, Dict[str, Any]]:
+    """Generate a reply to a single user prompt
+
+    Args:
+        model, tokenizer: Loaded Qwen model and tokenizer
+        prompt: User message content (the chat template is applied here)
+        device: Device the inputs are moved to
+        max_new_tokens: Generation length limit
+        assisted: Assisted decoding mode (see ASSISTED_MODES), None = environment default
+        **sampling: Extra model.generate() arguments (temperature, top_p, ...).
+            no_repeat_ngram_size is applied with IncrementalNoRepeatNGram
+            instead of the stock processor.
+
+    Returns:
+        (stripped response text, stats) where stats has mode, newTokens,
+        seconds, tokensPerSecond, targetForwardPasses and acceptanceRate - the
+        share of new tokens that came from accepted draft candidates rather
+        than one token per forward pass of the main model (0 when off)
+    """
+    text = tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}],
+        tokenize=False,
+        add_generation_prompt=True
+    )
+    input_ids = tokenizer(text, add_special_tokens=False).input_ids
+    return _generate(model, tokenizer, input_ids, device, max_new_tokens, assisted, None, sampling)
+
+def generate_from_template(model, tokenizer, template, transcript: str, device: str, max_new_tokens: int,
+                           assisted: Optional[str] = None, kv_prefix_cache: bool = False,
+                           **sampling) -> Tuple[str, Dict[str, Any]]:
+    """Generate a reply to a registered prompt template (see prompt_templates)
+
+    Same as generate_text(), but the static prefix is tokenized once and,
+    with kv_prefix_cache (long-lived processes such as the model server),
+    prefilled once so only the transcript and suffix are prefilled per call.
+    The prefix KV cache is not combined with assisted decoding.
+    """
+    input_ids, prefix_length = template_input_ids(tokenizer, template, transcript)
+    mode = resolve_assisted_mode(assisted)
+    past_key_values = None
+    if kv_prefix_cache and mode == "off":
+        past_key_values = _prefix_kv_cache(model, template, input_ids[:prefix_length], device)
+    stats_extra = {"prefixTokens": prefix_length, "promptTokens": len(input_ids), "prefixCached": past_key_values is not None}
+    response, stats = _generate(model, tokenizer, input_ids, device, max_new_tokens, mode, past_key_values, sampling)
+    stats.update(stats_extra)
+    return response, stats
+
+def _generate(model, tokenizer, input_ids: List[int], device: str, max_new_tokens: int,
+              assisted: Optional[str], past_key_values, sampling: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    import torch
+
+    mode = resolve_assisted_mode(assisted)
+    input_tensor = torch.tensor([input_ids], device=device)
+
+    generate_kwargs = dict(sampling)
+    generate_kwargs.setdefault("pad_token_id", tokenizer.eos_token_id)
+    ngram_size = generate_kwargs.pop("no_repeat_ngram_size", 0)
+    if ngram_size:
+        from transformers import LogitsProcessorList
+        generate_kwargs["logits_processor"] = LogitsProcessorList([IncrementalNoRepeatNGram(ngram_size)])
+    if past_key_values is not None:
+        generate_kwargs["past_key_values"] = past_key_values
+    # Stop between tokens when the request is cancelled or past its deadline
+    token = cancellation.current()
+    if token is not None:
+        token.check()
+        from transformers import StoppingCriteriaList
+        generate_kwargs["stopping_criteria"] = StoppingCriteriaList([cancellation.CancelStoppingCriteria(token)])
+    draft_model = None
+    if mode == "prompt_lookup":
+        generate_kwargs["prompt_lookup_num_tokens"] = PROMPT_LOOKUP_NUM_TOKENS
+    elif mode == "draft":
+        from model_cache import get_qwen_draft_model
+        draft_model = get_qwen_draft_model(device=device)
+        generate_kwargs["assistant_model"] = draft_model
+
+    target_counter = _ForwardCounter(model)
+    draft_counter = _ForwardCounter(draft_model)
+    started = time.perf_counter()
+    try:
+        with torch.no_grad():
+            generated_ids = model.generate(
+                input_tensor,
+                attention_mask=torch.ones_like(input_tensor),
+                max_new_tokens=max_new_tokens,
+                **generate_kwargs
+            )
+    finally:
+        target_counter.remove()
+        draft_counter.remove()
+    seconds = time.perf_counter() - started
+    if token is not None:
+        # generate() returned early: do not hand back a truncated result
+        token.check()
+
+    new_ids = generated_ids[0][len(input_ids):]
+    response = tokenizer.decode(new_ids, skip_special_tokens=True)
+
+    new_tokens = int(new_ids.shape[0])
+    passes = target_counter.count
+    accepted = max(0, new_tokens - passes) if mode != "off" else 0
+    stats = {
+        "mode": mode,
+        "newTokens": new_tokens,
+        "seconds": round(seconds, 3),
+        "tokensPerSecond": round(new_tokens / seconds, 2) if seconds > 0 else None,
+        "targetForwardPasses": passes,
+        "acceptanceRate": round(accepted / new_tokens, 3) if new_tokens else 0.0,
+    }
+    if draft_model is not None:
+        stats["draftForwardPasses"] = draft_counter.count
+    print(f"[Qwen] Generated {new_tokens} tokens in {seconds:.1f}s ({stats['tokensPerSecond']} tok/s, mode={mode}, acceptance={stats['acceptanceRate']})", file=sys.stderr)
+    return response.strip(), stats
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Time-indexed segment lists and interval arithmetic
+Used for caption range slicing (get_transcript.py), for collecting
+transcription results (transcribe_audio.py, model_server.py) and for
+incremental re-transcription of time ranges (transcript_store.py)
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+Interval = Tuple[float, float]
+
+# Columnar layout shared by SegmentIndex and SegmentBuffer (and the
+# "columns" wire format): starts/ends are float arrays, text is every
+# segment's text joined by single spaces, and offsets[i] is where segment i
+# starts in it, with offsets[n] == len(text) + 1. Segment i is therefore
+# text[offsets[i]:offsets[i + 1] - 1], and the joined text is the transcript.
+# Offsets are Python string indices (code points), not UTF-16 units.
+
+SEGMENT_FORMATS = ("objects", "columns", "none")
+
+class _ColumnarSegments:
+    __slots__ = ("starts", "ends", "_offsets")
+
+    def _text_buffer(self) -> str:
+        raise NotImplementedError
+
+    def _words_at(self, i: int):
+        return None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def text_at(self, i: int) -> str:
+        return self._text_buffer()[self._offsets[i]:self._offsets[i + 1] - 1]
+
+    @property
+    def texts(self) -> List[str]:
+        return [self.text_at(i) for i in range(len(self.starts))]
+
+    def to_columns(self) -> Dict[str, Any]:
+        """Parallel arrays: starts, ends, one text buffer and its offsets"""
+        return {
+            "starts": self.starts.tolist(),
+            "ends": self.ends.tolist(),
+            "text": self._text_buffer(),
+            "offsets": self._offsets.tolist(),
+        }
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """The per-segment JSON shape ({"text", "start", "end"[, "words"]})"""
+        items = []
+        for i in range(len(self.starts)):
+            item = {"text": self.text_at(i), "start": self.starts[i], "end": self.ends[i]}
+            words = self._words_at(i)
+            if words:
+                item["words"] = [
+                    {"word": w[0], "start": w[1], "end": w[2], "probability": w[3]} for w in words
+                ]
+            items.append(item)
+        return items
+
+    def format_segments(self, segment_format: Optional[str] = "objects") -> Dict[str, Any]:
+        """Result fields for the requested wire format
+
+        "objects" (default) -> {"segments": [...]}, "columns" -> {"segmentColumns": {...}},
+        "none" -> {} for callers that only need the transcript text.
+        """
+        if segment_format == "none":
+            return {}
+        if segment_format == "columns":
+            return {"segmentColumns": self.to_columns()}
+        return {"segments": self.to_dicts()}
+
+class SegmentIndex(_ColumnarSegments):
+    """Segments sorted by start time, with overlap queries by binary search
+
+    Storage is compact and columnar (see above) instead of one tuple or dict
+    per segment. A running maximum of end times keeps overlap lookups at
+    O(log n + k) even when segments overlap each other (captions often do).
+    """
+
+    __slots__ = ("_max_ends", "_text")
+
+    def __init__(self, segments: Iterable[Tuple[float, float, str]] = ()):
+        ordered = sorted(segments, key=lambda s: s[0])
+        self.starts = array("d", (s[0] for s in ordered))
+        self.ends = array("d", (s[1] for s in ordered))
+        texts = [s[2] for s in ordered]
+        self._text = " ".join(texts)
+        self._offsets = array("q", [0])
+        position = 0
+        for text in texts:
+            position += len(text) + 1
+            self._offsets.append(position)
+        self._build_max_ends()
+
+    def _build_max_ends(self):
+        self._max_ends = array("d")
+        running = float("-inf")
+        for end in self.ends:
+            running = max(running, end)
+            self._max_ends.append(running)
+
+    def _text_buffer(self) -> str:
+        return self._text
+
+    @classmethod
+    def from_columns(cls, starts, ends, text, offsets) -> "SegmentIndex":
+        """Rebuild from to_columns() output (already sorted; no per-segment objects)
+
+        Raises:
+            ValueError if the columns are inconsistent
+        """
+        if not (len(starts) == len(ends) == len(offsets) - 1) or offsets[-1] != (len(text) + 1 if starts else 0):
+            raise ValueError("Inconsistent segment columns")
+        index = cls.__new__(cls)
+        index.starts = array("d", starts)
+        index.ends = array("d", ends)
+        index._text = text
+        index._offsets = array("q", offsets)
+        index._build_max_ends()
+        return index
+
+    def overlapping(self, start: Optional[float] = None, end: Optional[float] = None) -> List[int]:
+        """Indices of segments with segment_end >= start and segment_start <= end (None = unbounded)"""
+        lo = 0 if start is None else bisect_left(self._max_ends, start)
+        hi = len(self.starts) if end is None else bisect_right(self.starts, end)
+        if start is None:
+            return list(range(lo, hi))
+        return [i for i in range(lo, hi) if self.ends[i] >= start]
+
+    def slice(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Tuple[float, float, str]]:
+        return [(self.starts[i], self.ends[i], self.text_at(i)) for i in self.overlapping(start, end)]
+
+    def text(self, start: Optional[float] = None, end: Optional[float] = None) -> str:
+        indices = self.overlapping(start, end)
+        if not indices:
+            return ""
+        first, last = indices[0], indices[-1]
+        if last - first + 1 == len(indices):
+            # Contiguous run: one slice of the buffer, separators included
+            return self._text[self._offsets[first]:self._offsets[last + 1] - 1]
+        return " ".join(self.text_at(i) for i in indices)
+
+class SegmentBuffer(_ColumnarSegments):
+    """Append-only columnar segment list, filled while a transcription decodes
+
+    Segment text is whitespace-normalized on append, so the joined buffer is
+    the final transcript as-is, and the word count is kept as segments arrive
+    rather than re-splitting the transcript. Word timings, when requested,
+    are kept as (word, start, end, probability) tuples.
+    """
+
+    __slots__ = ("_parts", "_words", "word_count")
+
+    def __init__(self, word_timestamps: bool = False):
+        self.starts = array("d")
+        self.ends = array("d")
+        self._offsets = array("q", [0])
+        self._parts: List[str] = []
+        self._words: Optional[list] = [] if word_timestamps else None
+        self.word_count = 0
+
+    def append(self, start: float, end: float, text: str, words=None) -> bool:
+        """Add a segment; returns False (and stores nothing) for blank text"""
+        tokens = text.split()
+        if not tokens:
+            return False
+        text = " ".join(tokens)
+        if self.starts:
+            self._parts.append(" ")
+        self._parts.append(text)
+        self.starts.append(start)
+        self.ends.append(end)
+        self._offsets.append(self._offsets[-1] + len(text) + 1)
+        if self._words is not None:
+            self._words.append([(w.word, w.start, w.end, w.probability) for w in words] if words else None)
+        self.word_count += len(tokens)
+        return True
+
+    def _text_buffer(self) -> str:
+        # Collapse the appended parts into one string on first read
+        if len(self._parts) != 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0]
+
+    def _words_at(self, i: int):
+        return self._words[i] if self._words is not None else None
+
+    @property
+    def transcript(self) -> str:
+        return self._text_buffer()
+
+    @property
+    def character_count(self) -> int:
+        return self._offsets[-1] - 1 if self.starts else 0
+
+    def shifted(self, offset: float) -> List[Tuple[float, float, str]]:
+        """(start, end, text) tuples moved by `offset` seconds"""
+        return [(self.starts[i] + offset, self.ends[i] + offset, self.text_at(i)) for i in range(len(self.starts))]
+
+    def to_columns(self) -> Dict[str, Any]:
+        columns = super().to_columns()
+        if self._words is not None:
+            columns["words"] = self._words
+        return columns
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Merge overlapping or touching intervals into a sorted disjoint list"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def subtract_intervals(start: float, end: float, covered: Iterable[Interval], min_gap: float = 0.0) -> List[Interval]:
+    """Parts of [start, end] not covered by any interval in `covered`
+
+    Gaps shorter than min_gap seconds are dropped (not worth a download).
+    """
+    gaps: List[Interval] = []
+    cursor = start
+    for c_start, c_end in merge_intervals(covered):
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, min(c_start, end)))
+        cursor = max(cursor, c_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return [g for g in gaps if g[1] - g[0] > min_gap]
+
+def is_covered(point: float, covered: List[Interval]) -> bool:
+    """True if `point` lies inside one of the sorted disjoint intervals"""
+    i = bisect_right(covered, (point, float("inf"))) - 1
+    return i >= 0 and covered[i][0] <= point <= covered[i][1]
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Live transcription test client
+Streams a WAV file to the model server's /transcribe/stream endpoint at
+real-time speed (or `speed` times faster), as a microphone would, and
+reports the events it gets back with their latency: the time from sending
+the audio at an event's end to receiving the event.
+
+The WAV must be 16 kHz 16-bit mono PCM, e.g.:
+    ffmpeg -i lecture.mp3 -ar 16000 -ac 1 -c:a pcm_s16le lecture.wav
+
+Usage:
+    stream_transcription_client.py <file.wav> [server_url] [speed] [language]
+"""
+import sys
+import json
+import time
+import wave
+import threading
+import http.client
+from urllib.parse import urlparse, urlencode
+
+from streaming_transcription import SAMPLE_RATE, BYTES_PER_SAMPLE
+
+# Audio sent per request chunk, like a capture callback's buffer
+PIECE_SECONDS = 0.1
+
+def read_pcm(wav_path):
+    with wave.open(wav_path, "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != BYTES_PER_SAMPLE:
+            raise ValueError(f"Expected {SAMPLE_RATE} Hz 16-bit mono PCM, got {wav.getframerate()} Hz, "
+                             f"{wav.getsampwidth() * 8}-bit, {wav.getnchannels()} channel(s)")
+        return wav.readframes(wav.getnframes())
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"count": len(values), "p50": round(pick(0.5), 3), "p95": round(pick(0.95), 3), "max": round(values[-1], 3)}
+
+def stream_file(wav_path, server_url="http://localhost:8765", speed=1.0, language=None):
+    pcm = read_pcm(wav_path)
+    url = urlparse(server_url)
+    params = {"language": language} if language else {}
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=120)
+    conn.putrequest("POST", f"/transcribe/stream?{urlencode(params)}")
+    conn.putheader("Content-Type", "application/octet-stream")
+    conn.putheader("Transfer-Encoding", "chunked")
+    conn.endheaders()
+
+    piece_bytes = int(PIECE_SECONDS * SAMPLE_RATE) * BYTES_PER_SAMPLE
+    started = time.perf_counter()
+
+    def send():
+        # Each piece leaves once its audio would have been captured
+        for offset in range(0, len(pcm), piece_bytes):
+            piece = pcm[offset:offset + piece_bytes]
+            due = started + (offset + len(piece)) / BYTES_PER_SAMPLE / SAMPLE_RATE / speed
+            time.sleep(max(0.0, due - time.perf_counter()))
+            conn.send(b"%x\r\n%s\r\n" % (len(piece), piece))
+        conn.send(b"0\r\n\r\n")
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+
+    response = conn.getresponse()
+    if response.status != 200:
+        return {"success": False, "error": response.read().decode("utf-8", "replace")}
+
+    finals, latency, summary = [], {"partial": [], "final": []}, None
+    for line in response:
+        event = json.loads(line)
+        received = time.perf_counter() - started
+        if event["type"] in latency:
+            delay = received - event["end"] / speed
+            latency[event["type"]].append(delay)
+            print(f"[{received:7.2f}s] {event['type']:7} {event['start']:7.2f}-{event['end']:7.2f} "
+                  f"(latency {delay:.2f}s): {event['text']}", file=sys.stderr)
+            if event["type"] == "final":
+                finals.append(event)
+        elif event["type"] == "end":
+            summary = event
+        elif event["type"] == "error":
+            return {"success": False, "error": event["error"]}
+    sender.join()
+    conn.close()
+
+    return {
+        "success": True,
+        "transcript": " ".join(e["text"] for e in finals),
+        "segments": [{k: e[k] for k in ("start", "end", "text")} for e in finals],
+        "latency": {kind: percentiles(values) for kind, values in latency.items()},
+        "server": summary,
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(json.dumps({
+            "success": False,
+            "error": "WAV file path is required"
+        }))
+        sys.exit(1)
+
+    wav_path = sys.argv[1]
+    server_url = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else "http://localhost:8765"
+    speed = float(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] else 1.0
+    language = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] else None
+
+    try:
+        result = stream_file(wav_path, server_url, speed, language)
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    print(json.dumps(result, ensure_ascii=False))
+    sys.exit(0 if result["success"] else 1)
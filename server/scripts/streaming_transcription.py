@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Live (streaming) transcription of 16 kHz 16-bit mono PCM
+Audio arrives in arbitrary pieces and is cut into 30 ms frames. An energy VAD
+with an adaptive noise floor groups speech frames into utterance windows;
+while an utterance is open it is re-decoded every PARTIAL_INTERVAL_SECONDS
+of new audio (partial segments), and when it ends (END_SILENCE_SECONDS of
+silence, or MAX_WINDOW_SECONDS of audio) it is decoded once more and emitted
+as final segments. The text of recent final segments is the prompt for the
+next window, so decoding keeps its context across windows.
+
+Latency is bounded by the window cap (no decode covers more than
+MAX_WINDOW_SECONDS of audio), and partials are skipped whenever more audio
+is already waiting, so a stream that falls behind catches up instead of
+queueing stale partial decodes. Final segments are never skipped.
+"""
+import os
+import sys
+import math
+import time
+import queue
+import threading
+from array import array
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+FRAME_SECONDS = 0.03
+FRAME_BYTES = int(SAMPLE_RATE * FRAME_SECONDS) * BYTES_PER_SAMPLE
+
+# An utterance is decoded and finalized once it reaches this length, even mid-speech
+MAX_WINDOW_SECONDS = float(os.environ.get("STREAM_MAX_WINDOW_SECONDS", "15"))
+# Audio added to an open utterance before it is decoded again for a partial result
+PARTIAL_INTERVAL_SECONDS = float(os.environ.get("STREAM_PARTIAL_INTERVAL_SECONDS", "1.0"))
+# Silence that ends an utterance
+END_SILENCE_SECONDS = float(os.environ.get("STREAM_END_SILENCE_SECONDS", "0.5"))
+# Audio kept from before speech starts, so the first word is not clipped
+PRE_ROLL_SECONDS = 0.2
+# Utterances with less speech than this (clicks, coughs) are dropped undecoded
+MIN_SPEECH_SECONDS = 0.25
+# A window cut at MAX_WINDOW_SECONDS is split at its quietest frame within this tail
+CUT_SEARCH_SECONDS = 2.0
+# Characters of previous final text used as the prompt for the next window
+CONTEXT_CHARS = 200
+
+# decode(pcm, language, prompt, final) -> ([(start, end, text)], detected language);
+# times are relative to the start of `pcm`
+Decode = Callable[[bytes, Optional[str], Optional[str], bool], Tuple[List[Tuple[float, float, str]], Optional[str]]]
+
+class EnergyVAD:
+    """Frame-level speech detector: RMS energy against an adaptive noise floor
+
+    The floor drops to any quieter frame at once and otherwise rises slowly
+    (FLOOR_RISE per frame), so it follows background noise but not speech,
+    which keeps dipping between words.
+    """
+
+    # Speech is at least this many times the noise floor...
+    RATIO = 3.0
+    # ...and above this absolute level (about -46 dBFS)
+    MIN_RMS = 0.005
+    FLOOR_RISE = 1.002
+
+    def __init__(self):
+        self.noise_floor = self.MIN_RMS
+
+    def is_speech(self, frame: bytes) -> bool:
+        samples = array("h", frame)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        rms = math.sqrt(sum(s * s for s in samples) / len(samples)) / 32768.0
+        speech = rms > max(self.MIN_RMS, self.noise_floor * self.RATIO)
+        self.noise_floor = min(rms, self.noise_floor * self.FLOOR_RISE) if rms > 0 else self.noise_floor
+        return speech
+
+class StreamingTranscriber:
+    """Turns a live PCM stream into partial and final segment events
+
+    Events are dicts: {"type": "partial" | "final", "start", "end", "text",
+    "decodeSeconds"}, with times in seconds from the start of the stream.
+    A partial covers the whole open utterance and is replaced by the next
+    partial or by the utterance's final segments.
+
+    Args:
+        decode: Decodes one window, see Decode
+        language: Language code, or None to use the one detected in the first final window
+    """
+
+    def __init__(self, decode: Decode, language: Optional[str] = None,
+                 max_window_seconds: float = MAX_WINDOW_SECONDS,
+                 partial_interval_seconds: float = PARTIAL_INTERVAL_SECONDS,
+                 end_silence_seconds: float = END_SILENCE_SECONDS):
+        self.decode = decode
+        self.language = language
+        self.context = ""
+        self.vad = EnergyVAD()
+        self._max_frames = max(1, int(max_window_seconds / FRAME_SECONDS))
+        self._partial_frames = max(1, int(partial_interval_seconds / FRAME_SECONDS))
+        self._end_frames = max(1, int(end_silence_seconds / FRAME_SECONDS))
+        self._pre_roll = deque(maxlen=int(PRE_ROLL_SECONDS / FRAME_SECONDS))
+        self._remainder = b""
+        # Frames of the open utterance (empty when there is none), their VAD
+        # decisions and its start frame
+        self._window: List[bytes] = []
+        self._window_speech: List[bool] = []
+        self._window_start = 0
+        self._silent_frames = 0
+        self._frames_since_partial = 0
+        self._last_partial = ""
+        # Frames received so far (stream position)
+        self.position = 0
+        self.stats = {"partials": 0, "finals": 0, "skippedPartials": 0, "droppedUtterances": 0,
+                      "decodes": 0, "decodeSeconds": 0.0, "speechSeconds": 0.0}
+
+    def feed(self, pcm: bytes) -> List[Dict[str, Any]]:
+        """Add audio; returns the final segments of utterances that ended in it"""
+        data = self._remainder + pcm
+        usable = len(data) - len(data) % FRAME_BYTES
+        self._remainder = data[usable:]
+        events = []
+        for offset in range(0, usable, FRAME_BYTES):
+            events.extend(self._add_frame(data[offset:offset + FRAME_BYTES]))
+        return events
+
+    def _add_frame(self, frame: bytes) -> List[Dict[str, Any]]:
+        speech = self.vad.is_speech(frame)
+        self.position += 1
+        if not self._window:
+            if not speech:
+                self._pre_roll.append(frame)
+                return []
+            self._window = list(self._pre_roll)
+            self._window_speech = [False] * len(self._window)
+            self._window_start = self.position - 1 - len(self._pre_roll)
+            self._pre_roll.clear()
+
+        self._window.append(frame)
+        self._window_speech.append(speech)
+        self._frames_since_partial += 1
+        self._silent_frames = 0 if speech else self._silent_frames + 1
+
+        if self._silent_frames >= self._end_frames:
+            return self._finish()
+        if len(self._window) >= self._max_frames:
+            return self._finish(cut=True)
+        return []
+
+    def partial(self) -> Optional[Dict[str, Any]]:
+        """Decode the open utterance if enough audio was added since the last partial"""
+        if not self._window or self._frames_since_partial < self._partial_frames:
+            return None
+        self._frames_since_partial = 0
+        segments, seconds = self._decode(self._window, final=False)
+        text = " ".join(t for _, _, t in segments)
+        if not text or text == self._last_partial:
+            return None
+        self._last_partial = text
+        self.stats["partials"] += 1
+        return {
+            "type": "partial",
+            "start": round(self._window_start * FRAME_SECONDS, 3),
+            "end": round((self._window_start + len(self._window)) * FRAME_SECONDS, 3),
+            "text": text,
+            "decodeSeconds": round(seconds, 3),
+        }
+
+    def skip_partial(self):
+        """Record a partial that was not decoded because more audio was waiting"""
+        if self._window and self._frames_since_partial >= self._partial_frames:
+            self.stats["skippedPartials"] += 1
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """End of stream: finalize the open utterance"""
+        return self._finish() if self._window else []
+
+    def _finish(self, cut: bool = False) -> List[Dict[str, Any]]:
+        window, flags, start = self._window, self._window_speech, self._window_start
+        carry, carry_flags = [], []
+        if cut:
+            # Split where the speaker is quietest, so a word is less likely to be cut in half
+            search = max(1, min(len(window) - 1, int(CUT_SEARCH_SECONDS / FRAME_SECONDS)))
+            tail = range(len(window) - search, len(window))
+            split = min(tail, key=lambda i: sum(abs(s) for s in array("h", window[i])))
+            window, carry = window[:split], window[split:]
+            flags, carry_flags = flags[:split], flags[split:]
+
+        speech_frames = sum(flags)
+        self._window, self._window_speech = carry, carry_flags
+        self._window_start = start + len(window)
+        self._silent_frames = 0
+        self._frames_since_partial = len(carry)
+        self._last_partial = ""
+
+        if speech_frames * FRAME_SECONDS < MIN_SPEECH_SECONDS or not window:
+            self.stats["droppedUtterances"] += 1
+            return []
+        self.stats["speechSeconds"] += speech_frames * FRAME_SECONDS
+
+        segments, seconds = self._decode(window, final=True)
+        offset = start * FRAME_SECONDS
+        events = []
+        for seg_start, seg_end, text in segments:
+            events.append({
+                "type": "final",
+                "start": round(offset + seg_start, 3),
+                "end": round(offset + min(seg_end, len(window) * FRAME_SECONDS), 3),
+                "text": text,
+                "decodeSeconds": round(seconds, 3),
+            })
+        if events:
+            self.context = (self.context + " " + " ".join(e["text"] for e in events)).strip()[-CONTEXT_CHARS:]
+            self.stats["finals"] += len(events)
+        return events
+
+    def _decode(self, frames: List[bytes], final: bool):
+        started = time.perf_counter()
+        segments, language = self.decode(b"".join(frames), self.language, self.context or None, final)
+        seconds = time.perf_counter() - started
+        if final and self.language is None and language:
+            # Short partial windows detect the language poorly; keep the first final one
+            self.language = language
+        self.stats["decodes"] += 1
+        self.stats["decodeSeconds"] += seconds
+        return [(s, e, " ".join(t.split())) for s, e, t in segments if t.strip()], seconds
+
+    def summary(self) -> Dict[str, Any]:
+        audio_seconds = self.position * FRAME_SECONDS
+        return dict(
+            self.stats,
+            decodeSeconds=round(self.stats["decodeSeconds"], 3),
+            speechSeconds=round(self.stats["speechSeconds"], 3),
+            audioSeconds=round(audio_seconds, 3),
+            # Decode time per second of audio; above 1.0 the stream cannot keep up in real time
+            realTimeFactor=round(self.stats["decodeSeconds"] / audio_seconds, 3) if audio_seconds else None,
+            language=self.language,
+        )
+
+_END = object()
+
+def transcribe_stream(chunks: Iterable[bytes], transcriber: StreamingTranscriber) -> Iterator[Dict[str, Any]]:
+    """Events for a stream of PCM pieces, ending with {"type": "end", ...summary}
+
+    The pieces are read on a separate thread, so audio keeps arriving while
+    a window is decoded; everything that arrived meanwhile is fed at once and
+    only then is a partial decoded.
+    """
+    received = queue.Queue()
+
+    def read():
+        try:
+            for chunk in chunks:
+                received.put(chunk)
+        except Exception as e:
+            received.put(e)
+        received.put(_END)
+
+    threading.Thread(target=read, daemon=True).start()
+
+    while True:
+        items = [received.get()]
+        while not received.empty():
+            items.append(received.get_nowait())
+        for item in items:
+            if isinstance(item, Exception):
+                raise item
+            if item is _END:
+                yield from transcriber.flush()
+                yield dict(transcriber.summary(), type="end")
+                return
+            yield from transcriber.feed(item)
+        if received.empty():
+            event = transcriber.partial()
+            if event:
+                yield event
+        else:
+            transcriber.skip_partial()
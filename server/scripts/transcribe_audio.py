@@ -2,20 +2,23 @@
 """
 Audio Transcription using Faster Whisper
 Converts audio/video files to text transcript
+
+Run with --worker to keep the process (and the loaded Whisper model) alive
+and read newline-delimited JSON jobs from stdin.
 """
 import sys
 import json
 import os
-from faster_whisper import WhisperModel
 from model_cache import get_whisper_model
+from whisper_decoding import (
+    select_profile, get_audio_duration, build_transcribe_options,
+    run_transcription, parse_batch_size,
+)
+from segment_index import SegmentBuffer
 
-# Try to import torch for GPU detection (optional, won't fail if not available)
-try:
-    import torch
-except ImportError:
-    torch = None
-
-def transcribe_audio(file_path, model_size="base", language=None, device="cpu"):
+def transcribe_audio(file_path, model_size="base", language=None, device="cpu",
+                     profile=None, word_timestamps=False, queue_depth=0, batch_size=None,
+                     segment_format="objects"):
     """Transcribe audio file using Faster Whisper
     
     Args:
@@ -23,6 +26,13 @@ def transcribe_audio(file_path, model_size="base", language=None, device="cpu"):
         model_size: Whisper model size (tiny, base, small, medium, large-v2, large-v3)
         language: Language code (e.g., 'ar', 'en') or None for auto-detection
         device: 'cpu' or 'cuda' for GPU acceleration
+        profile: Decoding profile ('fast', 'balanced', 'accurate') or None/'auto'
+        word_timestamps: Include word-level timings in each segment
+        queue_depth: Jobs waiting behind this one (used by the automatic profile policy)
+        batch_size: Opt-in batched mode - decode VAD speech segments in parallel
+            batches of this size on one model instance (None = sequential)
+        segment_format: How segments are returned - "objects" (list of dicts),
+            "columns" (parallel arrays, see segment_index) or "none"
     
     Returns:
         Dictionary with transcription results
@@ -79,6 +89,7 @@ def transcribe_audio(file_path, model_size="base", language=None, device="cpu"):
                 except Exception as e2:
                     print(f"[Whisper] GPU initialization failed, falling back to CPU: {e2}", file=sys.stderr)
                     # Fallback to CPU if GPU fails
+                    device = "cpu"
                     model = get_whisper_model(model_size, device="cpu", compute_type="int8")
         elif (device == "cuda" or device == "gpu") and not cuda_available:
             print(f"[Whisper] GPU requested but CUDA not available, falling back to CPU", file=sys.stderr)
@@ -88,104 +99,36 @@ def transcribe_audio(file_path, model_size="base", language=None, device="cpu"):
             print(f"[Whisper] Loading model: {model_size} on CPU", file=sys.stderr)
             model = get_whisper_model(model_size, device="cpu", compute_type="int8")
         
-        # Transcribe audio
-        # Optimize settings based on device and model size
-        # For GPU with large models, use higher beam_size for better accuracy
-        # For CPU or smaller models, use lower beam_size for faster processing
-        is_gpu = (device == "cuda" or device == "gpu")
-        is_large_model = "large" in model_size.lower() or "medium" in model_size.lower()
-        
-        # Optimal quality/speed balance settings for Whisper
-        # beam_size=5 gives excellent quality with good speed (recommended by faster-whisper)
-        # Higher values (10+) are much slower with minimal quality improvement
-        if is_gpu and is_large_model:
-            # GPU + large model: optimal balance (5x faster than beam_size=20, same quality)
-            beam_size = 5
-            best_of = 5  # Optimal for quality/speed balance
-            patience = 1.0  # Standard patience
-            print(f"[Whisper] Using optimal quality/speed settings for GPU + large model (beam_size={beam_size}, best_of={best_of}, patience={patience})", file=sys.stderr)
-        elif is_gpu:
-            # GPU + smaller model: optimal balance
-            beam_size = 5
-            best_of = 5
-            patience = 1.0
-        else:
-            # CPU mode - use moderate settings for speed
-            beam_size = 3
-            best_of = 3
-            patience = 1.0
-        
-        # Prepare ULTRA-ENHANCED initial prompt for maximum accuracy (especially for Arabic)
-        initial_prompt = None
-        if language == "ar":
-            # Ultra-enhanced Arabic prompt for maximum accuracy
-            initial_prompt = "هذه محاضرة أكاديمية تعليمية باللغة العربية الفصحى. المتحدث يتحدث بوضوح وبطء معتدل. النص دقيق ومفصل مع استخدام المصطلحات العلمية والأكاديمية الصحيحة. علامات الترقيم والفواصل واضحة."
-        elif language == "en":
-            # Ultra-enhanced English prompt for maximum accuracy
-            initial_prompt = "This is an academic educational lecture in clear English. The speaker speaks clearly and at a moderate pace. The text is accurate and detailed with proper use of scientific and academic terminology. Punctuation and pauses are clear."
-        elif language and language != "None":
-            # Enhanced prompt for other languages
-            initial_prompt = f"This is an academic educational lecture in {language}. The speaker speaks clearly. The text is accurate and detailed with proper terminology."
+        # Pick a decoding profile from audio length, queue depth and device
+        duration_seconds = get_audio_duration(file_path)
+        profile = select_profile(duration_seconds, queue_depth, device, profile)
+        options = build_transcribe_options(profile, language, word_timestamps)
         
-        print(f"[Whisper] Transcribing audio file: {file_path} with optimal quality/speed settings", file=sys.stderr)
-        segments, info = model.transcribe(
-            file_path,
-            language=language,
-            beam_size=beam_size,
-            vad_filter=True,  # Voice Activity Detection filter
-            vad_parameters=dict(
-                min_silence_duration_ms=300,  # Lower for better detection
-                threshold=0.3,  # Lower threshold for maximum detection
-                min_speech_duration_ms=250,  # Minimum speech duration
-            ),
-            # ABSOLUTE MAXIMUM quality optimizations
-            condition_on_previous_text=True,  # Always use context for better accuracy
-            initial_prompt=initial_prompt,  # Ultra-enhanced prompt for maximum accuracy
-            word_timestamps=True,  # Enable for better word-level accuracy
-            temperature=0.0,  # Deterministic output (most accurate)
-            compression_ratio_threshold=2.2,  # Stricter filter for better quality
-            log_prob_threshold=-0.8,  # Higher threshold for better confidence
-            no_speech_threshold=0.4,  # Lower threshold for maximum speech detection
-            # ABSOLUTE MAXIMUM quality settings
-            best_of=best_of,  # Maximum candidates for best quality
-            patience=patience,  # Higher patience for better results
-            # Additional quality parameters
-            suppress_blank=True,  # Suppress blank outputs
-            suppress_tokens=[-1],  # Suppress special tokens
-            without_timestamps=False,  # Keep timestamps for better alignment
-        )
+        print(f"[Whisper] Transcribing audio file: {file_path} (profile={profile}, beam_size={options['beam_size']}, duration={duration_seconds}, queue_depth={queue_depth}, word_timestamps={word_timestamps}, batch_size={batch_size})", file=sys.stderr)
+        segments, info = run_transcription(model, file_path, options, batch_size)
         
         # Extract detected language
         detected_language = info.language if hasattr(info, 'language') else language or 'unknown'
         print(f"[Whisper] Detected language: {detected_language}", file=sys.stderr)
         
-        # Collect all segments
-        full_text = ""
-        segments_list = []
-        
+        # Collect all segments into a columnar buffer (no per-segment dicts)
+        collected = SegmentBuffer(word_timestamps)
         for segment in segments:
-            segment_text = segment.text.strip()
-            if segment_text:
-                full_text += segment_text + " "
-                segments_list.append({
-                    "text": segment_text,
-                    "start": segment.start,
-                    "end": segment.end
-                })
-        
-        # Clean up text
-        full_text = " ".join(full_text.split()).strip()
+            collected.append(segment.start, segment.end, segment.text,
+                             getattr(segment, "words", None) if word_timestamps else None)
         
-        print(f"[Whisper] Transcription complete: {len(full_text)} characters, {len(full_text.split())} words", file=sys.stderr)
+        print(f"[Whisper] Transcription complete: {collected.character_count} characters, {collected.word_count} words", file=sys.stderr)
         
-        return {
+        result = {
             "success": True,
-            "transcript": full_text,
-            "wordCount": len(full_text.split()),
-            "characterCount": len(full_text),
+            "transcript": collected.transcript,
+            "wordCount": collected.word_count,
+            "characterCount": collected.character_count,
             "language": detected_language,
-            "segments": segments_list
+            "profile": profile,
         }
+        result.update(collected.format_segments(segment_format))
+        return result
         
     except Exception as e:
         import traceback
@@ -198,7 +141,64 @@ def transcribe_audio(file_path, model_size="base", language=None, device="cpu"):
             "details": error_trace
         }
 
+def run_worker():
+    """Serve transcription jobs over stdin/stdout until stdin is closed
+
+    Each input line is a JSON object:
+        {"id": ..., "file_path": ..., "model_size": ..., "language": ..., "device": ...,
+         "profile": ..., "word_timestamps": ..., "queue_depth": ..., "batch_size": ...,
+         "segment_format": ...}
+    Each output line is the transcribe_audio() result with the job "id" added.
+    Models stay in the model_cache between jobs, so only the first job pays
+    for the import and model load.
+    """
+    # stdout carries the protocol only; anything else printed by libraries goes to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    
+    print("[Whisper] Worker ready, waiting for jobs on stdin", file=sys.stderr)
+    
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        
+        job_id = None
+        try:
+            job = json.loads(line)
+            job_id = job.get("id")
+            language = job.get("language") or None
+            if language == "None":
+                language = None
+            
+            result = transcribe_audio(
+                job.get("file_path") or "",
+                job.get("model_size") or "base",
+                language,
+                job.get("device") or "cpu",
+                profile=job.get("profile"),
+                word_timestamps=bool(job.get("word_timestamps")),
+                queue_depth=job.get("queue_depth") or 0,
+                batch_size=parse_batch_size(job.get("batch_size")),
+                segment_format=job.get("segment_format") or "objects",
+            )
+        except Exception as e:
+            result = {
+                "success": False,
+                "error": f"Invalid worker job: {str(e)}"
+            }
+        
+        result["id"] = job_id
+        protocol_out.write(json.dumps(result) + "\n")
+        protocol_out.flush()
+    
+    print("[Whisper] Worker stdin closed, exiting", file=sys.stderr)
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        run_worker()
+        sys.exit(0)
+    
     if len(sys.argv) < 2:
         print(json.dumps({
             "success": False,
@@ -212,11 +212,15 @@ if __name__ == "__main__":
     model_size = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else "base"
     language = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] else None
     device = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] else "cpu"
+    profile = sys.argv[5] if len(sys.argv) > 5 and sys.argv[5] else None
+    word_timestamps = len(sys.argv) > 6 and sys.argv[6].lower() in ("1", "true", "yes")
+    batch_size = parse_batch_size(sys.argv[7]) if len(sys.argv) > 7 else None
     
     # If language is "None" string, convert to None
     if language == "None" or language == "":
         language = None
     
-    result = transcribe_audio(file_path, model_size, language, device)
+    result = transcribe_audio(file_path, model_size, language, device, profile, word_timestamps,
+                              batch_size=batch_size)
     print(json.dumps(result))
 
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Time-indexed transcript store
+Keeps Whisper segments per video and model together with the time ranges
+that have already been transcribed, so a new range request only needs to
+transcribe the parts that are not covered yet
+"""
+import os
+import sys
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from local_cache import get_cache_dir
+from segment_index import SegmentIndex, merge_intervals, subtract_intervals, is_covered
+
+# Uncovered gaps shorter than this are not worth a download + decode
+MIN_GAP_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcript_segments (
+    video_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (video_id, model, start)
+);
+CREATE TABLE IF NOT EXISTS transcript_coverage (
+    video_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcript_coverage_key ON transcript_coverage (video_id, model);
+CREATE TABLE IF NOT EXISTS transcript_meta (
+    video_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    language TEXT,
+    PRIMARY KEY (video_id, model)
+);
+"""
+
+def model_key(model_size, language=None):
+    """Segments are only reusable for the same model and language setting"""
+    return f"{model_size}:{language or 'auto'}"
+
+class TranscriptStore:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get("TRANSCRIPT_STORE_DB") or os.path.join(get_cache_dir(), "transcripts.sqlite3")
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def coverage(self, video_id: str, model: str) -> List[tuple]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start, end FROM transcript_coverage WHERE video_id = ? AND model = ?",
+                (video_id, model),
+            ).fetchall()
+        return merge_intervals(rows)
+
+    def uncovered(self, video_id: str, model: str, start: float, end: float) -> List[tuple]:
+        """Sub-ranges of [start, end] that still need transcribing"""
+        return subtract_intervals(start, end, self.coverage(video_id, model), MIN_GAP_SECONDS)
+
+    def language(self, video_id: str, model: str) -> Optional[str]:
+        """Language detected when the stored segments were transcribed"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT language FROM transcript_meta WHERE video_id = ? AND model = ?", (video_id, model)
+            ).fetchone()
+        return row[0] if row else None
+
+    def splice(self, video_id: str, model: str, start: float, end: float, segments: Iterable[Tuple[float, float, str]],
+               language: Optional[str] = None):
+        """Insert (start, end, text) segments transcribed for [start, end] and mark the range covered
+
+        Segments whose midpoint falls in an already covered range are skipped,
+        so a boundary never ends up with the same speech twice.
+        """
+        covered = self.coverage(video_id, model)
+        rows = []
+        for seg_start, seg_end, text in segments:
+            if not is_covered((seg_start + seg_end) / 2, covered):
+                rows.append((video_id, model, seg_start, seg_end, text))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO transcript_segments (video_id, model, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            # Store merged coverage so the table stays small
+            merged = merge_intervals(covered + [(start, end)])
+            self._conn.execute(
+                "DELETE FROM transcript_coverage WHERE video_id = ? AND model = ?", (video_id, model)
+            )
+            self._conn.executemany(
+                "INSERT INTO transcript_coverage (video_id, model, start, end) VALUES (?, ?, ?, ?)",
+                [(video_id, model, s, e) for s, e in merged],
+            )
+            if language:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO transcript_meta (video_id, model, language) VALUES (?, ?, ?)",
+                    (video_id, model, language),
+                )
+        print(f"[TranscriptStore] Spliced {len(rows)} segment(s) into {video_id} [{start:.1f}s - {end:.1f}s]", file=sys.stderr)
+
+    def index(self, video_id: str, model: str) -> SegmentIndex:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start, end, text FROM transcript_segments WHERE video_id = ? AND model = ? ORDER BY start",
+                (video_id, model),
+            ).fetchall()
+        return SegmentIndex(rows)
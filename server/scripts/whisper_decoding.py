@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Whisper decoding profiles
+Named speed/accuracy settings shared by transcribe_audio.py and model_server.py,
+plus the policy that picks one from audio length, queue depth and device
+"""
+import sys
+import threading
+from typing import Optional, Dict, Any
+
+# beam_size/best_of/patience per profile. best_of only matters when the
+# temperature fallback kicks in; temperature 0.0 decoding uses the beam.
+DECODING_PROFILES: Dict[str, Dict[str, Any]] = {
+    "fast": {
+        "beam_size": 1,
+        "best_of": 1,
+        "patience": 1.0,
+        "condition_on_previous_text": False,
+    },
+    "balanced": {
+        "beam_size": 3,
+        "best_of": 3,
+        "patience": 1.0,
+        "condition_on_previous_text": True,
+    },
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "patience": 1.0,
+        "condition_on_previous_text": True,
+    },
+}
+
+# Batched mode: VAD speech segments decoded DEFAULT_BATCH_SIZE at a time
+DEFAULT_BATCH_SIZE = 16
+
+# Guards creating a model's BatchedInferencePipeline
+_pipelines_lock = threading.Lock()
+
+# Automatic policy thresholds
+LONG_AUDIO_SECONDS = 45 * 60        # beyond this, GPU drops to "balanced"
+VERY_LONG_AUDIO_SECONDS = 2 * 3600  # beyond this, GPU drops to "fast"
+CPU_LONG_AUDIO_SECONDS = 20 * 60    # beyond this, CPU drops to "fast"
+BUSY_QUEUE_DEPTH = 2                # waiting jobs before we trade accuracy for throughput
+OVERLOADED_QUEUE_DEPTH = 4
+
+def is_gpu_device(device):
+    return device in ("cuda", "gpu")
+
+def select_profile(duration_seconds=None, queue_depth=0, device="cpu", requested=None):
+    """Pick a decoding profile name
+
+    Args:
+        duration_seconds: Audio length in seconds, or None if unknown
+        queue_depth: Number of transcriptions waiting behind this one
+        device: 'cpu', 'cuda' or 'gpu'
+        requested: Explicit profile name from the client ('auto' or None = use the policy)
+
+    Returns:
+        One of the DECODING_PROFILES keys
+    """
+    if requested and requested != "auto":
+        if requested in DECODING_PROFILES:
+            return requested
+        print(f"[Whisper] Unknown decoding profile '{requested}', using automatic selection", file=sys.stderr)
+
+    duration = duration_seconds or 0
+    queue_depth = queue_depth or 0
+
+    if is_gpu_device(device):
+        if queue_depth >= OVERLOADED_QUEUE_DEPTH or duration > VERY_LONG_AUDIO_SECONDS:
+            return "fast"
+        if queue_depth >= BUSY_QUEUE_DEPTH or duration > LONG_AUDIO_SECONDS:
+            return "balanced"
+        return "accurate"
+
+    if queue_depth >= BUSY_QUEUE_DEPTH or duration > CPU_LONG_AUDIO_SECONDS:
+        return "fast"
+    return "balanced"
+
+def get_audio_duration(file_path):
+    """Read the audio duration from the container header (no decoding)
+
+    Args:
+        file_path: File path or seekable file-like object (rewound afterwards)
+
+    Returns:
+        Duration in seconds, or None if it cannot be determined
+    """
+    try:
+        import av  # installed with faster-whisper
+        with av.open(file_path) as container:
+            if container.duration is not None:
+                return container.duration / av.time_base
+            stream = next((s for s in container.streams if s.type == "audio"), None)
+            if stream is not None and stream.duration is not None and stream.time_base is not None:
+                return float(stream.duration * stream.time_base)
+    except Exception as e:
+        print(f"[Whisper] Could not read audio duration: {e}", file=sys.stderr)
+    finally:
+        if hasattr(file_path, "seek"):
+            file_path.seek(0)
+    return None
+
+def get_initial_prompt(language):
+    """Build the lecture-style initial prompt for a language code"""
+    if language == "ar":
+        return "هذه محاضرة أكاديمية تعليمية باللغة العربية الفصحى. المتحدث يتحدث بوضوح وبطء معتدل. النص دقيق ومفصل مع استخدام المصطلحات العلمية والأكاديمية الصحيحة. علامات الترقيم والفواصل واضحة."
+    if language == "en":
+        return "This is an academic educational lecture in clear English. The speaker speaks clearly and at a moderate pace. The text is accurate and detailed with proper use of scientific and academic terminology. Punctuation and pauses are clear."
+    if language and language != "None":
+        return f"This is an academic educational lecture in {language}. The speaker speaks clearly. The text is accurate and detailed with proper terminology."
+    return None
+
+def build_transcribe_options(profile, language=None, word_timestamps=False):
+    """Build keyword arguments for WhisperModel.transcribe()
+
+    Args:
+        profile: A DECODING_PROFILES key
+        language: Language code or None for auto-detection
+        word_timestamps: Compute word-level alignment (costs extra decode time)
+    """
+    settings = DECODING_PROFILES[profile]
+    return dict(
+        language=language,
+        beam_size=settings["beam_size"],
+        best_of=settings["best_of"],
+        patience=settings["patience"],
+        vad_filter=True,
+        vad_parameters=dict(
+            min_silence_duration_ms=300,  # Lower for better detection
+            threshold=0.3,  # Lower threshold for maximum detection
+            min_speech_duration_ms=250,  # Minimum speech duration
+        ),
+        condition_on_previous_text=settings["condition_on_previous_text"],
+        initial_prompt=get_initial_prompt(language),
+        word_timestamps=word_timestamps,
+        temperature=0.0,  # Deterministic output (most accurate)
+        compression_ratio_threshold=2.2,  # Stricter filter for better quality
+        log_prob_threshold=-0.8,  # Higher threshold for better confidence
+        no_speech_threshold=0.4,  # Lower threshold for maximum speech detection
+        suppress_blank=True,
+        suppress_tokens=[-1],
+        without_timestamps=False,
+    )
+
+def segment_to_dict(segment, text, word_timestamps=False):
+    """Convert a faster-whisper segment to the JSON shape returned to Node"""
+    item = {
+        "text": text,
+        "start": segment.start,
+        "end": segment.end
+    }
+    if word_timestamps and getattr(segment, "words", None):
+        item["words"] = [
+            {
+                "word": word.word,
+                "start": word.start,
+                "end": word.end,
+                "probability": word.probability
+            }
+            for word in segment.words
+        ]
+    return item
+
+def get_batched_pipeline(model):
+    """Wrap a loaded WhisperModel in a (cached) BatchedInferencePipeline
+
+    The pipeline is kept on the model itself, so it is freed with the model
+    when model_cache drops it.
+    """
+    with _pipelines_lock:
+        pipeline = getattr(model, "_batched_pipeline", None)
+        if pipeline is None:
+            from faster_whisper import BatchedInferencePipeline
+            pipeline = model._batched_pipeline = BatchedInferencePipeline(model=model)
+        return pipeline
+
+def run_transcription(model, audio, options, batch_size=None):
+    """Run WhisperModel.transcribe() or its batched equivalent
+
+    Args:
+        model: Loaded WhisperModel
+        audio: File path, file-like object or decoded waveform
+        options: Keyword arguments from build_transcribe_options()
+        batch_size: Decode VAD speech segments in parallel batches of this size.
+            None or 0 keeps the sequential decoder.
+
+    Returns:
+        (segments generator, TranscriptionInfo) - same shape in both modes
+    """
+    if not batch_size:
+        return model.transcribe(audio, **options)
+
+    # Batched segments are decoded independently, so there is no previous-text context
+    batched_options = {k: v for k, v in options.items() if k != "condition_on_previous_text"}
+    print(f"[Whisper] Using batched inference (batch_size={batch_size})", file=sys.stderr)
+    return get_batched_pipeline(model).transcribe(audio, batch_size=batch_size, **batched_options)
+
+def parse_batch_size(value):
+    """Normalize a client-supplied batch size: True -> default, falsy -> sequential"""
+    if value is True:
+        return DEFAULT_BATCH_SIZE
+    try:
+        batch_size = int(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return batch_size if batch_size > 0 else None
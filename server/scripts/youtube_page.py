@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+YouTube watch-page extraction
+Fetches a watch page once and extracts everything the other scripts need
+(video details, caption tracks, audio stream URL). Results are cached per
+video ID with a TTL, in memory and on disk, and concurrent lookups for the
+same ID share one fetch.
+"""
+import os
+import sys
+import re
+import json
+import gzip
+import time
+import threading
+from html import unescape
+from typing import Dict, Any
+from urllib.parse import urlsplit, urljoin
+
+from local_cache import get_cache_dir, read_json, write_json, file_lock
+
+# Overridable so the extraction can be exercised against a local stub server
+YOUTUBE_BASE_URL = os.environ.get("YOUTUBE_BASE_URL", "https://www.youtube.com").rstrip("/")
+CACHE_TTL_SECONDS = int(os.environ.get("YOUTUBE_CACHE_TTL", "3600"))
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+REQUEST_TIMEOUT = 30
+MAX_REDIRECTS = 5
+
+class KeepAliveClient:
+    """Minimal pooled HTTP/1.1 client: idle connections are reused per host"""
+
+    def __init__(self, max_idle_per_host=4):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme, host):
+        with self._lock:
+            idle = self._idle.get((scheme, host))
+            if idle:
+                return idle.pop()
+        import http.client
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, timeout=REQUEST_TIMEOUT)
+        return http.client.HTTPConnection(host, timeout=REQUEST_TIMEOUT)
+
+    def _release(self, scheme, host, conn):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, url, headers=None, stream=False):
+        """GET `url`, following redirects
+
+        Returns:
+            (status, headers, body bytes) - or, with stream=True,
+            (status, headers, response) where the caller must read the response
+            fully and then call release(response)
+        """
+        import http.client
+
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            request_headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"}
+            if stream:
+                request_headers["Accept-Encoding"] = "identity"
+            request_headers.update(headers or {})
+
+            # A pooled connection may have been closed by the server; retry once on a fresh one
+            for attempt in range(2):
+                conn = self._acquire(parts.scheme, parts.netloc)
+                try:
+                    conn.request("GET", path, headers=request_headers)
+                    response = conn.getresponse()
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    if attempt == 1:
+                        raise
+                    print(f"[HTTP] Retrying {parts.netloc} on a new connection: {e}", file=sys.stderr)
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                response.read()
+                self._release(parts.scheme, parts.netloc, conn)
+                url = urljoin(url, response.getheader("Location"))
+                continue
+
+            if stream:
+                response._pool_conn = (parts.scheme, parts.netloc, conn)
+                return response.status, dict(response.getheaders()), response
+
+            body = response.read()
+            if response.getheader("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(parts.scheme, parts.netloc, conn)
+            return response.status, dict(response.getheaders()), body
+
+        raise RuntimeError(f"Too many redirects for {url}")
+
+    def release(self, response):
+        """Return a fully read streamed response's connection to the pool"""
+        scheme, host, conn = response._pool_conn
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(scheme, host, conn)
+
+http_client = KeepAliveClient()
+
+# Per-process cache and single-flight bookkeeping
+_memory_cache: Dict[str, Dict[str, Any]] = {}
+_inflight: Dict[str, threading.Event] = {}
+_cache_lock = threading.Lock()
+
+def _extract_json_object(html, marker):
+    """Decode the JSON object assigned after `marker` in the page source"""
+    index = html.find(marker)
+    if index == -1:
+        return None
+    start = html.find("{", index + len(marker))
+    if start == -1:
+        return None
+    try:
+        obj, _ = json.JSONDecoder().raw_decode(html, start)
+        return obj
+    except ValueError:
+        return None
+
+def extract_watch_page(html, video_id):
+    """Extract video details, caption tracks and the audio stream URL from watch-page HTML"""
+    player = _extract_json_object(html, "ytInitialPlayerResponse") or {}
+    details = player.get("videoDetails") or {}
+
+    # Title: player response first, <title> tag as fallback
+    title = details.get("title")
+    if not title:
+        title_match = re.search(r'<title>(.*?)</title>', html)
+        title = title_match.group(1) if title_match else f"YouTube Video {video_id}"
+        # Remove " - YouTube" suffix
+        title = unescape(title.replace(" - YouTube", "").strip())
+
+    duration_seconds = None
+    if details.get("lengthSeconds"):
+        duration_seconds = int(details["lengthSeconds"])
+    else:
+        duration_match = re.search(r'"lengthSeconds":"(\d+)"', html)
+        if duration_match:
+            duration_seconds = int(duration_match.group(1))
+        else:
+            duration_match = re.search(r'"approxDurationMs":"(\d+)"', html)
+            if duration_match:
+                duration_seconds = int(duration_match.group(1)) // 1000
+
+    channel_name = details.get("author")
+    if not channel_name:
+        channel_match = re.search(r'"ownerChannelName":"([^"]+)"', html)
+        if not channel_match:
+            channel_match = re.search(r'<link itemprop="name" content="([^"]+)"', html)
+        if channel_match:
+            channel_name = unescape(channel_match.group(1))
+
+    caption_tracks = []
+    captions = (player.get("captions") or {}).get("playerCaptionsTracklistRenderer") or {}
+    for track in captions.get("captionTracks") or []:
+        if track.get("baseUrl"):
+            caption_tracks.append({
+                "languageCode": track.get("languageCode"),
+                "baseUrl": track["baseUrl"],
+                "isGenerated": track.get("kind") == "asr",
+            })
+
+    # Best audio-only stream that is not signature-ciphered (usable without yt-dlp)
+    audio_stream = None
+    for fmt in (player.get("streamingData") or {}).get("adaptiveFormats") or []:
+        if not fmt.get("url") or not str(fmt.get("mimeType", "")).startswith("audio/"):
+            continue
+        if audio_stream is None or fmt.get("bitrate", 0) > audio_stream.get("bitrate", 0):
+            audio_stream = fmt
+
+    return {
+        "videoId": video_id,
+        "title": title,
+        "durationSeconds": duration_seconds,
+        "channelName": channel_name,
+        "captionTracks": caption_tracks,
+        "audioStreamUrl": audio_stream["url"] if audio_stream else None,
+        "audioMimeType": audio_stream.get("mimeType") if audio_stream else None,
+        "audioContentLength": int(audio_stream["contentLength"]) if audio_stream and audio_stream.get("contentLength") else None,
+        "fetchedAt": time.time(),
+    }
+
+def _fetch_and_extract(video_id):
+    url = f"{YOUTUBE_BASE_URL}/watch?v={video_id}"
+    status, _, body = http_client.request(url)
+    if status != 200:
+        raise RuntimeError(f"YouTube returned HTTP {status} for {video_id}")
+    return extract_watch_page(body.decode("utf-8", errors="replace"), video_id)
+
+def _cache_path(video_id):
+    return os.path.join(get_cache_dir("watch_pages"), f"{video_id}.json")
+
+def _fresh(record):
+    return record is not None and time.time() - record.get("fetchedAt", 0) <= CACHE_TTL_SECONDS
+
+def get_watch_page_data(video_id, use_cache=True):
+    """Get the extracted watch-page record for a video
+
+    Lookups go memory -> disk -> network. Concurrent callers for the same ID,
+    in this process (threads) or in other script processes (file lock), wait
+    for a single fetch instead of each downloading the page.
+
+    Raises:
+        Exception if the page cannot be fetched or parsed
+    """
+    while True:
+        with _cache_lock:
+            record = _memory_cache.get(video_id)
+            if use_cache and _fresh(record):
+                return record
+            event = _inflight.get(video_id)
+            if event is None:
+                event = threading.Event()
+                _inflight[video_id] = event
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            event.wait()
+            use_cache = True
+            with _cache_lock:
+                record = _memory_cache.get(video_id)
+            if _fresh(record):
+                return record
+            # The leader failed; loop and try to become the leader ourselves
+            continue
+
+        try:
+            path = _cache_path(video_id)
+            with file_lock(path + ".lock"):
+                record = read_json(path, CACHE_TTL_SECONDS) if use_cache else None
+                if not _fresh(record):
+                    print(f"[YouTube] Fetching watch page for {video_id}", file=sys.stderr)
+                    record = _fetch_and_extract(video_id)
+                    write_json(path, record)
+                else:
+                    print(f"[YouTube] Using cached watch page for {video_id}", file=sys.stderr)
+            with _cache_lock:
+                _memory_cache[video_id] = record
+            return record
+        finally:
+            with _cache_lock:
+                _inflight.pop(video_id, None)
+            event.set()
+
+def fetch_caption_track(track):
+    """Download a caption track (json3 format) as a list of (start, duration, text) tuples"""
+    url = track["baseUrl"]
+    url += ("&" if "?" in url else "?") + "fmt=json3"
+    status, _, body = http_client.request(url)
+    if status != 200 or not body:
+        raise RuntimeError(f"Caption download returned HTTP {status} ({len(body)} bytes)")
+
+    snippets = []
+    for event in json.loads(body.decode("utf-8")).get("events") or []:
+        segs = event.get("segs")
+        if not segs:
+            continue
+        text = "".join(seg.get("utf8", "") for seg in segs).strip()
+        if text:
+            snippets.append((event.get("tStartMs", 0) / 1000.0, event.get("dDurationMs", 0) / 1000.0, unescape(text)))
+    return snippets
+
+def select_caption_track(tracks, languages):
+    """Pick a track for the first available language, preferring manual over auto-generated"""
+    for language in languages:
+        candidates = [t for t in tracks if t.get("languageCode") == language]
+        if candidates:
+            candidates.sort(key=lambda t: t.get("isGenerated", False))
+            return candidates[0]
+    return None
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Speculative prefetch of a video's captions and audio
+Run in the background after a video's info is looked up, since a transcript
+or transcription request for the same video usually follows within seconds.
+Captions land in get_transcript's caption cache; audio is kept in the
+prefetch directory until download_youtube_audio takes it. A ledger shared by
+every script process tracks prefetched entries (within a total byte cap), hits,
+misses and wasted bytes (entries evicted or expired before anyone used them).
+
+Usage:
+    youtube_prefetch.py <video_id>    prefetch, print the outcome as JSON
+    youtube_prefetch.py --stats       print the hit-rate statistics as JSON
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from local_cache import get_cache_dir, read_json, write_json, file_lock
+
+# Total size of prefetched audio kept at once; oldest unused entries are evicted beyond it
+MAX_BYTES = int(float(os.environ.get("YOUTUBE_PREFETCH_MAX_MB", "1024")) * 1024 * 1024)
+# Unused prefetched entries are dropped (and counted as wasted) after this long
+TTL_SECONDS = int(os.environ.get("YOUTUBE_PREFETCH_TTL", "3600"))
+
+KINDS = ("audio", "captions")
+
+def _ledger_path():
+    return os.path.join(get_cache_dir("prefetch"), "ledger.json")
+
+def _empty_stats():
+    return {
+        kind: {"prefetched": 0, "prefetchedBytes": 0, "hits": 0, "hitBytes": 0, "misses": 0,
+               "wasted": 0, "wastedBytes": 0, "skipped": 0}
+        for kind in KINDS
+    }
+
+@contextmanager
+def _ledger():
+    """Read-modify-write the shared ledger under its lock; expired entries are dropped"""
+    path = _ledger_path()
+    with file_lock(path + ".lock"):
+        ledger = read_json(path) or {}
+        ledger.setdefault("entries", {})
+        ledger.setdefault("stats", _empty_stats())
+        now = time.time()
+        for key, entry in list(ledger["entries"].items()):
+            if now - entry["prefetchedAt"] > TTL_SECONDS:
+                _discard(ledger, key)
+        yield ledger
+        write_json(path, ledger)
+
+def _discard(ledger, key):
+    """Drop an unused entry, counting it as wasted"""
+    entry = ledger["entries"].pop(key)
+    stats = ledger["stats"][entry["kind"]]
+    stats["wasted"] += 1
+    stats["wastedBytes"] += entry["bytes"]
+    if entry.get("path"):
+        try:
+            os.unlink(entry["path"])
+        except OSError:
+            pass
+
+def _video_lock(video_id):
+    """Held while a video is prefetched, so a request for it waits instead of downloading again"""
+    return file_lock(os.path.join(get_cache_dir("prefetch"), f"{video_id}.lock"))
+
+def record_lookup(kind: str, key: str) -> bool:
+    """Count a request's lookup of prefetchable data; True (a hit) if it was prefetched
+
+    The entry is consumed, so only the first request after a prefetch is a hit.
+    """
+    with _ledger() as ledger:
+        entry = ledger["entries"].pop(f"{kind}:{key}", None)
+        stats = ledger["stats"][kind]
+        if entry is None:
+            stats["misses"] += 1
+            return False
+        stats["hits"] += 1
+        stats["hitBytes"] += entry["bytes"]
+        return True
+
+def take_audio(video_id: str) -> Optional[str]:
+    """Claim the prefetched full-length audio of a video
+
+    Waits for a prefetch of the video that is still running.
+
+    Returns:
+        Path of the file, now owned by the caller, or None on a miss
+    """
+    with _video_lock(video_id):
+        with _ledger() as ledger:
+            entry = ledger["entries"].pop(f"audio:{video_id}", None)
+            stats = ledger["stats"]["audio"]
+            if entry is None or not os.path.exists(entry["path"]):
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            stats["hitBytes"] += entry["bytes"]
+    # Out of the prefetch directory, so the caller may delete it as usual
+    ext = os.path.splitext(entry["path"])[1]
+    claimed = os.path.join(tempfile.gettempdir(), f"prefetched-{video_id}-{os.getpid()}-{time.time_ns()}{ext}")
+    shutil.move(entry["path"], claimed)
+    print(f"[Prefetch] Using prefetched audio for {video_id} ({entry['bytes'] / 1024 / 1024:.2f} MB)", file=sys.stderr)
+    return claimed
+
+def _add_entry(ledger, kind, key, nbytes, path=None):
+    stats = ledger["stats"][kind]
+    stats["prefetched"] += 1
+    stats["prefetchedBytes"] += nbytes
+    ledger["entries"][f"{kind}:{key}"] = {"kind": kind, "bytes": nbytes, "path": path, "prefetchedAt": time.time()}
+
+def _make_room(ledger, nbytes) -> bool:
+    """Evict the oldest unused audio until `nbytes` more fit under MAX_BYTES"""
+    if nbytes > MAX_BYTES:
+        return False
+    audio = sorted((e["prefetchedAt"], key) for key, e in ledger["entries"].items() if e["kind"] == "audio")
+    used = sum(ledger["entries"][key]["bytes"] for _, key in audio)
+    for _, key in audio:
+        if used + nbytes <= MAX_BYTES:
+            break
+        used -= ledger["entries"][key]["bytes"]
+        _discard(ledger, key)
+    return True
+
+def _prefetch_captions(video_id) -> Dict[str, Any]:
+    from get_transcript import load_caption_index, caption_cache_key, caption_cache_path, CAPTION_CACHE_TTL_SECONDS
+    key = caption_cache_key(video_id)
+    with _ledger() as ledger:
+        if f"captions:{key}" in ledger["entries"]:
+            return {"status": "already prefetched"}
+    if read_json(caption_cache_path(key), CAPTION_CACHE_TTL_SECONDS) is not None:
+        return {"status": "already cached"}
+    load_caption_index(video_id, record_use=False)
+    nbytes = os.path.getsize(caption_cache_path(key))
+    with _ledger() as ledger:
+        _add_entry(ledger, "captions", key, nbytes)
+    return {"status": "prefetched", "bytes": nbytes}
+
+def _prefetch_audio(video_id) -> Dict[str, Any]:
+    from youtube_page import get_watch_page_data
+    from download_youtube_audio import fetch_audio
+    expected = get_watch_page_data(video_id).get("audioContentLength")
+    with _ledger() as ledger:
+        if f"audio:{video_id}" in ledger["entries"]:
+            return {"status": "already prefetched"}
+        if expected and not _make_room(ledger, expected):
+            ledger["stats"]["audio"]["skipped"] += 1
+            return {"status": "skipped", "reason": f"{expected} bytes exceeds the prefetch cap"}
+
+    download = fetch_audio(video_id)
+    if not download.get("success"):
+        return {"status": "failed", "error": download.get("error")}
+    nbytes = download["fileSize"]
+    ext = os.path.splitext(download["filePath"])[1]
+    path = os.path.join(get_cache_dir("prefetch"), f"{video_id}{ext}")
+    with _ledger() as ledger:
+        if not _make_room(ledger, nbytes):
+            # Size was unknown up front; the download is thrown away
+            ledger["stats"]["audio"]["skipped"] += 1
+            ledger["stats"]["audio"]["wastedBytes"] += nbytes
+            os.unlink(download["filePath"])
+            return {"status": "skipped", "reason": f"{nbytes} bytes exceeds the prefetch cap"}
+        shutil.move(download["filePath"], path)
+        _add_entry(ledger, "audio", video_id, nbytes, path)
+    return {"status": "prefetched", "bytes": nbytes}
+
+def prefetch_video(video_id: str) -> Dict[str, Any]:
+    """Prefetch captions, then audio; a failure of one does not stop the other"""
+    result = {"success": True, "videoId": video_id}
+    with _video_lock(video_id):
+        for kind, prefetch in (("captions", _prefetch_captions), ("audio", _prefetch_audio)):
+            started = time.perf_counter()
+            try:
+                outcome = prefetch(video_id)
+            except Exception as e:
+                outcome = {"status": "failed", "error": str(e)}
+            outcome["seconds"] = round(time.perf_counter() - started, 3)
+            result[kind] = outcome
+            print(f"[Prefetch] {kind} for {video_id}: {outcome}", file=sys.stderr)
+    return result
+
+def prefetch_stats() -> Dict[str, Any]:
+    with _ledger() as ledger:
+        stats = {}
+        for kind, s in ledger["stats"].items():
+            lookups = s["hits"] + s["misses"]
+            pending = [e for e in ledger["entries"].values() if e["kind"] == kind]
+            stats[kind] = dict(
+                s,
+                hitRate=round(s["hits"] / lookups, 3) if lookups else None,
+                pending=len(pending),
+                pendingBytes=sum(e["bytes"] for e in pending),
+            )
+    return {"success": True, "maxBytes": MAX_BYTES, "ttlSeconds": TTL_SECONDS, **stats}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(json.dumps({
+            "success": False,
+            "error": "Video ID or --stats is required"
+        }))
+        sys.exit(1)
+
+    if sys.argv[1] == "--stats":
+        print(json.dumps(prefetch_stats()))
+    else:
+        print(json.dumps(prefetch_video(sys.argv[1])))
@@ -0,0 +1,272 @@
+/**
+ * Transcription Worker Pool
+ * Keeps a small pool of long-lived `transcribe_audio.py --worker` processes
+ * so the Python imports and the Whisper model load are paid once per worker
+ * instead of once per request
+ */
+import { spawn, ChildProcess } from "child_process";
+import path from "path";
+import { fileURLToPath } from "url";
+import { existsSync } from "fs";
+import { createInterface } from "readline";
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+// Each worker holds its own copy of the Whisper model, so keep the default small
+const POOL_SIZE = Math.max(1, parseInt(process.env.TRANSCRIBE_WORKERS || "1", 10) || 1);
+
+export interface TranscribeOptions {
+  filePath: string;
+  modelSize: string;
+  language?: string | null;
+  device: string;
+  // "fast" | "balanced" | "accurate"; omitted or "auto" lets the worker decide
+  profile?: string;
+  wordTimestamps?: boolean;
+  // Opt-in batched inference: number of VAD speech segments decoded per batch
+  batchSize?: number;
+}
+
+/**
+ * Columnar segment wire format (see segment_index.py): `text` is every segment's
+ * text joined by single spaces and segment i is characters offsets[i] to
+ * offsets[i + 1] - 1 of it. Offsets count code points (Python string indices),
+ * not the UTF-16 units String.slice counts.
+ */
+export interface SegmentColumns {
+  starts: number[];
+  ends: number[];
+  text: string;
+  offsets: number[];
+  // [word, start, end, probability] per word, or null, per segment (word timestamps only)
+  words?: Array<Array<[string, number, number, number]> | null>;
+}
+
+/**
+ * Expand columnar segments into the per-segment objects returned to clients
+ */
+export function expandSegmentColumns(columns: SegmentColumns): any[] {
+  const { offsets } = columns;
+  // Characters outside the BMP (emoji, some CJK) are two UTF-16 units; only then are
+  // code points split out, otherwise both indexings agree
+  const codePoints = offsets[offsets.length - 1] - 1 === columns.text.length ? null : Array.from(columns.text);
+  const slice = (from: number, to: number) => (codePoints ? codePoints.slice(from, to).join("") : columns.text.slice(from, to));
+  return columns.starts.map((start, i) => {
+    const segment: any = {
+      text: slice(offsets[i], offsets[i + 1] - 1),
+      start,
+      end: columns.ends[i],
+    };
+    const words = columns.words?.[i];
+    if (words) {
+      segment.words = words.map(([word, wordStart, wordEnd, probability]) => ({
+        word,
+        start: wordStart,
+        end: wordEnd,
+        probability,
+      }));
+    }
+    return segment;
+  });
+}
+
+interface TranscribeJob {
+  id: number;
+  options: TranscribeOptions;
+  resolve: (result: any) => void;
+  reject: (error: Error) => void;
+}
+
+interface TranscribeWorker {
+  process: ChildProcess;
+  job: TranscribeJob | null;
+}
+
+const workers: TranscribeWorker[] = [];
+const pendingJobs: TranscribeJob[] = [];
+let nextJobId = 1;
+
+function getScriptsDir(): string {
+  if (__dirname.includes("dist")) {
+    return path.resolve(__dirname, "..", "server", "scripts");
+  }
+  return path.join(__dirname, "scripts");
+}
+
+function getPythonCommand(): string {
+  if (process.env.PYTHON_CMD) {
+    return process.env.PYTHON_CMD;
+  }
+
+  const venvPython = path.join(__dirname, "..", "venv", "bin", "python3");
+  if (existsSync(venvPython)) {
+    return venvPython;
+  }
+
+  const venvPythonWindows = path.join(__dirname, "..", "venv", "Scripts", "python.exe");
+  if (existsSync(venvPythonWindows)) {
+    return venvPythonWindows;
+  }
+
+  return process.platform === "win32" ? "python" : "python3";
+}
+
+function spawnWorker(): TranscribeWorker {
+  const pythonCmd = getPythonCommand();
+  const script = path.join(getScriptsDir(), "transcribe_audio.py");
+
+  console.log(`[TranscribeWorker] Starting worker: ${pythonCmd} ${script} --worker`);
+
+  const child = spawn(pythonCmd, [script, "--worker"], {
+    stdio: ["pipe", "pipe", "pipe"],
+  });
+  const worker: TranscribeWorker = { process: child, job: null };
+
+  createInterface({ input: child.stdout! }).on("line", (line) => {
+    if (!line.trim()) {
+      return;
+    }
+
+    let result: any;
+    try {
+      result = JSON.parse(line);
+    } catch (error) {
+      console.error(`[TranscribeWorker] Ignoring malformed worker output: ${line}`);
+      return;
+    }
+
+    const job = worker.job;
+    if (!job || result.id !== job.id) {
+      console.warn(`[TranscribeWorker] Received result for unknown job ${result.id}`);
+      return;
+    }
+
+    worker.job = null;
+    delete result.id;
+    if (result.segmentColumns) {
+      result.segments = expandSegmentColumns(result.segmentColumns);
+      delete result.segmentColumns;
+    }
+    job.resolve(result);
+    dispatch();
+  });
+
+  child.stderr?.on("data", (data: Buffer) => {
+    console.error(`[TranscribeWorker] ${data.toString().trim()}`);
+  });
+
+  // Take the worker out of the pool, fail its job and hand waiting jobs to other workers
+  const retire = (reason: string) => {
+    const index = workers.indexOf(worker);
+    if (index !== -1) {
+      workers.splice(index, 1);
+    }
+
+    if (worker.job) {
+      worker.job.reject(new Error(reason));
+      worker.job = null;
+    }
+    dispatch();
+  };
+
+  child.on("error", (error) => {
+    console.error(`[TranscribeWorker] Failed to start: ${error.message}`);
+    retire(`Transcription worker failed to start: ${error.message}`);
+  });
+
+  child.on("exit", (code) => {
+    console.log(`[TranscribeWorker] Worker exited with code ${code}`);
+    retire(`Transcription worker exited with code ${code}`);
+  });
+
+  workers.push(worker);
+  return worker;
+}
+
+function dispatch(): void {
+  while (pendingJobs.length > 0) {
+    let worker = workers.find((w) => w.job === null);
+    if (!worker && workers.length < POOL_SIZE) {
+      worker = spawnWorker();
+    }
+    if (!worker) {
+      return;
+    }
+
+    const job = pendingJobs.shift()!;
+    worker.job = job;
+    worker.process.stdin?.write(
+      JSON.stringify({
+        id: job.id,
+        file_path: job.options.filePath,
+        model_size: job.options.modelSize,
+        language: job.options.language || null,
+        device: job.options.device,
+        profile: job.options.profile || null,
+        word_timestamps: Boolean(job.options.wordTimestamps),
+        batch_size: job.options.batchSize || null,
+        // Segments are only returned to clients with word timestamps; otherwise skip them
+        segment_format: job.options.wordTimestamps ? "columns" : "none",
+        // Jobs still waiting behind this one feed the automatic profile policy
+        queue_depth: pendingJobs.length,
+      }) + "\n",
+    );
+  }
+}
+
+/**
+ * Transcribe an audio file on the next free worker.
+ * Resolves with the JSON result of transcribe_audio() (success flag included).
+ * Aborting `signal` drops a waiting job, or kills the worker running it (the
+ * pool starts a fresh one), so an abandoned request frees its slot at once.
+ */
+export function transcribeWithWorker(options: TranscribeOptions, signal?: AbortSignal): Promise<any> {
+  return new Promise((resolve, reject) => {
+    if (signal?.aborted) {
+      reject(signal.reason);
+      return;
+    }
+    const job: TranscribeJob = { id: nextJobId++, options, resolve, reject };
+    if (signal) {
+      const onAbort = () => {
+        const index = pendingJobs.indexOf(job);
+        if (index !== -1) {
+          pendingJobs.splice(index, 1);
+        } else {
+          const worker = workers.find((w) => w.job === job);
+          if (!worker) {
+            return;
+          }
+          console.log(`[TranscribeWorker] Job ${job.id} cancelled, stopping its worker`);
+          // Out of the pool before it exits, so no other job is dispatched to it
+          workers.splice(workers.indexOf(worker), 1);
+          worker.job = null;
+          worker.process.kill();
+        }
+        reject(signal.reason);
+        dispatch();
+      };
+      signal.addEventListener("abort", onAbort, { once: true });
+      const settle = (done: (value: any) => void) => (value: any) => {
+        signal.removeEventListener("abort", onAbort);
+        done(value);
+      };
+      job.resolve = settle(resolve);
+      job.reject = settle(reject);
+    }
+    pendingJobs.push(job);
+    dispatch();
+  });
+}
+
+export function stopTranscribeWorkers(): void {
+  for (const job of pendingJobs.splice(0)) {
+    job.reject(new Error("Transcription workers are shutting down"));
+  }
+  for (const worker of workers) {
+    console.log("[TranscribeWorker] Stopping worker");
+    worker.process.stdin?.end();
+    worker.process.kill();
+  }
+}
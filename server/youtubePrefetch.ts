@@ -0,0 +1,115 @@
+/**
+ * YouTube Prefetch
+ * After a video's info is looked up, fetches its captions and audio into the
+ * local cache in the background (`youtube_prefetch.py`), so the transcript or
+ * transcription request that usually follows finds them already local.
+ * At most YOUTUBE_PREFETCH_CONCURRENCY prefetches run at once; the byte cap
+ * and hit/waste accounting live in the Python script's shared ledger.
+ */
+import { spawn, execFile } from "child_process";
+import { promisify } from "util";
+import path from "path";
+import { fileURLToPath } from "url";
+import { existsSync } from "fs";
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+const execFileAsync = promisify(execFile);
+
+// Prefetch on every info lookup; a request can also opt in with { prefetch: true }
+const PREFETCH_DEFAULT = ["1", "true", "yes"].includes(process.env.YOUTUBE_PREFETCH || "");
+const CONCURRENCY = Math.max(1, parseInt(process.env.YOUTUBE_PREFETCH_CONCURRENCY || "2", 10) || 1);
+// Waiting prefetches beyond this are dropped (the oldest first): their users have likely moved on
+const MAX_QUEUED = 20;
+
+const queued: string[] = [];
+const running = new Set<string>();
+
+function getScriptsDir(): string {
+  if (__dirname.includes("dist")) {
+    return path.resolve(__dirname, "..", "server", "scripts");
+  }
+  return path.join(__dirname, "scripts");
+}
+
+function getPythonCommand(): string {
+  if (process.env.PYTHON_CMD) {
+    return process.env.PYTHON_CMD;
+  }
+
+  const venvPython = path.join(__dirname, "..", "venv", "bin", "python3");
+  if (existsSync(venvPython)) {
+    return venvPython;
+  }
+
+  const venvPythonWindows = path.join(__dirname, "..", "venv", "Scripts", "python.exe");
+  if (existsSync(venvPythonWindows)) {
+    return venvPythonWindows;
+  }
+
+  return process.platform === "win32" ? "python" : "python3";
+}
+
+export function isPrefetchEnabled(): boolean {
+  return PREFETCH_DEFAULT;
+}
+
+function runNext(): void {
+  while (running.size < CONCURRENCY && queued.length > 0) {
+    const videoId = queued.shift()!;
+    running.add(videoId);
+
+    const child = spawn(getPythonCommand(), [path.join(getScriptsDir(), "youtube_prefetch.py"), videoId], {
+      stdio: ["ignore", "pipe", "pipe"],
+    });
+    let output = "";
+    child.stdout?.on("data", (data: Buffer) => {
+      output += data.toString();
+    });
+    child.stderr?.on("data", (data: Buffer) => {
+      console.error(`[Prefetch] ${data.toString().trim()}`);
+    });
+    const finish = () => {
+      if (running.delete(videoId)) {
+        runNext();
+      }
+    };
+    child.on("error", (error) => {
+      console.error(`[Prefetch] Failed to start for ${videoId}: ${error.message}`);
+      finish();
+    });
+    child.on("exit", () => {
+      try {
+        const result = JSON.parse(output.trim());
+        console.log(`[Prefetch] ${videoId}: captions ${result.captions?.status}, audio ${result.audio?.status}`);
+      } catch {
+        console.warn(`[Prefetch] ${videoId}: no result`);
+      }
+      finish();
+    });
+  }
+}
+
+/**
+ * Queue a background prefetch of a video's captions and audio (no-op if one
+ * is already queued or running for it)
+ */
+export function schedulePrefetch(videoId: string): void {
+  if (running.has(videoId) || queued.includes(videoId)) {
+    return;
+  }
+  queued.push(videoId);
+  if (queued.length > MAX_QUEUED) {
+    queued.shift();
+  }
+  runNext();
+}
+
+/**
+ * Prefetch hit rate, wasted bytes and pending entries per kind (audio, captions)
+ */
+export async function getPrefetchStats(): Promise<any> {
+  const { stdout } = await execFileAsync(getPythonCommand(), [path.join(getScriptsDir(), "youtube_prefetch.py"), "--stats"]);
+  return { ...JSON.parse(stdout.trim()), queued: queued.length, running: running.size };
+}